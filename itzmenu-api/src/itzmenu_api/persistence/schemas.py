@@ -88,6 +88,7 @@ class WeekMenuRead(UpdateDictModel):
     end_timestamp: int
     created_at: int
     img_checksum: str
+    img_phash: str | None = Field(default=None)
     img: str | None = Field(default=None)
     menus: list[DayMenu] = Field(default=[])
 
@@ -99,6 +100,7 @@ class WeekMenuCreate(UpdateDictModel):
     end_timestamp: int = Field(ge=1)
     created_at: int = Field(default_factory=lambda: int(time.time()), ge=0)
     img_checksum: str = Field(pattern=r'^[a-f0-9]{64}$')
+    img_phash: str | None = Field(pattern=r'^[a-f0-9]+$', default=None)
     img: str | None = Field(pattern=r'^[a-zA-Z0-9+/]+={0,2}$', default=None)
     menus: Optional[list[DayMenu]] = Field(default=[])
 
@@ -108,5 +110,6 @@ class WeekMenuUpdate(UpdateDictModel):
     end_timestamp: Optional[int] = None
     created_at: Optional[int] = None
     img_checksum: Optional[str] = None
+    img_phash: Optional[str] = None
     img: Optional[str] = None
     menus: Optional[list[DayMenu]] = None
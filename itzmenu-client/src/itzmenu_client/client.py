@@ -1,6 +1,8 @@
+import json
 from typing import Callable
 from uuid import UUID
 
+import httpx
 import requests
 import logging as log
 
@@ -31,6 +33,30 @@ def retry_request(attempts: int = 1) -> Callable:
     return decorator
 
 
+def async_retry_request(attempts: int = 1) -> Callable:
+    """
+    Decorator to retry an asynchronous request a given number of times.
+    :param attempts: Number of attempts to retry the request.
+    :return: The response of the request.
+    """
+    def decorator(func):
+        async def wrapper(self, *args, **kwargs):
+            for _ in range(max(attempts, 1)):
+                if (response := await func(self, *args, **kwargs)).is_success:
+                    return response
+                elif response.status_code == httpx.codes.UNAUTHORIZED:
+                    await self._refresh_access_token()
+            else:
+                log.error(f'Failed to execute http request: {response.url}')
+                log.error(f'Response status code: {response.status_code}')
+                log.error(f'Response content: {response.content}')
+                return None
+
+        return wrapper
+
+    return decorator
+
+
 class ItzMenuClient:
 
     def __init__(self, email: str = "", password: str = "", host: str | None = 'http://localhost:8000'):
@@ -42,14 +68,19 @@ class ItzMenuClient:
     def __del__(self):
         self.__session.close()
 
-    def create_menu(self, menu: WeekMenuCreate) -> WeekMenuRead | None:
+    def create_menu(self, menu: WeekMenuCreate, img: bytes | None = None) -> WeekMenuRead | None:
         """
         Create a week menu.
         :param menu: An instance of WeekMenuCreate containing the data for the week menu.
+        :param img: The raw image of the week menu, uploaded as binary file instead of base64 encoded JSON.
         :return: The created week menu.
         """
         data = menu.create_update_dict()
-        req = requests.Request('POST', f'{self.__host}/menus', json=data)
+        if img is None:
+            req = requests.Request('POST', f'{self.__host}/menus', json=data)
+        else:
+            req = requests.Request('POST', f'{self.__host}/menus/img', data={'menu': json.dumps(data)},
+                                   files={'image': ('menu.jpg', img, 'image/jpeg')})
         resp = self.__execute_request(req)
         return WeekMenuRead(**resp.json()) if resp is not None and resp.ok else None
 
@@ -119,3 +150,96 @@ class ItzMenuClient:
     def __execute_request(self, request: requests.Request) -> requests.Response:
         prepped = self.__session.prepare_request(request)
         return self.__session.send(prepped, timeout=5)
+
+
+class AsyncItzMenuClient:
+    """ Asynchronous variant of the ItzMenuClient for clients running in an asyncio event loop """
+
+    def __init__(self, email: str = "", password: str = "", host: str | None = 'http://localhost:8000'):
+        self.__client = httpx.AsyncClient(timeout=5)
+        self.__email = email
+        self.__password = password
+        self.__host = host
+
+    async def __aenter__(self) -> 'AsyncItzMenuClient':
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.__client.aclose()
+
+    async def create_menu(self, menu: WeekMenuCreate, img: bytes | None = None) -> WeekMenuRead | None:
+        """
+        Create a week menu.
+        :param menu: An instance of WeekMenuCreate containing the data for the week menu.
+        :param img: The raw image of the week menu, uploaded as binary file instead of base64 encoded JSON.
+        :return: The created week menu.
+        """
+        if img is None:
+            resp = await self.__execute_request('POST', f'{self.__host}/menus', json=menu.create_update_dict())
+        else:
+            resp = await self.__execute_request('POST', f'{self.__host}/menus/img',
+                                                data={'menu': json.dumps(menu.create_update_dict())},
+                                                files={'image': ('menu.jpg', img, 'image/jpeg')})
+        return WeekMenuRead(**resp.json()) if resp is not None else None
+
+    async def get_menu_by_id_or_checksum(self, menu_id_or_checksum: str | UUID) -> WeekMenuRead | None:
+        """
+        Get a week menu by its id or checksum.
+        :param menu_id_or_checksum: The id or checksum of the week menu.
+        :return: The week menu.
+        """
+        resp = await self.__execute_request('GET', f'{self.__host}/menus/menu/{menu_id_or_checksum}')
+        return WeekMenuRead(**resp.json()) if resp is not None else None
+
+    async def get_menu_by_timestamp(self, timestamp: int) -> WeekMenuRead | None:
+        """
+        Get a week menu by timestamp.
+        :param timestamp: The timestamp of the week menu.
+        :return: The week menu.
+        """
+        resp = await self.__execute_request('GET', f'{self.__host}/menus/menu', params={'timestamp': timestamp})
+        return WeekMenuRead(**resp.json()) if resp is not None else None
+
+    async def get_menu_by_timestamp_range(self, start: int = 0, end: int = 9999999999) -> list[WeekMenuRead]:
+        """
+        Get a list of week menus by timestamp range.
+        :param start: Start of the timestamp range.
+        :param end: End of the timestamp range.
+        :return: A list of week menus.
+        """
+        resp = await self.__execute_request('GET', f'{self.__host}/menus', params={'start': start, 'end': end})
+        return [WeekMenuRead(**menu) for menu in resp.json()] if resp is not None else []
+
+    async def update_menu(self, menu_id_or_checksum: str | UUID, menu: WeekMenuUpdate) -> WeekMenuRead | None:
+        """
+        Update a menu by its id or checksum.
+        :param menu_id_or_checksum: The id or checksum of the menu to update.
+        :param menu: An instance of WeekMenuUpdate containing the updated data.
+        :return: The updated menu.
+        """
+        resp = await self.__execute_request('PATCH', f'{self.__host}/menus/menu/{menu_id_or_checksum}',
+                                            json=menu.create_update_dict())
+        return WeekMenuRead(**resp.json()) if resp is not None else None
+
+    async def delete_menu(self, menu_id_or_checksum: str | UUID) -> bool:
+        """
+        Delete a menu by its id or checksum.
+        :param menu_id_or_checksum: The id or checksum of the menu to delete.
+        :return: True if the menu was deleted, False otherwise.
+        """
+        return await self.__execute_request('DELETE', f'{self.__host}/menus/menu/{menu_id_or_checksum}') is not None
+
+    async def _refresh_access_token(self):
+        # The login is not retried, a rejected login would otherwise trigger another login
+        data = {'username': self.__email, 'password': self.__password}
+        if (response := await self.__client.post(f'{self.__host}/auth/login', data=data)).is_success:
+            token = response.json()['access_token']
+            self.__client.headers['Authorization'] = f'Bearer {token}'
+
+    @async_retry_request(attempts=3)
+    async def __execute_request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        # The request is built on every attempt so that it carries the current access token
+        return await self.__client.request(method, url, **kwargs)
@@ -1,10 +1,13 @@
+import json
 from typing import Any
 from uuid import UUID
 
+import pytest
 from pytest_httpserver import HTTPServer
+from werkzeug import Request, Response
 
 from itzmenu_api.persistence.schemas import WeekMenuCreate, WeekMenuUpdate
-from itzmenu_client.client import ItzMenuClient
+from itzmenu_client.client import AsyncItzMenuClient, ItzMenuClient
 
 
 class TestItzMenuClient:
@@ -25,6 +28,18 @@ class TestItzMenuClient:
         assert response.created_at == 30
         assert response.img_checksum == 'e0e2eeb7e31c4c4b662a120e59f1df526daf09fca82cb617368e02ea53d162a6'
 
+    def test_create_menu_with_image(self, user: str, password: str, headers: dict[str, str],
+                                    httpserver: HTTPServer):
+        expect = {'start_timestamp': 30, 'end_timestamp': 40, 'created_at': 30,
+                  'img_checksum': 'e0e2eeb7e31c4c4b662a120e59f1df526daf09fca82cb617368e02ea53d162a6'}
+        httpserver.expect_request('/menus/img', method='POST', headers=headers).respond_with_handler(
+            lambda request: upload_handler(request, expect, b'image_bytes'))
+        httpserver.expect_request('/menus/img', method='POST').respond_with_data(status=401)
+        client = ItzMenuClient(user, password, f'http://{httpserver.host}:{httpserver.port}')
+        response = client.create_menu(WeekMenuCreate(**expect), b'image_bytes')
+        assert response.id == UUID('835849f9-52e9-4479-8cc3-63ac96e75325')
+        assert response.img_checksum == expect['img_checksum']
+
     def test_get_menu_by_id(self, httpserver: HTTPServer, week_menus: list[dict[str, Any]]):
         resp = week_menus[0]
         (httpserver.expect_request(f'/menus/menu/{resp["id"]}', method='GET').respond_with_json(resp))
@@ -200,3 +215,94 @@ class TestItzMenuClient:
          .respond_with_data(status=404))
         client = ItzMenuClient('user', 'password', f'http://{httpserver.host}:{httpserver.port}')
         assert not client.delete_menu('835849f9-52e9-4479-8cc3-63ac96e75325')
+
+
+@pytest.mark.asyncio
+class TestAsyncItzMenuClient:
+
+    async def test_create_menu(self, user: str, password: str, headers: dict[str, str], httpserver: HTTPServer):
+        expect = {'start_timestamp': 30, 'end_timestamp': 40, 'created_at': 30,
+                  'img_checksum': 'e0e2eeb7e31c4c4b662a120e59f1df526daf09fca82cb617368e02ea53d162a6'}
+        resp = {'id': '835849f9-52e9-4479-8cc3-63ac96e75325', **expect}
+        httpserver.expect_request('/menus', method='POST', json=expect, headers=headers).respond_with_json(resp)
+        httpserver.expect_request('/menus', method='POST', json=expect).respond_with_data(status=401)
+        async with AsyncItzMenuClient(user, password, f'http://{httpserver.host}:{httpserver.port}') as client:
+            response = await client.create_menu(WeekMenuCreate(**expect))
+        assert response.id == UUID(resp['id'])
+        assert response.img_checksum == expect['img_checksum']
+
+    async def test_create_menu_with_image(self, user: str, password: str, headers: dict[str, str],
+                                          httpserver: HTTPServer):
+        expect = {'start_timestamp': 30, 'end_timestamp': 40, 'created_at': 30,
+                  'img_checksum': 'e0e2eeb7e31c4c4b662a120e59f1df526daf09fca82cb617368e02ea53d162a6'}
+        httpserver.expect_request('/menus/img', method='POST', headers=headers).respond_with_handler(
+            lambda request: upload_handler(request, expect, b'image_bytes'))
+        httpserver.expect_request('/menus/img', method='POST').respond_with_data(status=401)
+        async with AsyncItzMenuClient(user, password, f'http://{httpserver.host}:{httpserver.port}') as client:
+            response = await client.create_menu(WeekMenuCreate(**expect), b'image_bytes')
+        assert response.id == UUID('835849f9-52e9-4479-8cc3-63ac96e75325')
+        assert response.img_checksum == expect['img_checksum']
+
+    async def test_create_menu_invalid_credentials(self, httpserver: HTTPServer):
+        expect = {'start_timestamp': 30, 'end_timestamp': 40, 'created_at': 30,
+                  'img_checksum': 'e0e2eeb7e31c4c4b662a120e59f1df526daf09fca82cb617368e02ea53d162a6'}
+        httpserver.expect_request('/menus', method='POST', json=expect).respond_with_data(status=401)
+        async with AsyncItzMenuClient('user', 'wrong', f'http://{httpserver.host}:{httpserver.port}') as client:
+            assert await client.create_menu(WeekMenuCreate(**expect)) is None
+
+    async def test_get_menu_by_checksum(self, httpserver: HTTPServer, week_menus: list[dict[str, Any]]):
+        resp = week_menus[0]
+        httpserver.expect_request(f'/menus/menu/{resp["img_checksum"]}', method='GET').respond_with_json(resp)
+        async with AsyncItzMenuClient('user', 'password', f'http://{httpserver.host}:{httpserver.port}') as client:
+            response = await client.get_menu_by_id_or_checksum(resp['img_checksum'])
+        assert response.id == UUID(resp['id'])
+        assert response.img_checksum == resp['img_checksum']
+
+    async def test_get_menu_by_id_not_found(self, httpserver: HTTPServer):
+        (httpserver.expect_request('/menus/menu/835849f9-52e9-4479-8cc3-63ac96e75325', method='GET')
+         .respond_with_data(status=404))
+        async with AsyncItzMenuClient('user', 'password', f'http://{httpserver.host}:{httpserver.port}') as client:
+            assert await client.get_menu_by_id_or_checksum('835849f9-52e9-4479-8cc3-63ac96e75325') is None
+
+    async def test_get_menu_by_timestamp(self, httpserver: HTTPServer, week_menus: list[dict[str, Any]]):
+        resp = week_menus[1]
+        (httpserver.expect_request('/menus/menu', method='GET', query_string=f'timestamp={resp["end_timestamp"]}')
+         .respond_with_json(resp))
+        async with AsyncItzMenuClient('user', 'password', f'http://{httpserver.host}:{httpserver.port}') as client:
+            response = await client.get_menu_by_timestamp(resp['end_timestamp'])
+        assert response.id == UUID(resp['id'])
+
+    async def test_get_menu_by_timestamp_range(self, httpserver: HTTPServer, week_menus: list[dict[str, Any]]):
+        (httpserver.expect_request('/menus', method='GET', query_string='start=0&end=9999999999')
+         .respond_with_json(week_menus))
+        async with AsyncItzMenuClient('user', 'password', f'http://{httpserver.host}:{httpserver.port}') as client:
+            response = await client.get_menu_by_timestamp_range()
+        assert [menu.id for menu in response] == [UUID(menu['id']) for menu in week_menus]
+
+    async def test_update_menu(self, httpserver: HTTPServer, user: str, password: str, headers: dict[str, str]):
+        update = {'start_timestamp': 99, 'end_timestamp': 100, 'created_at': 99,
+                  'img_checksum': '03043c5abd66e979d1ab97f3be8a1bc2d8ba993b3374c774f93b698e1c8376b7'}
+        resp = {'id': '835849f9-52e9-4479-8cc3-63ac96e75325', **update}
+        httpserver.expect_request(f'/menus/menu/{resp["id"]}', method='PATCH', json=update,
+                                  headers=headers).respond_with_json(resp)
+        (httpserver.expect_request(f'/menus/menu/{resp["id"]}', method='PATCH', json=update)
+         .respond_with_data(status=401))
+        async with AsyncItzMenuClient(user, password, f'http://{httpserver.host}:{httpserver.port}') as client:
+            response = await client.update_menu(resp['id'], WeekMenuUpdate(**update))
+        assert response.start_timestamp == 99
+
+    async def test_delete_menu(self, httpserver: HTTPServer, user: str, password: str, headers: dict[str, str]):
+        (httpserver.expect_request(f'/menus/menu/835849f9-52e9-4479-8cc3-63ac96e75325', method='DELETE',
+                                   headers=headers).respond_with_data(status=204))
+        (httpserver.expect_request(f'/menus/menu/835849f9-52e9-4479-8cc3-63ac96e75325', method='DELETE')
+         .respond_with_data(status=401))
+        async with AsyncItzMenuClient(user, password, f'http://{httpserver.host}:{httpserver.port}') as client:
+            assert await client.delete_menu('835849f9-52e9-4479-8cc3-63ac96e75325')
+
+
+def upload_handler(request: Request, expect: dict[str, Any], image: bytes) -> Response:
+    """ Respond with the created menu if the multipart form contains the expected menu and image """
+    if json.loads(request.form['menu']) != expect or request.files['image'].read() != image:
+        return Response(status=400)
+    return Response(json.dumps({'id': '835849f9-52e9-4479-8cc3-63ac96e75325', **expect}), status=201,
+                    content_type='application/json')
@@ -1,14 +1,23 @@
 import argparse
 
-from itzmenu_extractor.jobs import Executor
+from itzmenu_extractor.config.settings import Settings
 
 
 def main():
     parser = argparse.ArgumentParser(description='ItzMenuExtractor')
     parser.add_argument('--preload', '-p', type=lambda s: [item for item in s.split(',')], default=[],
                         help='detect and save menus from images')
+    parser.add_argument('--ingest', '-i', type=str, default=None,
+                        help='detect and save menus from all images in a directory or matching a glob pattern')
     parser.add_argument('--log',  '-l', type=str, default='info', help='log level')
-    executor = Executor(parser.parse_args())
+    args = parser.parse_args()
+    # The executors are imported after parsing the arguments, so --help does not load them
+    if Settings().ocr_runtime == 'asyncio':
+        from itzmenu_extractor.async_jobs import AsyncExecutor
+        executor = AsyncExecutor(args)
+    else:
+        from itzmenu_extractor.jobs import Executor
+        executor = Executor(args)
     executor.start()
 
 
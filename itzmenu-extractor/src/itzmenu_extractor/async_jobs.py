@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging as log
+from argparse import Namespace
+from datetime import datetime
+from time import monotonic
+from typing import Awaitable, Callable, Iterable, TYPE_CHECKING
+
+import httpx
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+import itzmenu_extractor.util.image as image
+import itzmenu_extractor.util.trace as trace
+from itzmenu_extractor.config.settings import MenuSource, Settings
+from itzmenu_extractor.jobs import (build_menu, create_extraction_pool, extract_menu, menu_sources, perceptual_hash,
+                                    precompute_holidays, same_period, valid_filenames)
+from itzmenu_extractor.rest.client import AsyncMenuClient, NOT_MODIFIED
+from itzmenu_extractor.rest.requests import ImageRequest
+from itzmenu_extractor.util.checksums import ChecksumStore, PerceptualHashIndex
+from itzmenu_client.client import AsyncItzMenuClient
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class AsyncExecutor:
+    """
+    Runtime on an asyncio event loop. Fetching menus, checking for known menus and uploading them does not block the
+    loop, the extraction runs in a process pool. Each image is extracted only once even if it is received twice.
+    """
+
+    def __init__(self, args: Namespace):
+        log.basicConfig(level=args.log.upper())
+        self.__settings = s = Settings()
+        self.__scheduler = AsyncIOScheduler()
+        self.__sources = menu_sources(s)
+        self.__menu_clients = {source.name: AsyncMenuClient(source.host, ImageRequest(source.endpoint))
+                               for source in self.__sources}
+        # Caps the number of sources that are fetched and extracted concurrently, the pool is shared by all of them
+        self.__concurrency = asyncio.Semaphore(s.ocr_max_concurrency)
+        self.__itz_client = AsyncItzMenuClient(s.itzmenu_user_email, s.itzmenu_user_password, s.itzmenu_host)
+        self.__checksums = ChecksumStore(s.ocr_checksum_file)
+        self.__phashes = PerceptualHashIndex(s.ocr_phash_max_distance)
+        self.__pool = create_extraction_pool(s.ocr_workers)
+        self.__in_flight: set[str] = set()
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.__stopped: asyncio.Event | None = None
+        trace.set_sink(trace.log_sink if s.ocr_trace_enabled else None)
+        trace.set_profile_dir(s.ocr_profile_dir)
+        self.__args = args
+        for source in self.__sources:
+            self.__scheduler.add_job(self.fetch_menu, 'interval', args=[source], name=f'fetch_menu:{source.name}',
+                                     seconds=source.interval or s.ocr_check_interval, next_run_time=datetime.now())
+        self.__scheduler.add_job(self.preload_menu)
+        if getattr(args, 'ingest', None):
+            self.__scheduler.add_job(self.ingest_menus)
+
+    def start(self):
+        asyncio.run(self.run())
+
+    def stop(self):
+        if self.__loop is not None:
+            self.__loop.call_soon_threadsafe(self.__stopped.set)
+
+    async def run(self):
+        """ Run the scheduled jobs until the executor is stopped """
+        self.__loop = asyncio.get_running_loop()
+        self.__stopped = asyncio.Event()
+        precompute_holidays()
+        await self.sync_checksums()
+        self.__scheduler.start()
+        try:
+            await self.__stopped.wait()
+        finally:
+            self.__scheduler.shutdown(wait=False)
+            # The scheduler shuts down in a callback of the loop, which must run before the loop is closed
+            while self.__scheduler.running:
+                await asyncio.sleep(0)
+            for menu_client in self.__menu_clients.values():
+                await menu_client.aclose()
+            await self.__itz_client.aclose()
+            self.__pool.shutdown(cancel_futures=True)
+
+    async def sync_checksums(self):
+        """ Add the checksums of all menus stored by the service to the local checksum store """
+        try:
+            menus = await self.__itz_client.get_menu_by_timestamp_range()
+        except httpx.HTTPError as exc:
+            log.warning(f'Failed to synchronize checksums: {exc!r}')
+            return
+        self.__checksums.update(menu.img_checksum for menu in menus)
+        self.__phashes.update({menu.img_phash: (menu.start_timestamp, menu.end_timestamp) for menu in menus
+                               if menu.img_phash is not None})
+        log.info(f'Synchronized checksums, {len(self.__checksums)} menus are known')
+
+    async def preload_menu(self):
+        await self.__process_files(valid_filenames(self.__args.preload))
+
+    async def ingest_menus(self):
+        """ Extract the menus of all images in a directory tree or matching a glob pattern """
+        log.info(f'Ingesting menus from {self.__args.ingest} with {self.__settings.ocr_preload_workers} workers')
+        start = monotonic()
+        processed, skipped, failed = await self.__process_files(image.find_images(self.__args.ingest))
+        minutes = max(monotonic() - start, 1e-9) / 60
+        log.info(f'Ingested {processed} images in {minutes:.1f} minutes ({processed / minutes:.1f} images/min), '
+                 f'skipped {skipped} known images, failed to ingest {failed} images')
+
+    async def fetch_menu(self, source: MenuSource | None = None):
+        source = source if source is not None else self.__sources[0]
+        async with self.__concurrency:
+            if (menu := await self.__menu_clients[source.name].get_week_menu()) is None:
+                return
+            if menu is NOT_MODIFIED:
+                log.debug(f'Menu of {source.name} has not been modified since the last request')
+                return
+            log.info(f'Received menu of {source.name} with {len(menu)} bytes')
+            if await self.process_image(menu, source.layout) is None:
+                # Otherwise the next request would report the failed image as not modified
+                self.__menu_clients[source.name].forget_validators()
+
+    async def process_image(self, img: bytes, layout: str = 'default') -> bool | None:
+        """
+        Extract and upload the menu of an image unless it is already known or being extracted.
+        :param img: The image of the menu
+        :param layout: The layout profile of the menu table
+        :return: True if the menu was uploaded, False if it was skipped or None if the extraction or upload failed
+        """
+        async def load() -> bytes:
+            return img
+
+        return await self.__process(image.bytes_to_sha256(img), load, layout)
+
+    async def process_file(self, file: str) -> bool | None:
+        """
+        Extract and upload the menu of an image file. The file is only loaded if its menu is not known yet.
+        :param file: The path of the image
+        :return: The result of process_image
+        """
+        checksum = await asyncio.to_thread(image.file_to_sha256, file)
+        return await self.__process(checksum, functools.partial(asyncio.to_thread, image.load_image, file))
+
+    async def __process(self, checksum: str, load: Callable[[], Awaitable[bytes]],
+                        layout: str = 'default') -> bool | None:
+        if checksum in self.__in_flight:
+            log.debug(f'Menu with checksum {checksum} is already being extracted')
+            return False
+        self.__in_flight.add(checksum)
+        try:
+            if await self.__is_known(checksum):
+                return False
+            img = await load()
+            phash = await asyncio.to_thread(perceptual_hash, img, self.__settings)
+            if await self.__is_near_duplicate(checksum, phash, img):
+                return False
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(self.__pool, extract_menu, img, layout)
+            except Exception as exc:
+                log.error(f'Failed to extract menu with checksum {checksum}: {exc!r}')
+                return None
+            return await self.upload_menu(img, checksum, result, phash) or None
+        finally:
+            self.__in_flight.discard(checksum)
+
+    async def upload_menu(self, img: bytes | None, checksum: str,
+                          result: tuple[tuple[int, int], pd.DataFrame] | None, phash: str | None = None) -> bool:
+        if (menu := build_menu(checksum, result, phash)) is None:
+            return False
+        # The image is uploaded as binary file next to the menu
+        img = img if self.__settings.ocr_save_images else None
+        if (resp := await self.__itz_client.create_menu(menu, img)) is not None:
+            log.info(f'Inserted menu with id {resp.id}')
+            self.__checksums.add(checksum)
+            if phash is not None:
+                self.__phashes.add(phash, result[0])
+            return True
+        log.warning(f'Failed to insert menu')
+        return False
+
+    async def __is_known(self, checksum: str) -> bool:
+        """ Check the local checksum store before asking the service whether the menu already exists """
+        if checksum in self.__checksums:
+            log.debug(f'Menu with checksum {checksum} is already known')
+            return True
+        if await self.__itz_client.get_menu_by_id_or_checksum(checksum) is not None:
+            log.info(f'Menu with checksum {checksum} already exists')
+            self.__checksums.add(checksum)
+            return True
+        return False
+
+    async def __is_near_duplicate(self, checksum: str, phash: str | None, img: bytes) -> bool:
+        """ Check whether a near-identical image of the same week, e.g. a recompressed copy, is already known """
+        if phash is None or (known := self.__phashes.find(phash)) is None:
+            return False
+        if not await asyncio.to_thread(same_period, img, self.__phashes.period(known)):
+            log.info(f'Menu with checksum {checksum} resembles the image with hash {known}, but not its period')
+            return False
+        log.info(f'Menu with checksum {checksum} is a near-duplicate of the image with hash {known}')
+        return True
+
+    async def __process_files(self, files: Iterable[str]) -> tuple[int, int, int]:
+        """
+        Extract the menus of the files with only a few of them in flight at once, so memory usage stays flat.
+        :return: The number of processed, skipped and failed files
+        """
+        semaphore = asyncio.Semaphore(self.__settings.ocr_preload_workers * 2)
+        counts = {True: 0, False: 0, None: 0}
+        tasks = set()
+
+        async def process(file: str):
+            try:
+                result = await self.process_file(file)
+            except Exception as exc:
+                log.error(f'Failed to process {file}: {exc!r}')
+                result = None
+            finally:
+                semaphore.release()
+            counts[result] += 1
+
+        for file in files:
+            await semaphore.acquire()
+            # Only the running tasks are kept, the finished ones are only counted
+            tasks.add(task := asyncio.create_task(process(file)))
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        return counts[True], counts[False], counts[None]
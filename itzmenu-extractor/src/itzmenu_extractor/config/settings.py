@@ -1,8 +1,17 @@
-from pydantic import Field
+from pydantic import BaseModel, Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import re
 
 
+class MenuSource(BaseModel):
+    name: str = Field(default='ivi', pattern=r'^[a-zA-Z0-9_-]+$')
+    host: str = Field(default='https://ivi.de', pattern=r'^http(s)?://[a-zA-Z0-9-]+(\.[a-zA-Z0-9-]+)*(:[0-9]+)?$')
+    endpoint: str = Field(default='media/img/speiseplanWeek.jpg')
+    # Defaults to ocr_check_interval
+    interval: int | None = Field(default=None, ge=1)
+    layout: str = Field(default='default')
+
+
 class Settings(BaseSettings):
     log_level: str = Field(default='INFO', pattern=r'^(NOTSET|DEBUG|INFO|WARNING|ERROR|CRITICAL)$')
     itzmenu_user_email: str = Field(default='')
@@ -13,9 +22,49 @@ class Settings(BaseSettings):
     ocr_save_images: bool = Field(default=False)
     google_cloud_vision_api_key: str = Field(default='')
     google_cloud_vision_enabled: bool = Field(default=False)
+    google_cloud_vision_endpoint: str = Field(default='https://vision.googleapis.com',
+                                              pattern=r'^http(s)?://[a-zA-Z0-9-]+(\.[a-zA-Z0-9-]+)*(:[0-9]+)?$')
+    google_cloud_vision_batch_size: int = Field(default=1, ge=1, le=16)
+    google_cloud_vision_batch_delay: float = Field(default=0.5, ge=0)
+    ocr_cache_file: str = Field(default='')
+    ocr_cache_memory_size: int = Field(default=32, ge=0)
+    ocr_cache_max_size: int = Field(default=268435456, ge=0)
+    ocr_cache_max_age: int = Field(default=31536000, ge=0)
+    ocr_cache_memory_max_bytes: int = Field(default=67108864, ge=0)
+    ocr_low_memory: bool = Field(default=False)
+    ocr_preload_workers: int = Field(default=1, ge=1)
+    ocr_table_workers: int = Field(default=1, ge=1)
+    ocr_checksum_file: str = Field(default='')
+    ocr_trace_enabled: bool = Field(default=False)
+    ocr_profile_dir: str = Field(default='')
+    ocr_grid_enabled: bool = Field(default=True)
+    ocr_holiday_first_year: int = Field(default=2020, ge=1970)
+    ocr_holiday_last_year: int = Field(default=2040, ge=1970)
+    ocr_holiday_subdiv: str = Field(default='SH')
+    ocr_runtime: str = Field(default='blocking', pattern=r'^(blocking|asyncio)$')
+    ocr_workers: int = Field(default=1, ge=1)
+    ocr_sources: list[MenuSource] = Field(default_factory=lambda: [MenuSource()], min_length=1)
+    ocr_max_concurrency: int = Field(default=2, ge=1)
+    ocr_phash_enabled: bool = Field(default=True)
+    ocr_phash_max_distance: int = Field(default=10, ge=0, le=256)
+    ocr_engine: str = Field(default='tesseract', pattern=r'^(tesseract|tesserocr)$')
+    ocr_tessdata_dir: str = Field(default='')
+    ocr_refine_enabled: bool = Field(default=True)
+    ocr_refine_min_confidence: int = Field(default=70, ge=0, le=100)
+    ocr_refine_scale: float = Field(default=2.0, ge=1)
+    ocr_refine_psm: int = Field(default=6, ge=0, le=13)
+    ocr_queue_size: int = Field(default=4, ge=1)
+    ocr_queue_timeout: float = Field(default=5.0, ge=0)
 
     model_config = SettingsConfigDict(env_file='settings.env', env_file_encoding='utf-8')
 
+    @field_validator('ocr_sources')
+    @classmethod
+    def unique_source_names(cls, sources: list[MenuSource]) -> list[MenuSource]:
+        if len({source.name for source in sources}) != len(sources):
+            raise ValueError('The names of the sources must be unique')
+        return sources
+
     def __str__(self):
         truncated_password = re.sub(r'[a-zA-Z0-9-]+', 'XXX', self.itzmenu_user_password)
         truncated_api_key = re.sub(r'[a-zA-Z0-9-]+', 'XXX', self.google_cloud_vision_api_key)
@@ -23,4 +72,23 @@ class Settings(BaseSettings):
                f'itzmenu_user_password={truncated_password}, itzmenu_host={self.itzmenu_host}, ' \
                f'ocr_check_interval={self.ocr_check_interval}, ocr_save_images={self.ocr_save_images}, ' \
                f'google_cloud_vision_api_key={truncated_api_key}, ' \
-               f'google_cloud_vision_enabled={self.google_cloud_vision_enabled})'
+               f'google_cloud_vision_enabled={self.google_cloud_vision_enabled}, ' \
+               f'google_cloud_vision_endpoint={self.google_cloud_vision_endpoint}, ' \
+               f'google_cloud_vision_batch_size={self.google_cloud_vision_batch_size}, ' \
+               f'google_cloud_vision_batch_delay={self.google_cloud_vision_batch_delay}, ' \
+               f'ocr_cache_file={self.ocr_cache_file}, ocr_cache_memory_size={self.ocr_cache_memory_size}, ' \
+               f'ocr_cache_max_size={self.ocr_cache_max_size}, ocr_cache_max_age={self.ocr_cache_max_age}, ' \
+               f'ocr_cache_memory_max_bytes={self.ocr_cache_memory_max_bytes}, ocr_low_memory={self.ocr_low_memory}, ' \
+               f'ocr_preload_workers={self.ocr_preload_workers}, ocr_table_workers={self.ocr_table_workers}, ' \
+               f'ocr_checksum_file={self.ocr_checksum_file}, ocr_trace_enabled={self.ocr_trace_enabled}, ' \
+               f'ocr_profile_dir={self.ocr_profile_dir}, ocr_grid_enabled={self.ocr_grid_enabled}, ' \
+               f'ocr_holiday_first_year={self.ocr_holiday_first_year}, ' \
+               f'ocr_holiday_last_year={self.ocr_holiday_last_year}, ocr_holiday_subdiv={self.ocr_holiday_subdiv}, ' \
+               f'ocr_runtime={self.ocr_runtime}, ocr_workers={self.ocr_workers}, ' \
+               f'ocr_sources={[source.name for source in self.ocr_sources]}, ' \
+               f'ocr_max_concurrency={self.ocr_max_concurrency}, ocr_phash_enabled={self.ocr_phash_enabled}, ' \
+               f'ocr_phash_max_distance={self.ocr_phash_max_distance}, ocr_engine={self.ocr_engine}, ' \
+               f'ocr_tessdata_dir={self.ocr_tessdata_dir}, ocr_refine_enabled={self.ocr_refine_enabled}, ' \
+               f'ocr_refine_min_confidence={self.ocr_refine_min_confidence}, ' \
+               f'ocr_refine_scale={self.ocr_refine_scale}, ocr_refine_psm={self.ocr_refine_psm}, ' \
+               f'ocr_queue_size={self.ocr_queue_size}, ocr_queue_timeout={self.ocr_queue_timeout})'
@@ -1,63 +1,387 @@
+from __future__ import annotations
+
 import logging as log
+import queue
 import re
+import threading
 from argparse import Namespace
+from concurrent.futures import (Executor as PoolExecutor, ProcessPoolExecutor, ThreadPoolExecutor, Future, wait,
+                                FIRST_COMPLETED, ALL_COMPLETED)
 from datetime import datetime
+from time import monotonic
+from typing import Iterable, TYPE_CHECKING
 
+import requests
 from apscheduler.schedulers.blocking import BlockingScheduler
 
-import itzmenu_extractor.ocr.extractor as extractor
-import itzmenu_extractor.ocr.postprocess as postprocess
+import itzmenu_extractor.ocr.layouts as layouts
 import itzmenu_extractor.util.image as image
-import itzmenu_extractor.util.time as time
-from itzmenu_extractor.rest.client import MenuClient
-from itzmenu_extractor.config.settings import Settings
+import itzmenu_extractor.util.memory as memory
+import itzmenu_extractor.util.trace as trace
+from itzmenu_extractor.util.checksums import ChecksumStore, PerceptualHashIndex
+from itzmenu_extractor.util.image_queue import ImageQueue, QueuedImage, QueueMetrics
+from itzmenu_extractor.rest.client import MenuClient, NOT_MODIFIED
+from itzmenu_extractor.rest.requests import ImageRequest
+from itzmenu_extractor.config.settings import MenuSource, Settings
+from itzmenu_api.persistence.schemas import WeekMenuCreate
 from itzmenu_client.client import ItzMenuClient
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 class Executor:
+    """
+    Runtime on a blocking scheduler. The fetch jobs only put the received images into a bounded queue, which is drained
+    by a separate pool of OCR workers, so a slow extraction does not delay the next fetch.
+    """
+
     def __init__(self, args: Namespace):
         log.basicConfig(level=args.log.upper())
         self.__settings = s = Settings()
+        # The number of concurrent extractions is capped by the OCR workers, not by the threads of the scheduler, so
+        # the preload and ingest jobs do not keep the fetch jobs from running
         self.__scheduler = BlockingScheduler()
-        self.__menu_client = MenuClient()
+        self.__sources = menu_sources(s)
+        self.__menu_clients = {source.name: MenuClient(source.host, ImageRequest(source.endpoint))
+                               for source in self.__sources}
         self.__itz_client = ItzMenuClient(s.itzmenu_user_email, s.itzmenu_user_password, s.itzmenu_host)
+        self.__checksums = ChecksumStore(s.ocr_checksum_file)
+        self.__phashes = PerceptualHashIndex(s.ocr_phash_max_distance)
+        self.__queue = ImageQueue(s.ocr_queue_size)
+        self.__workers: ThreadPoolExecutor | None = None
+        trace.set_sink(trace.log_sink if s.ocr_trace_enabled else None)
+        trace.set_profile_dir(s.ocr_profile_dir)
         self.__args = args
-        self.__scheduler.add_job(self.fetch_menu, 'interval', seconds=s.ocr_check_interval,
-                                 next_run_time=datetime.now())
+        for source in self.__sources:
+            self.__scheduler.add_job(self.fetch_menu, 'interval', args=[source], name=f'fetch_menu:{source.name}',
+                                     seconds=source.interval or s.ocr_check_interval, next_run_time=datetime.now())
         self.__scheduler.add_job(self.preload_menu)
+        if getattr(args, 'ingest', None):
+            self.__scheduler.add_job(self.ingest_menus)
 
     def start(self):
+        precompute_holidays()
+        self.sync_checksums()
+        self.start_workers()
         return self.__scheduler.start()
 
     def stop(self):
-        return self.__scheduler.shutdown()
+        result = self.__scheduler.shutdown()
+        # The running extractions are finished, the images that are still queued are discarded
+        self.__queue.close()
+        if self.__workers is not None:
+            self.__workers.shutdown()
+        return result
 
-    def preload_menu(self):
-        for value in self.__args.preload:
-            if re.match(r'^([A-Z]:)?[a-zA-Z0-9\\/_-]+\.jpg$', value) is not None:
-                self.process_image(image.load_image(value))
-            else:
-                log.warning(f'Invalid filename: {value}')
-
-    def fetch_menu(self):
-        if (menu := self.__menu_client.get_week_menu()) is None:
+    def start_workers(self):
+        """ Start the OCR workers draining the queue of received images """
+        if self.__workers is not None:
             return
-        log.info(f'Received menu with {len(menu)} bytes')
-        self.process_image(menu)
+        workers = self.__settings.ocr_workers
+        self.__workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr_worker')
+        for _ in range(workers):
+            self.__workers.submit(self.__drain_queue)
 
-    def process_image(self, img: bytes):
-        checksum = f'{image.bytes_to_sha256(img)}'
-        if self.__itz_client.get_menu_by_id_or_checksum(checksum) is not None:
-            log.info(f'Menu with checksum {checksum} already exists')
+    def wait_for_queue(self, timeout: float | None = None) -> bool:
+        """
+        Wait until the OCR workers have processed all queued images.
+        :param timeout: The maximum number of seconds to wait, None waits indefinitely
+        :return: True if all images have been processed
+        """
+        return self.__queue.join(timeout)
+
+    def queue_metrics(self) -> QueueMetrics:
+        return self.__queue.metrics()
+
+    def sync_checksums(self):
+        """ Add the checksums of all menus stored by the service to the local checksum store """
+        try:
+            menus = self.__itz_client.get_menu_by_timestamp_range()
+        except requests.RequestException as exc:
+            log.warning(f'Failed to synchronize checksums: {exc!r}')
             return
-        if (p := extractor.period_of_validity(img)) is None or (df := extractor.img_to_dataframe(img)) is None:
-            log.warning(f'Failed to extract menu from image')
+        self.__checksums.update(menu.img_checksum for menu in menus)
+        self.__phashes.update({menu.img_phash: (menu.start_timestamp, menu.end_timestamp) for menu in menus
+                               if menu.img_phash is not None})
+        log.info(f'Synchronized checksums, {len(self.__checksums)} menus are known')
+
+    def preload_menu(self):
+        files = valid_filenames(self.__args.preload)
+        if (workers := self.__settings.ocr_preload_workers) > 1 and len(files) > 1:
+            log.info(f'Preloading {len(files)} menus with {workers} workers')
+            self.__process_files(files, workers)
+        else:
+            for file in files:
+                self.process_image(image.load_image(file))
+
+    def ingest_menus(self):
+        """ Extract the menus of all images in a directory tree or matching a glob pattern """
+        workers = self.__settings.ocr_preload_workers
+        log.info(f'Ingesting menus from {self.__args.ingest} with {workers} workers')
+        start = monotonic()
+        processed, skipped = self.__process_files(image.find_images(self.__args.ingest), workers)
+        minutes = max(monotonic() - start, 1e-9) / 60
+        log.info(f'Ingested {processed} images in {minutes:.1f} minutes ({processed / minutes:.1f} images/min), '
+                 f'skipped {skipped} known images')
+
+    def fetch_menu(self, source: MenuSource | None = None):
+        source = source if source is not None else self.__sources[0]
+        if (menu := self.__menu_clients[source.name].get_week_menu()) is None:
+            return
+        if menu is NOT_MODIFIED:
+            log.debug(f'Menu of {source.name} has not been modified since the last request')
             return
-        log.info(f'Extracted dataframe with {df.shape[0]} rows and {df.shape[1]} columns')
-        log.info(f'Extracted time period: {time.timestamp_to_date(p[0])} - {time.timestamp_to_date(p[1])}')
-        img_base64 = image.bytes_to_base64(img) if self.__settings.ocr_save_images else None
-        menu = postprocess.dataframe_to_week_menu(df, p, checksum, img_base64)
-        if (resp := self.__itz_client.create_menu(menu)) is not None:
+        log.info(f'Received menu of {source.name} with {len(menu)} bytes')
+        self.enqueue_image(menu, source)
+
+    def enqueue_image(self, img: bytes, source: MenuSource) -> bool:
+        """
+        Hand an image over to the OCR workers, waiting for a free slot while the queue is full.
+        :param img: The image of the menu
+        :param source: The source the image was received from
+        :return: True if the image was queued, False if it is already queued or the queue stayed full
+        """
+        item = QueuedImage(img, image.bytes_to_sha256(img), source.layout, source.name)
+        try:
+            if not self.__queue.put(item, timeout=self.__settings.ocr_queue_timeout):
+                log.debug(f'Menu with checksum {item.checksum} is already queued')
+                return False
+        except queue.Full:
+            log.warning(f'Dropped menu of {source.name}, the queue of {self.__settings.ocr_queue_size} images is full')
+            # Otherwise the next request would report the dropped image as not modified
+            self.__menu_clients[source.name].forget_validators()
+            return False
+        log.debug(f'Queued menu with checksum {item.checksum}, {self.__queue.metrics().depth} images are queued')
+        return True
+
+    def process_image(self, img: bytes, layout: str = 'default', checksum: str | None = None) -> bool | None:
+        """
+        Extract and upload the menu of an image unless it is already known.
+        :param img: The image of the menu
+        :param layout: The layout profile of the menu table
+        :param checksum: The checksum of the image, computed if not given
+        :return: True if the menu was uploaded, False if it was skipped or None if the extraction or upload failed
+        """
+        checksum = checksum if checksum is not None else image.bytes_to_sha256(img)
+        if self.__is_known(checksum):
+            return False
+        phash = perceptual_hash(img, self.__settings)
+        if self.__is_near_duplicate(checksum, phash, img):
+            return False
+        return self.upload_menu(img, checksum, extract_menu(img, layout), phash) or None
+
+    def upload_menu(self, img: bytes | None, checksum: str, result: tuple[tuple[int, int], pd.DataFrame] | None,
+                    phash: str | None = None) -> bool:
+        if (menu := build_menu(checksum, result, phash)) is None:
+            return False
+        # The image is uploaded as binary file next to the menu
+        img = img if self.__settings.ocr_save_images else None
+        if (resp := self.__itz_client.create_menu(menu, img)) is not None:
             log.info(f'Inserted menu with id {resp.id}')
+            self.__checksums.add(checksum)
+            if phash is not None:
+                self.__phashes.add(phash, result[0])
+            return True
+        log.warning(f'Failed to insert menu')
+        return False
+
+    def __drain_queue(self):
+        """ Process the queued images until the queue is closed """
+        while (item := self.__queue.get()) is not None:
+            m = self.__queue.metrics()
+            log.info(f'Processing menu with checksum {item.checksum} after {monotonic() - item.enqueued_at:.1f} s in '
+                     f'the queue ({m.depth} queued, mean wait {m.mean_wait:.1f} s, max wait {m.max_wait:.1f} s)')
+            processed = None
+            try:
+                processed = self.process_image(item.img, item.layout, item.checksum)
+            except Exception as exc:
+                log.error(f'Failed to process menu with checksum {item.checksum}: {exc!r}')
+            finally:
+                if processed is None and item.source is not None:
+                    # Otherwise the next request would report the failed image as not modified
+                    self.__menu_clients[item.source].forget_validators()
+                self.__queue.task_done(item)
+
+    def __is_known(self, checksum: str) -> bool:
+        """ Check the local checksum store before asking the service whether the menu already exists """
+        if checksum in self.__checksums:
+            log.debug(f'Menu with checksum {checksum} is already known')
+            return True
+        if self.__itz_client.get_menu_by_id_or_checksum(checksum) is not None:
+            log.info(f'Menu with checksum {checksum} already exists')
+            self.__checksums.add(checksum)
+            return True
+        return False
+
+    def __is_near_duplicate(self, checksum: str, phash: str | None, img: bytes) -> bool:
+        """ Check whether a near-identical image of the same week, e.g. a recompressed copy, is already known """
+        if phash is None or (known := self.__phashes.find(phash)) is None:
+            return False
+        if not same_period(img, self.__phashes.period(known)):
+            log.info(f'Menu with checksum {checksum} resembles the image with hash {known}, but not its period')
+            return False
+        log.info(f'Menu with checksum {checksum} is a near-duplicate of the image with hash {known}')
+        return True
+
+    def __process_files(self, files: Iterable[str], workers: int) -> tuple[int, int]:
+        """
+        Extract the menus of the files in a process pool and upload the results from the calling thread.
+        The files are consumed lazily and only a few of them are in flight at once, so memory usage stays flat.
+        A file is only loaded once its checksum is unknown, the loaded bytes are passed on to the extraction.
+        :return: The number of processed and skipped files
+        """
+        processed = skipped = 0
+        with create_extraction_pool(workers) as pool:
+            pending = {}
+            for file in files:
+                checksum = image.file_to_sha256(file)
+                if checksum in (c for c, _, _ in pending.values()) or self.__is_known(checksum):
+                    skipped += 1
+                    continue
+                img = image.load_image(file)
+                phash = perceptual_hash(img, self.__settings)
+                if self.__is_near_duplicate(checksum, phash, img):
+                    skipped += 1
+                    continue
+                pending[pool.submit(extract_menu, img)] = checksum, phash, img
+                if len(pending) >= workers * 2:
+                    processed += self.__upload_completed(pending, FIRST_COMPLETED)
+            processed += self.__upload_completed(pending, ALL_COMPLETED)
+        return processed, skipped
+
+    def __upload_completed(self, pending: dict[Future, tuple[str, str | None, bytes]], return_when: str) -> int:
+        """ Wait for pending extractions and upload their results """
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            checksum, phash, img = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as exc:
+                log.error(f'Failed to extract menu with checksum {checksum}: {exc!r}')
+                continue
+            self.upload_menu(img, checksum, result, phash)
+        return len(done)
+
+
+@memory.releases_memory
+@trace.profiled('extract_menu')
+def extract_menu(img: bytes, layout: str = 'default') -> tuple[tuple[int, int], pd.DataFrame] | None:
+    """
+    Extract the period of validity and the menu table from an image.
+    :param img: The image of the menu
+    :param layout: The layout profile of the menu table
+    :return: The period of validity and the dataframe or None if the extraction failed
+    """
+    # The OCR dependencies are only imported once the first image is extracted
+    import itzmenu_extractor.ocr.extractor as extractor
+    return extractor.extract_week(img, layout=layout)
+
+
+def precompute_holidays() -> threading.Thread:
+    """
+    Precompute the holidays in a background thread instead of populating them during the first extraction.
+    :return: The started thread
+    """
+    def precompute():
+        import itzmenu_extractor.util.time as time
+        calendar = time.get_calendar()
+        log.debug(f'Precomputed holidays of the years {calendar.years.start}-{calendar.years.stop - 1}')
+
+    thread = threading.Thread(target=precompute, name='precompute_holidays', daemon=True)
+    thread.start()
+    return thread
+
+
+def perceptual_hash(img: bytes, settings: Settings) -> str | None:
+    """
+    Compute the perceptual hash of an image if the detection of near-duplicates is enabled.
+    :param img: The image of the menu
+    :param settings: The settings
+    :return: The hash or None if the detection is disabled or the image cannot be decoded
+    """
+    if not settings.ocr_phash_enabled:
+        return None
+    try:
+        return image.perceptual_hash(img)
+    except Exception as exc:
+        log.debug(f'Failed to compute perceptual hash: {exc!r}')
+        return None
+
+
+def same_period(img: bytes, period: tuple[int, int] | None) -> bool:
+    """
+    Check whether an image is valid for a period. Only the header is read unless it does not contain the period, so
+    this is much cheaper than the extraction.
+    :param img: The image of the menu
+    :param period: The period of validity of a known menu
+    :return: True if the period of the image is the given period, False if it differs or cannot be read
+    """
+    import itzmenu_extractor.ocr.extractor as extractor
+    if period is None:
+        return False
+    try:
+        return extractor.period_of_validity(img) == tuple(period)
+    except Exception as exc:
+        log.debug(f'Failed to read period of validity: {exc!r}')
+        return False
+
+
+def create_extraction_pool(workers: int) -> PoolExecutor:
+    """
+    Create the pool running the extractions. Batched Vision requests only combine the images of one process, so the
+    extractions run in threads if batching is enabled. The number of workers should then be at least the batch size.
+    :param workers: The number of workers
+    :return: The pool
+    """
+    s = Settings()
+    if s.google_cloud_vision_enabled and s.google_cloud_vision_batch_size > 1:
+        return ThreadPoolExecutor(max_workers=workers)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def menu_sources(settings: Settings) -> list[MenuSource]:
+    """
+    Get the configured menu sources.
+    :param settings: The settings
+    :return: The menu sources
+    :raises ValueError: If a source refers to an unknown layout profile
+    """
+    if unknown := sorted({source.layout for source in settings.ocr_sources} - layouts.LAYOUTS.keys()):
+        raise ValueError(f'Unknown layout profiles: {", ".join(unknown)}')
+    return settings.ocr_sources
+
+
+def valid_filenames(values: list[str]) -> list[str]:
+    """
+    Filter the file names of images to preload.
+    :param values: The file names passed on the command line
+    :return: The valid file names
+    """
+    files = []
+    for value in values:
+        if re.match(r'^([A-Z]:)?[a-zA-Z0-9\\/_-]+\.jpg$', value) is not None:
+            files.append(value)
         else:
-            log.warning(f'Failed to insert menu')
+            log.warning(f'Invalid filename: {value}')
+    return files
+
+
+def build_menu(checksum: str, result: tuple[tuple[int, int], pd.DataFrame] | None,
+               phash: str | None = None) -> WeekMenuCreate | None:
+    """
+    Convert the result of an extraction to the menu that is uploaded to the service.
+    :param checksum: The checksum of the image
+    :param result: The result of extract_menu
+    :param phash: The perceptual hash of the image
+    :return: The menu or None if the extraction failed
+    """
+    import itzmenu_extractor.ocr.postprocess as postprocess
+    import itzmenu_extractor.util.time as time
+    if result is None:
+        log.warning(f'Failed to extract menu from image')
+        return None
+    p, df = result
+    log.info(f'Extracted dataframe with {df.shape[0]} rows and {df.shape[1]} columns')
+    log.info(f'Extracted time period: {time.timestamp_to_date(p[0])} - {time.timestamp_to_date(p[1])}')
+    return postprocess.dataframe_to_week_menu(df, p, checksum, None, phash)
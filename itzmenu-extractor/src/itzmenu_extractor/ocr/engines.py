@@ -0,0 +1,262 @@
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+import PIL.Image as PImage
+import numpy as np
+import polars as pl
+import requests
+from img2table.document.base import Document
+from img2table.ocr import TesseractOCR, VisionOCR
+from img2table.ocr.data import OCRDataframe
+from img2table.ocr.google_vision import VisionContent, VisionEndpointContent
+
+from itzmenu_extractor.config.settings import Settings
+
+
+class ShardedTesseractOCR(TesseractOCR):
+    """
+    Tesseract instance that splits each page at full-height separator lines into vertical shards (the columns of the
+    menu table) and runs one tesseract process per shard concurrently. The word boxes are shifted back into page
+    coordinates, so img2table assigns them to the same cells as with a single pass over the page.
+    """
+
+    def __init__(self, n_threads: int = 1, lang: str = 'deu', psm: int = 11, min_shard_width: int = 100):
+        super().__init__(n_threads=n_threads, lang=lang, psm=psm)
+        self.min_shard_width = min_shard_width
+
+    def content(self, document: Document) -> list[list[tuple[int, str]]]:
+        with ThreadPoolExecutor(max_workers=self.n_threads) as pool:
+            pages = []
+            for image in document.images:
+                offsets = self.shard_offsets(image)
+                shards = [image[:, start:end] for start, end in zip(offsets, offsets[1:] + [image.shape[1]])]
+                pages.append(list(zip(offsets, pool.map(self.hocr, shards))))
+        return pages
+
+    def to_ocr_dataframe(self, content: list[list[tuple[int, str]]]) -> OCRDataframe | None:
+        list_dfs = []
+        for page, shards in enumerate(content):
+            for i, (offset, hocr) in enumerate(shards):
+                if (ocr_df := super().to_ocr_dataframe([hocr])) is None:
+                    continue
+                # Move the boxes into page coordinates and keep the element ids unique across shards
+                list_dfs.append(ocr_df.df.with_columns(pl.lit(page, dtype=pl.Int64).alias('page'),
+                                                       pl.col('x1') + offset, pl.col('x2') + offset,
+                                                       (pl.lit(f'{i}_') + pl.col('id')).alias('id'),
+                                                       (pl.lit(f'{i}_') + pl.col('parent')).alias('parent')))
+        return OCRDataframe(df=pl.concat(list_dfs)) if list_dfs else None
+
+    def shard_offsets(self, image: np.ndarray) -> list[int]:
+        """
+        Determine where the image can be split without cutting through text.
+        :param image: The page to split
+        :return: The x offsets at which the shards start
+        """
+        gray = image if image.ndim == 2 else image.min(axis=2)
+        # Columns that are dark over the full height are separator lines
+        dark = np.flatnonzero(gray.max(axis=0) < 128)
+        offsets = [0]
+        for x in dark:
+            if x - offsets[-1] >= self.min_shard_width and image.shape[1] - x >= self.min_shard_width:
+                offsets.append(int(x))
+        return offsets
+
+
+class TesserocrEngines:
+    """
+    Warm tesseract engines running in-process via tesserocr. The language data is loaded once per engine and the
+    engines are reused across calls, each engine is used by one thread at a time.
+    """
+
+    def __init__(self, lang: str = 'deu', tessdata_dir: str = ''):
+        self.__lang = lang
+        self.__tessdata_dir = tessdata_dir
+        self.__idle: queue.SimpleQueue = queue.SimpleQueue()
+
+    def image_to_string(self, image: np.ndarray | PImage.Image, psm: int = 3, whitelist: str = '') -> str:
+        """
+        Recognize the text of an image.
+        :param image: The image
+        :param psm: The page segmentation mode
+        :param whitelist: The characters to recognize, all characters if it is empty
+        :return: The text
+        """
+        return self.__run(image, psm, whitelist, lambda api: api.GetUTF8Text())
+
+    def image_to_hocr(self, image: np.ndarray | PImage.Image, psm: int = 11) -> str:
+        """
+        Recognize the words of an image.
+        :param image: The image
+        :param psm: The page segmentation mode
+        :return: The hOCR HTML of the image
+        """
+        return self.__run(image, psm, '', lambda api: api.GetHOCRText(0))
+
+    def __run(self, image: np.ndarray | PImage.Image, psm: int, whitelist: str, result) -> str:
+        try:
+            api = self.__idle.get_nowait()
+        except queue.Empty:
+            api = self.__create()
+        try:
+            api.SetPageSegMode(psm)
+            api.SetVariable('tessedit_char_whitelist', whitelist)
+            api.SetImage(image if isinstance(image, PImage.Image) else PImage.fromarray(image))
+            return result(api)
+        finally:
+            api.Clear()
+            self.__idle.put(api)
+
+    def __create(self):
+        # tesserocr is an optional dependency that is only required by this engine
+        import tesserocr
+        if self.__tessdata_dir:
+            return tesserocr.PyTessBaseAPI(path=self.__tessdata_dir, lang=self.__lang)
+        return tesserocr.PyTessBaseAPI(lang=self.__lang)
+
+
+class TesserocrOCR(TesseractOCR):
+    """ Tesseract instance recognizing the pages with the warm in-process engines instead of a tesseract process """
+
+    def __init__(self, n_threads: int = 1, lang: str = 'deu', psm: int = 11, engines: TesserocrEngines | None = None):
+        # Unlike the parent, the tesseract executable is not required
+        self.n_threads = n_threads
+        self.lang = lang
+        self.psm = psm
+        self.engines = engines if engines is not None else get_tesserocr_engines(lang)
+
+    def hocr(self, image: np.ndarray) -> str:
+        return self.engines.image_to_hocr(image, psm=self.psm)
+
+
+class ShardedTesserocrOCR(ShardedTesseractOCR, TesserocrOCR):
+    """ Sharded tesseract instance recognizing the shards with the warm in-process engines """
+
+
+class VisionBatcher:
+    """
+    Collects the images submitted by concurrent extractions and sends them to Google Cloud Vision in batched
+    images:annotate requests. A batch is sent once it is full or the oldest image waited for max_delay seconds.
+    """
+
+    def __init__(self, api_key: str, endpoint: str = 'https://vision.googleapis.com', batch_size: int = 16,
+                 max_delay: float = 0.5, timeout: int = 15):
+        self.__api_key = api_key
+        self.__url = f'{endpoint.rstrip("/")}/v1/images:annotate'
+        self.__batch_size = batch_size
+        self.__max_delay = max_delay
+        self.__timeout = timeout
+        self.__lock = threading.Lock()
+        self.__pending: list[tuple[np.ndarray, Future]] = []
+        self.__timer: threading.Timer | None = None
+        self.__session = requests.Session()
+
+    def submit(self, image: np.ndarray) -> Future:
+        """
+        Add an image to the next batch.
+        :param image: The image to recognize
+        :return: A future of the annotation of the image
+        """
+        future = Future()
+        with self.__lock:
+            self.__pending.append((image, future))
+            if len(self.__pending) >= self.__batch_size:
+                batch = self.__take()
+            else:
+                batch = []
+                if self.__timer is None:
+                    self.__timer = threading.Timer(self.__max_delay, self.flush)
+                    self.__timer.daemon = True
+                    self.__timer.start()
+        if batch:
+            self.__send(batch)
+        return future
+
+    def flush(self):
+        """ Send the pending images without waiting for the batch to be full """
+        with self.__lock:
+            batch = self.__take()
+        if batch:
+            self.__send(batch)
+
+    def __take(self) -> list[tuple[np.ndarray, Future]]:
+        batch, self.__pending = self.__pending, []
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        return batch
+
+    def __send(self, batch: list[tuple[np.ndarray, Future]]):
+        payload = {'requests': [{'image': {'content': VisionContent.img_to_b64(img=image)},
+                                 'features': [{'type': 'DOCUMENT_TEXT_DETECTION'}]} for image, _ in batch]}
+        try:
+            response = self.__session.post(self.__url, json=payload, params={'key': self.__api_key},
+                                           timeout=self.__timeout)
+            response.raise_for_status()
+            annotations = response.json()['responses']
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        for (_, future), annotation in zip(batch, annotations):
+            if 'error' in annotation:
+                future.set_exception(RuntimeError(f'Vision request failed: {annotation["error"]}'))
+            else:
+                future.set_result(annotation)
+        for _, future in batch[len(annotations):]:
+            future.set_exception(RuntimeError('Vision response is missing annotations'))
+
+
+class BatchedVisionOCR(VisionOCR):
+    """ Google Cloud Vision instance that sends the pages through a shared VisionBatcher """
+
+    def __init__(self, batcher: VisionBatcher):
+        self.batcher = batcher
+
+    def content(self, document: Document) -> list[list[dict[str, Any]]]:
+        images = document.images
+        futures = [self.batcher.submit(image) for image in images]
+        pages = []
+        for page, (image, future) in enumerate(zip(images, futures)):
+            if 'fullTextAnnotation' not in (annotation := future.result()):
+                # Vision omits the annotation if the page contains no text
+                pages.append([])
+                continue
+            pages.append(VisionEndpointContent.map_response(response={'responses': [annotation]}, page=page,
+                                                            width=image.shape[1], height=image.shape[0]))
+        return pages
+
+
+__batcher: VisionBatcher | None = None
+__batcher_lock = threading.Lock()
+
+
+def get_vision_batcher() -> VisionBatcher:
+    """
+    Get the Vision batcher configured by the settings, shared by all extractions of the process.
+    :return: The Vision batcher
+    """
+    global __batcher
+    with __batcher_lock:
+        if __batcher is None:
+            s = Settings()
+            __batcher = VisionBatcher(s.google_cloud_vision_api_key, s.google_cloud_vision_endpoint,
+                                      s.google_cloud_vision_batch_size, s.google_cloud_vision_batch_delay)
+        return __batcher
+
+
+__engines: dict[str, TesserocrEngines] = {}
+__engines_lock = threading.Lock()
+
+
+def get_tesserocr_engines(lang: str = 'deu') -> TesserocrEngines:
+    """
+    Get the in-process tesseract engines of a language, shared by all extractions of the process.
+    :param lang: The language of the engines
+    :return: The engines
+    """
+    with __engines_lock:
+        if (engines := __engines.get(lang)) is None:
+            engines = __engines[lang] = TesserocrEngines(lang, Settings().ocr_tessdata_dir)
+        return engines
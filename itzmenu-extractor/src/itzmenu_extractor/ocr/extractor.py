@@ -1,10 +1,11 @@
 import re
 import time
 from datetime import datetime
-from functools import lru_cache
+from functools import partial
 from io import BytesIO
 
 import PIL.Image as PImage
+import numpy as np
 import pandas as pd
 import pytesseract
 import pytz
@@ -13,16 +14,48 @@ from img2table.ocr import TesseractOCR, VisionOCR
 from img2table.ocr.base import OCRInstance
 from img2table.tables.objects.extraction import ExtractedTable
 
+import itzmenu_extractor.ocr.grid as grid
 import itzmenu_extractor.ocr.preprocess as preprocess
+import itzmenu_extractor.util.cache as cache
 import itzmenu_extractor.util.env as env
+import itzmenu_extractor.util.trace as trace
 from itzmenu_api.persistence.enums import WeekDay
 from itzmenu_extractor.config.settings import Settings
+from itzmenu_extractor.ocr.engines import (BatchedVisionOCR, ShardedTesseractOCR, ShardedTesserocrOCR, TesserocrOCR,
+                                           get_tesserocr_engines, get_vision_batcher)
 
 
+@trace.traced('period_of_validity')
+@cache.cached('period_of_validity')
 @preprocess.convert_to_grayscale
-@lru_cache
 def period_of_validity(image: bytes, lang: str = 'deu') -> tuple[int, int] | None:
-    if type(result := pytesseract.image_to_string(PImage.open(BytesIO(image)), lang=lang)) is str:
+    # Try the header first and only fall back to the full page if no date was found
+    if (period := __header_period_of_validity(image, lang=lang)) is not None:
+        return period
+    return __page_period_of_validity(image, lang=lang)
+
+
+@preprocess.decode_image
+@preprocess.crop_header
+@trace.traced('header_ocr')
+def __header_period_of_validity(image: np.ndarray, lang: str = 'deu') -> tuple[int, int] | None:
+    if Settings().ocr_engine == 'tesserocr':
+        result = get_tesserocr_engines(lang).image_to_string(image, psm=6, whitelist='0123456789.-')
+    else:
+        config = '--psm 6 -c tessedit_char_whitelist=0123456789.-'
+        result = pytesseract.image_to_string(image, lang=lang, config=config)
+    if type(result) is str:
+        return __extract_timestamps(result)
+
+
+@trace.traced('page_ocr')
+def __page_period_of_validity(image: bytes | np.ndarray, lang: str = 'deu') -> tuple[int, int] | None:
+    with PImage.fromarray(image) if isinstance(image, np.ndarray) else PImage.open(BytesIO(image)) as page:
+        if Settings().ocr_engine == 'tesserocr':
+            result = get_tesserocr_engines(lang).image_to_string(page)
+        else:
+            result = pytesseract.image_to_string(page, lang=lang)
+    if type(result) is str:
         return __extract_timestamps(result)
 
 
@@ -35,24 +68,98 @@ def __extract_timestamps(text: str) -> tuple[int, int] | None:
         return start_timestamp, end_timestamp
 
 
+@trace.traced('img_to_dataframe')
+@cache.cached('img_to_dataframe')
 @preprocess.parse_validity_parameter
+@preprocess.decode_image
 @preprocess.crop_table
 @preprocess.convert_to_grayscale
 @preprocess.remove_holidays
-@lru_cache
-def img_to_dataframe(image: bytes) -> pd.DataFrame | None:
+def img_to_dataframe(image: np.ndarray, layout: str = 'default') -> pd.DataFrame | None:
+    return __table_to_dataframe(image, layout)
+
+
+@trace.traced('extract_week')
+@cache.cached('extract_week')
+@preprocess.decode_image
+@preprocess.convert_to_grayscale
+def extract_week(image: np.ndarray, layout: str = 'default') -> tuple[tuple[int, int], pd.DataFrame] | None:
+    """
+    Extract the period of validity and the menu table in a single pass. The image is decoded and thresholded once
+    and both the header and the table are cropped from the same array.
+    :param image: The image of the menu
+    :param layout: The layout profile of the menu table
+    :return: The period of validity and the dataframe or None if the extraction failed
+    """
+    if (period := __header_period_of_validity(image)) is None and (period := __page_period_of_validity(image)) is None:
+        return None
+    if (df := __thresholded_table_to_dataframe(image, layout, validity_period=period)) is None:
+        return None
+    return period, df
+
+
+@preprocess.crop_table
+@preprocess.remove_holidays
+def __thresholded_table_to_dataframe(image: np.ndarray, layout: str) -> pd.DataFrame | None:
+    return __table_to_dataframe(image, layout)
+
+
+def __table_to_dataframe(image: np.ndarray, layout: str) -> pd.DataFrame | None:
     ocr = __create_ocr_instance()
-    img = Image(src=image)
-    if len(tables := img.extract_tables(ocr=ocr, min_confidence=30)) > 0:
+    # Slice the cells from the known layout and only detect the table if the image does not match it
+    if (tables := __extract_grid_tables(image, ocr, layout)) is None:
+        tables = __extract_tables(image, ocr)
+    if len(tables) > 0:
         return __post_process(tables)
 
 
+@trace.traced('extract_grid_tables')
+def __extract_grid_tables(image: np.ndarray, ocr: OCRInstance, layout: str) -> list[ExtractedTable] | None:
+    if Settings().ocr_grid_enabled and (grid_layout := grid.LAYOUTS[layout]) is not None:
+        return grid.extract_grid_tables(image, ocr, min_confidence=30, layout=grid_layout,
+                                        refinement=__create_refinement())
+
+
+@trace.traced('extract_tables')
+@preprocess.encode_image
+def __extract_tables(image: bytes, ocr: OCRInstance) -> list[ExtractedTable]:
+    img = Image(src=image)
+    return img.extract_tables(ocr=ocr, min_confidence=30)
+
+
 def __create_ocr_instance() -> OCRInstance:
     if (settings := Settings()).google_cloud_vision_enabled and not env.is_running_tests():
+        if settings.google_cloud_vision_batch_size > 1:
+            return BatchedVisionOCR(get_vision_batcher())
         return VisionOCR(api_key=settings.google_cloud_vision_api_key)
+    if settings.ocr_engine == 'tesserocr':
+        if (workers := settings.ocr_table_workers) > 1:
+            return ShardedTesserocrOCR(n_threads=workers, lang='deu')
+        return TesserocrOCR(n_threads=1, lang='deu')
+    if (workers := settings.ocr_table_workers) > 1:
+        return ShardedTesseractOCR(n_threads=workers, lang='deu')
     return TesseractOCR(n_threads=1, lang='deu')
 
 
+def __create_refinement() -> grid.Refinement | None:
+    if not (settings := Settings()).ocr_refine_enabled:
+        return None
+    # Vision recognizes the cells reliably and tesseract might not be installed
+    if settings.google_cloud_vision_enabled and not env.is_running_tests():
+        return None
+    recognize = partial(__recognize_cell, psm=settings.ocr_refine_psm, engine=settings.ocr_engine)
+    return grid.Refinement(recognize, min_confidence=settings.ocr_refine_min_confidence,
+                           scale=settings.ocr_refine_scale)
+
+
+@trace.traced('refine_cell')
+def __recognize_cell(image: np.ndarray, psm: int, engine: str, lang: str = 'deu') -> str:
+    if engine == 'tesserocr':
+        return get_tesserocr_engines(lang).image_to_string(image, psm=psm)
+    return pytesseract.image_to_string(image, lang=lang, config=f'--psm {psm}')
+
+
+@trace.traced('post_process')
 def __post_process(tables: list[ExtractedTable]) -> pd.DataFrame:
     # Concatenate all tables
     df = pd.concat([table.df for table in tables], ignore_index=True)
@@ -0,0 +1,157 @@
+import logging as log
+import re
+from dataclasses import dataclass
+from typing import Callable
+
+import cv2
+import numpy as np
+import polars as pl
+from img2table.document.base import MockDocument
+from img2table.ocr.base import OCRInstance
+from img2table.ocr.data import OCRDataframe
+from img2table.tables.objects.cell import Cell
+from img2table.tables.objects.extraction import ExtractedTable
+from img2table.tables.objects.row import Row
+from img2table.tables.objects.table import Table
+
+from itzmenu_extractor.ocr.layouts import GridLayout, LAYOUTS, MENU_LAYOUT
+
+
+@dataclass(frozen=True)
+class Refinement:
+    """
+    Slower but more accurate recognition of single meal cells whose words have a low confidence or whose content does
+    not end with a price. The cells are upscaled before they are recognized again.
+    """
+    # Recognizes the text of a single cell
+    recognize: Callable[[np.ndarray], str]
+    # Minimum mean confidence of the words of a cell that is not recognized again
+    min_confidence: int = 70
+    scale: float = 2.0
+    # Distance to the separator lines that is excluded from the cell
+    margin: int = 3
+
+
+# The content of a meal cell ends with its price
+MEAL_PATTERN = re.compile(r'\d+[.,]\d+\s?€?$')
+
+
+def detect_grid(image: np.ndarray, layout: GridLayout = MENU_LAYOUT) -> Table | None:
+    """
+    Slice the cells of the table from the known layout, snapping each expected line to the nearest detected one.
+    :param image: The preprocessed grayscale image of the table
+    :param layout: The expected layout of the table
+    :return: The table without content or None if the image does not match the layout
+    """
+    dark = image < 128
+    if (rows := __snap(dark.mean(axis=1), layout.rows, layout)) is None:
+        log.debug('Horizontal lines do not match the layout')
+        return None
+    if (columns := __snap(dark.mean(axis=0), layout.columns(image.shape[1]), layout)) is None:
+        log.debug('Vertical lines do not match the layout')
+        return None
+    # Boundaries of the cells between the lines and the borders of the image
+    ys = [(0, rows[0][0])] + [(a[1] + 1, b[0]) for a, b in zip(rows, rows[1:])] + [(rows[-1][1] + 1, image.shape[0])]
+    xs = ([(0, columns[0][0])] + [(a[1] + 1, b[0]) for a, b in zip(columns, columns[1:])]
+          + [(columns[-1][1] + 1, image.shape[1])])
+    # Assign each cell of the grid to the cell it is merged with
+    owners = {}
+    for r, (y1, y2) in enumerate(ys):
+        for c, (x1, x2) in enumerate(xs):
+            if c > 0 and not __is_line(dark[y1:y2, columns[c - 1][0]:columns[c - 1][1] + 1].T, layout):
+                owners[r, c] = owners[r, c - 1]
+            elif r > 0 and not __is_line(dark[rows[r - 1][0]:rows[r - 1][1] + 1, x1:x2], layout):
+                owners[r, c] = owners[r - 1, c]
+            else:
+                owners[r, c] = (r, c)
+    # Merged cells are represented by the same object spanning all positions
+    cells = {}
+    for (r, c), owner in owners.items():
+        y1, y2 = ys[r]
+        x1, x2 = xs[c]
+        if (cell := cells.get(owner)) is None:
+            cells[owner] = Cell(x1=x1, y1=y1, x2=x2, y2=y2)
+        else:
+            cell.x1, cell.y1, cell.x2, cell.y2 = min(cell.x1, x1), min(cell.y1, y1), max(cell.x2, x2), max(cell.y2, y2)
+    return Table(rows=[Row(cells=[cells[owners[r, c]] for c in range(len(xs))]) for r in range(len(ys))])
+
+
+def extract_grid_tables(image: np.ndarray, ocr: OCRInstance, min_confidence: int = 30,
+                        layout: GridLayout = MENU_LAYOUT,
+                        refinement: Refinement | None = None) -> list[ExtractedTable] | None:
+    """
+    Extract the table of the known layout without detecting the table structure.
+    :param image: The preprocessed grayscale image of the table
+    :param ocr: The OCR instance to recognize the text of the page
+    :param min_confidence: The minimum confidence of the recognized words
+    :param layout: The expected layout of the table
+    :param refinement: The recognition of doubtful cells, no cell is recognized again if it is None
+    :return: The extracted table or None if the image does not match the layout
+    """
+    if (table := detect_grid(image, layout)) is None:
+        return None
+    if (ocr_df := ocr.of(document=MockDocument(images=[image]))) is None:
+        return []
+    table = table.get_content(ocr_df=ocr_df, min_confidence=min_confidence)
+    if refinement is not None:
+        refine_cells(image, table, ocr_df, refinement)
+    return [table.extracted_table]
+
+
+def refine_cells(image: np.ndarray, table: Table, ocr_df: OCRDataframe, refinement: Refinement) -> int:
+    """
+    Recognize the meal cells again whose words have a low mean confidence or whose content does not end with a price.
+    The content of a cell is only replaced if the new content ends with a price.
+    :param image: The preprocessed grayscale image of the table
+    :param table: The table with the content of the first recognition
+    :param ocr_df: The words of the first recognition
+    :param refinement: The recognition of the doubtful cells
+    :return: The number of replaced cells
+    """
+    words = (ocr_df.df.filter((pl.col('class') == 'ocrx_word') & pl.col('value').is_not_null())
+             .select('x1', 'y1', 'x2', 'y2', 'confidence').collect().to_numpy())
+    centers_x, centers_y = (words[:, 0] + words[:, 2]) / 2, (words[:, 1] + words[:, 3]) / 2
+    # The first row contains the days and the first column the categories
+    cells = {id(cell): cell for row in table.items[1:] for cell in row.items[1:]
+             if all(cell is not other.items[0] for other in table.items)}
+    refined = doubtful = 0
+    for cell in cells.values():
+        inside = ((centers_x >= cell.x1) & (centers_x < cell.x2) & (centers_y >= cell.y1) & (centers_y < cell.y2))
+        if not inside.any():
+            continue
+        confidence = np.nan_to_num(words[inside, 4].astype(float), nan=0).mean()
+        if confidence >= refinement.min_confidence and cell.content and MEAL_PATTERN.search(cell.content):
+            continue
+        doubtful += 1
+        if MEAL_PATTERN.search(text := __recognize_cell(image, cell, refinement)):
+            cell.content = text
+            refined += 1
+    log.debug(f'Recognized {doubtful} doubtful cells again, replaced the content of {refined} cells')
+    return refined
+
+
+def __recognize_cell(image: np.ndarray, cell: Cell, refinement: Refinement) -> str:
+    """ Recognize the upscaled cell and join its lines like the content of the cells """
+    m = refinement.margin
+    cell_image = image[cell.y1 + m:max(cell.y2 - m, cell.y1 + m + 1), cell.x1 + m:max(cell.x2 - m, cell.x1 + m + 1)]
+    cell_image = cv2.resize(cell_image, None, fx=refinement.scale, fy=refinement.scale, interpolation=cv2.INTER_CUBIC)
+    text = refinement.recognize(cell_image)
+    return '\n'.join(' '.join(line.split()) for line in text.splitlines() if line.strip())
+
+
+def __snap(profile: np.ndarray, expected: tuple[int, ...],
+           layout: GridLayout) -> list[tuple[int, int]] | None:
+    """ Find the start and end of the detected line next to each expected line """
+    lines = []
+    for position in expected:
+        start = max(position - layout.tolerance, 0)
+        window = profile[start:position + layout.tolerance + 1]
+        if len(hits := np.flatnonzero(window >= layout.line_threshold)) == 0:
+            return None
+        lines.append((start + int(hits[0]), start + int(hits[-1])))
+    return lines
+
+
+def __is_line(segment: np.ndarray, layout: GridLayout) -> bool:
+    """ Check whether any row of the segment is a separator line """
+    return segment.size > 0 and bool((segment.mean(axis=1) >= layout.line_threshold).any())
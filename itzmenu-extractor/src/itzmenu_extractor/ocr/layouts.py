@@ -0,0 +1,32 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class GridLayout:
+    """
+    Expected separator lines of the menu table after the preprocessing, i.e. after cropping the table and removing
+    the holidays. The columns of the days are derived from the width of the image because the holidays are removed.
+    """
+    rows: tuple[int, ...] = (115, 256, 504, 752, 1000, 1142)
+    category_width: int = 437
+    day_width: int = 567
+    separator_width: int = 2
+    # Maximum distance between an expected and a detected line
+    tolerance: int = 8
+    # Minimum share of dark pixels along a line
+    line_threshold: float = 0.6
+
+    def columns(self, width: int) -> tuple[int, ...]:
+        """
+        Get the expected positions of the vertical lines.
+        :param width: The width of the image
+        :return: The x positions of the lines between the columns
+        """
+        days = (width - self.category_width) // self.day_width
+        step = self.day_width + self.separator_width
+        return tuple(self.category_width + 1 + i * step for i in range(days))
+
+
+MENU_LAYOUT = GridLayout()
+# Layout profiles that can be selected per menu source, None always detects the table
+LAYOUTS: dict[str, GridLayout | None] = {'default': MENU_LAYOUT, 'detect': None}
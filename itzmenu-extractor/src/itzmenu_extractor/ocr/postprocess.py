@@ -1,36 +1,39 @@
-import re
 import logging as log
 
 from itzmenu_api.persistence.schemas import WeekMenuCreate, DayMenu, MealCategory, Meal
 import pandas as pd
 
 
-def dataframe_to_week_menu(df: pd.DataFrame, validity_period: tuple[int, int], checksum: str, img: str | None) \
-        -> WeekMenuCreate:
+def dataframe_to_week_menu(df: pd.DataFrame, validity_period: tuple[int, int], checksum: str, img: str | None,
+                           phash: str | None = None) -> WeekMenuCreate:
     start_timestamp, end_timestamp = validity_period
     menus = __dataframe_to_menus(df)
     return WeekMenuCreate(start_timestamp=start_timestamp, end_timestamp=end_timestamp, img_checksum=checksum,
-                          img=img, menus=menus)
+                          img_phash=phash, img=img, menus=menus)
 
 
 def __dataframe_to_menus(df: pd.DataFrame) -> list[DayMenu]:
-    return [DayMenu(name=day, categories=__dataframe_to_categories(df[day])) for day in df.columns if day is not None]
-
-
-def __dataframe_to_categories(s: pd.Series):
-    def merge_rows(grouped_s: pd.Series):
-        return MealCategory(name=grouped_s.index[0], meals=__dataframe_to_meals(grouped_s))
-    return s.groupby(s.index).apply(merge_rows).to_list()
-
-
-def __dataframe_to_meals(s: pd.Series) -> list[Meal]:
-    result = []
-    for i in range(len(s)):
-        name = s.iloc[i]
-        if not pd.isna(name) and (price := re.search(r'\d+.\d+$', name)) is not None:
-            name = name[:price.start()].strip()
-            price = float(price.group())
-            result.append(Meal(name=name, price=price))
-        else:
-            log.warning(f'Failed to parse meal: {name}')
-    return result
+    days = [day for day in df.columns if day is not None]
+    # Flatten the day columns into one series of cells, column by column
+    cells = pd.Series(df[days].to_numpy().ravel(order='F'), dtype='string')
+    names, prices = __extract_meals(cells)
+    day_of_cells = [day for day in days for _ in range(len(df))]
+    category_of_cells = df.index.to_list() * len(days)
+    # Every day lists all categories, even if none of its meals could be parsed
+    category_names = sorted(category for category in set(category_of_cells) if not pd.isna(category))
+    categories = {day: {category: [] for category in category_names} for day in days}
+    for day, category, name, price, cell in zip(day_of_cells, category_of_cells, names, prices, cells.to_list()):
+        if name is None:
+            log.warning(f'Failed to parse meal: {cell}')
+        elif category in categories[day]:
+            categories[day][category].append(Meal(name=name, price=price))
+    return [DayMenu(name=day, categories=[MealCategory(name=category, meals=meals)
+                                          for category, meals in categories[day].items()]) for day in days]
+
+
+def __extract_meals(cells: pd.Series) -> tuple[list[str | None], list[float | None]]:
+    """ Split all cells into the name of the meal and its price at the end """
+    meals = cells.str.extract(r'^(?P<name>[\s\S]*?)(?P<price>\d+.\d+)$')
+    names = meals['name'].str.strip().astype(object).where(meals['name'].notna(), None).to_list()
+    prices = meals['price'].astype(float).to_list()
+    return names, prices
@@ -1,45 +1,60 @@
-from io import BytesIO
+import functools
 import logging as log
 
-from PIL import Image
 import numpy as np
 import cv2
 
 import itzmenu_extractor.util.time as time
+import itzmenu_extractor.util.trace as trace
+from itzmenu_extractor.config.settings import Settings
+
+
+def decode_image(func):
+    """ Decode the image once so that the following decorators can work on the in-memory array """
+    @functools.wraps(func)
+    def wrapper(image: bytes | np.ndarray, *args, **kwargs):
+        return func(__to_array(image), *args, **kwargs)
+    return wrapper
+
+
+def encode_image(func):
+    """ Encode the in-memory array to a lossless PNG buffer that can be passed to img2table """
+    @functools.wraps(func)
+    def wrapper(image: bytes | np.ndarray, *args, **kwargs):
+        if isinstance(image, np.ndarray):
+            image = __array_to_bytes(image, '.png')
+        return func(image, *args, **kwargs)
+    return wrapper
 
 
 def convert_to_grayscale(func):
     """ Apply a threshold to the given image """
-    def wrapper(image: bytes, *args, **kwargs) -> bytes:
-        cv_img = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
-        cv_img_gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-        _, cv_img_threshold = cv2.threshold(cv_img_gray,  200, 255, cv2.THRESH_BINARY)
-        processed_image = cv2.imencode(".jpg", cv_img_threshold)[1].tobytes()
-        return func(processed_image, *args, **kwargs)
+    @functools.wraps(func)
+    def wrapper(image: bytes | np.ndarray, *args, **kwargs):
+        return func(__like(__threshold(__to_array(image)), image), *args, **kwargs)
     return wrapper
 
 
 def crop_table(func):
     """ Crop the main content of the image excluding the header and footer """
-    def wrapper(image: bytes, *args, **kwargs) -> bytes:
-        image = Image.open(BytesIO(image))
-        # Get the width and height of the image
-        width, height = image.size
-        if width != 3508 or height != 2479:
-            log.error(f'Image has unexpected dimensions: {width}x{height}')
-
-        # Define the area to be cropped
-        area = (118, 345, width - 118, height - 414)
-        # Crop the image
-        cropped_image = image.crop(area)
-        cropped_image_bytes = __image_to_bytes(cropped_image)
-        return func(cropped_image_bytes, *args, **kwargs)
+    @functools.wraps(func)
+    def wrapper(image: bytes | np.ndarray, *args, **kwargs):
+        return func(__like(__crop_table(__to_array(image)), image), *args, **kwargs)
+    return wrapper
+
+
+def crop_header(func):
+    """ Crop the header containing the period of validity and reduce its resolution """
+    @functools.wraps(func)
+    def wrapper(image: bytes | np.ndarray, *args, **kwargs):
+        return func(__like(__crop_header(__to_array(image)), image), *args, **kwargs)
     return wrapper
 
 
 def parse_validity_parameter(func):
     """ Extract the period of validity of the menu """
-    def wrapper(image: bytes, *args, **kwargs) -> bytes:
+    @functools.wraps(func)
+    def wrapper(image: bytes, *args, **kwargs):
         from itzmenu_extractor.ocr.extractor import period_of_validity
         validity_period = period_of_validity(image)
         return func(image, validity_period=validity_period, *args, **kwargs)
@@ -48,71 +63,114 @@ def parse_validity_parameter(func):
 
 def remove_holidays(func):
     """ Hide the days of the week that are holidays """
-    def wrapper(image: bytes, *args, **kwargs) -> bytes:
+    @functools.wraps(func)
+    def wrapper(image: bytes | np.ndarray, *args, **kwargs):
         # Get the validity period
         if (validity_period := kwargs.pop('validity_period', None)) is None:
             raise ValueError('The validity period must be provided')
-        image = Image.open(BytesIO(image))
-        # Get the width and height of the image
-        # Define width of the columns
-        columns = [437, 567, 567, 567, 567, 567]
-        # Crop the image into horizontal parts
-        parts = []
-        for i, width in enumerate(columns):
-            area = (sum(columns[:i]), 0, sum(columns[:i + 1]), image.height)
-            parts.append(image.crop(area))
-        # Determine which days of the work week are holidays
-        holidays = [time.is_holiday(t) for t in range(validity_period[0], validity_period[0] + 86400 * 5, 86400)]
-        # Concatenate the images of the days when the cafeteria is open
-        no_holiday_columns = [parts[i + 1] for i, holiday in enumerate(holidays) if not holiday]
-        no_holiday_columns.insert(0, parts[0])
-        horizontal_image = __concat_images_horizontally(no_holiday_columns)
-        # Define height of the rows
-        rows = [255, 189, 248, 248, 248, 248, 284]
-        # Crop the image into vertical parts
-        parts = []
-        for i, height in enumerate(rows):
-            if i not in (1, 5):
-                area = (0, sum(rows[:i]), horizontal_image.width, sum(rows[:i + 1]))
-                parts.append(horizontal_image.crop(area))
-        # Concatenate the images of the days when the cafeteria is open
-        vertical_image = __concat_images_vertically(parts)
-        jpg_image = __image_to_bytes(vertical_image)
-        return func(jpg_image, *args, **kwargs)
+        return func(__like(__remove_holidays(__to_array(image), validity_period), image), *args, **kwargs)
     return wrapper
 
 
-def __concat_images_horizontally(images: list[Image]) -> Image:
+@trace.traced('convert_to_grayscale')
+def __threshold(cv_img: np.ndarray) -> np.ndarray:
+    cv_img_gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY) if cv_img.ndim == 3 else cv_img
+    _, cv_img_threshold = cv2.threshold(cv_img_gray,  200, 255, cv2.THRESH_BINARY)
+    return cv_img_threshold
+
+
+@trace.traced('crop_table')
+def __crop_table(cv_img: np.ndarray) -> np.ndarray:
+    # Get the width and height of the image
+    height, width = cv_img.shape[:2]
+    if width != 3508 or height != 2479:
+        log.error(f'Image has unexpected dimensions: {width}x{height}')
+
+    # Crop the area of the table
+    return cv_img[345:height - 414, 118:width - 118]
+
+
+@trace.traced('crop_header')
+def __crop_header(cv_img: np.ndarray) -> np.ndarray:
+    # Crop the area above the table
+    header_image = cv_img[:345]
+    # Halve the resolution, the header text is large enough to be recognized anyway
+    return cv2.resize(header_image, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+
+
+@trace.traced('remove_holidays')
+def __remove_holidays(cv_img: np.ndarray, validity_period: tuple[int, int]) -> np.ndarray:
+    # Define width of the columns
+    columns = [437, 567, 567, 567, 567, 567]
+    # Crop the image into horizontal parts
+    parts = []
+    for i, width in enumerate(columns):
+        parts.append(cv_img[:, sum(columns[:i]):sum(columns[:i + 1])])
+    # Determine which days of the work week are holidays
+    holidays = time.holidays_in_range(validity_period[0], validity_period[0] + 86400 * 4)
+    # Concatenate the images of the days when the cafeteria is open
+    no_holiday_columns = [parts[i + 1] for i, holiday in enumerate(holidays) if not holiday]
+    no_holiday_columns.insert(0, parts[0])
+    horizontal_image = __concat_images_horizontally(no_holiday_columns)
+    # Define height of the rows
+    rows = [255, 189, 248, 248, 248, 248, 284]
+    # Crop the image into vertical parts
+    parts = []
+    for i, height in enumerate(rows):
+        if i not in (1, 5):
+            parts.append(horizontal_image[sum(rows[:i]):sum(rows[:i + 1])])
+    # Concatenate the images of the days when the cafeteria is open
+    return __concat_images_vertically(parts)
+
+
+def __concat_images_horizontally(images: list[np.ndarray]) -> np.ndarray:
     """ Concatenate a list of images horizontally """
-    widths, heights = zip(*(i.size for i in images))
-    total_width = sum(widths)
-    max_height = max(heights)
-    new_image = Image.new('RGB', (total_width, max_height))
+    total_width = sum(img.shape[1] for img in images)
+    max_height = max(img.shape[0] for img in images)
+    new_image = np.zeros((max_height, total_width, *images[0].shape[2:]), dtype=images[0].dtype)
     x_offset = 0
     for img in images:
-        new_image.paste(img, (x_offset, 0))
+        width = max(min(img.shape[1], total_width - x_offset), 0)
+        new_image[:img.shape[0], x_offset:x_offset + width] = img[:, :width]
         # Add horizontal black line to separate the images
-        new_image.paste(Image.new('RGB', (2, max_height), (0, 0, 0)), (x_offset, 0))
+        new_image[:, x_offset:x_offset + 2] = 0
         # Increase the x offset
-        x_offset += img.size[0] + 2
+        x_offset += img.shape[1] + 2
     return new_image
 
 
-def __concat_images_vertically(images: list[Image]) -> Image:
+def __concat_images_vertically(images: list[np.ndarray]) -> np.ndarray:
     """ Concatenate a list of images vertically """
-    widths, heights = zip(*(i.size for i in images))
-    max_width = max(widths)
-    total_height = sum(heights)
-    new_image = Image.new('RGB', (max_width, total_height))
+    max_width = max(img.shape[1] for img in images)
+    total_height = sum(img.shape[0] for img in images)
+    new_image = np.zeros((total_height, max_width, *images[0].shape[2:]), dtype=images[0].dtype)
     y_offset = 0
     for img in images:
-        new_image.paste(img, (0, y_offset))
-        y_offset += img.size[1]
+        new_image[y_offset:y_offset + img.shape[0], :img.shape[1]] = img
+        y_offset += img.shape[0]
     return new_image
 
 
-def __image_to_bytes(image: Image) -> bytes:
+def __to_array(image: bytes | np.ndarray) -> np.ndarray:
+    """ Decode the image unless it already is an in-memory array """
+    if isinstance(image, np.ndarray):
+        return image
+    return __decode(image)
+
+
+def __like(image: np.ndarray, reference: bytes | np.ndarray) -> bytes | np.ndarray:
+    """ Return the image in the same representation as the reference, encoding it to JPEG if necessary """
+    return image if isinstance(reference, np.ndarray) else __array_to_bytes(image, '.jpg')
+
+
+@trace.traced('decode')
+def __decode(image: bytes) -> np.ndarray:
+    # The images are converted to grayscale anyway, decoding them as grayscale needs a third of the memory
+    flags = cv2.IMREAD_GRAYSCALE if Settings().ocr_low_memory else cv2.IMREAD_COLOR
+    return cv2.imdecode(np.frombuffer(image, np.uint8), flags)
+
+
+@trace.traced('encode')
+def __array_to_bytes(image: np.ndarray, ext: str) -> bytes:
     """ Convert an image to bytes """
-    image_bytes = BytesIO()
-    image.save(image_bytes, format='JPEG')
-    return image_bytes.getvalue()
+    return cv2.imencode(ext, image)[1].tobytes()
@@ -1,29 +1,104 @@
+import httpx
 import requests
 import logging as log
 
 import itzmenu_extractor.util.env as env
 from itzmenu_extractor.rest.requests import BaseRequest, WeekMenuRequest
 
+NOT_MODIFIED = object()
+
 
 class MenuClient:
 
-    def __init__(self, host: str | None = None):
+    def __init__(self, host: str | None = None, request: BaseRequest | None = None):
         self.__session = requests.Session()
         self.__host = host if host is not None else 'https://ivi.de'
+        self.__menu_request = request if request is not None else WeekMenuRequest()
+        self.__validators: dict[str, dict[str, str]] = {}
 
     def __del__(self):
         self.__session.close()
 
-    def get_week_menu(self) -> bytes | None:
-        return self.__request(WeekMenuRequest())
+    def get_week_menu(self) -> bytes | object | None:
+        """
+        Get the image of the week menu.
+        :return: The image, NOT_MODIFIED if it did not change since the last request or None on failure
+        """
+        return self.__request(self.__menu_request)
+
+    def forget_validators(self):
+        """ Make the next request unconditional, e.g. because the last received image could not be processed """
+        self.__validators.clear()
 
-    def __request(self, request: BaseRequest) -> bytes | None:
+    def __request(self, request: BaseRequest) -> bytes | object | None:
         try:
             url = f'{self.__host}/{request.endpoint}'
-            response = self.__session.get(url, allow_redirects=False)
+            headers = self.__validators.get(request.endpoint, {})
+            response = self.__session.get(url, headers=headers, allow_redirects=False)
             response.raise_for_status()
+            if response.status_code == requests.codes.not_modified:
+                return NOT_MODIFIED
+            self.__remember_validators(request.endpoint, response)
             return response.content
         except requests.ConnectionError as exc:
             log.error(f'An error occurred while requesting {exc.request.url!r}.')
         except requests.HTTPError as exc:
             log.error(f'Error response {exc.response.status_code} while requesting {exc.request.url!r}.')
+
+    def __remember_validators(self, endpoint: str, response: requests.Response):
+        """ Remember the cache validators of the response to make the next request conditional """
+        validators = {}
+        if (etag := response.headers.get('ETag')) is not None:
+            validators['If-None-Match'] = etag
+        if (last_modified := response.headers.get('Last-Modified')) is not None:
+            validators['If-Modified-Since'] = last_modified
+        self.__validators[endpoint] = validators
+
+
+class AsyncMenuClient:
+    """ Asynchronous variant of the MenuClient for the asyncio runtime """
+
+    def __init__(self, host: str | None = None, request: BaseRequest | None = None):
+        self.__client = httpx.AsyncClient()
+        self.__host = host if host is not None else 'https://ivi.de'
+        self.__menu_request = request if request is not None else WeekMenuRequest()
+        self.__validators: dict[str, dict[str, str]] = {}
+
+    async def aclose(self):
+        await self.__client.aclose()
+
+    async def get_week_menu(self) -> bytes | object | None:
+        """
+        Get the image of the week menu.
+        :return: The image, NOT_MODIFIED if it did not change since the last request or None on failure
+        """
+        return await self.__request(self.__menu_request)
+
+    def forget_validators(self):
+        """ Make the next request unconditional, e.g. because the last received image could not be processed """
+        self.__validators.clear()
+
+    async def __request(self, request: BaseRequest) -> bytes | object | None:
+        try:
+            url = f'{self.__host}/{request.endpoint}'
+            headers = self.__validators.get(request.endpoint, {})
+            response = await self.__client.get(url, headers=headers, follow_redirects=False)
+            # Unlike requests, httpx treats every status other than 2xx as an error
+            if response.status_code == httpx.codes.NOT_MODIFIED:
+                return NOT_MODIFIED
+            response.raise_for_status()
+            self.__remember_validators(request.endpoint, response)
+            return response.content
+        except httpx.TransportError as exc:
+            log.error(f'An error occurred while requesting {exc.request.url!r}.')
+        except httpx.HTTPStatusError as exc:
+            log.error(f'Error response {exc.response.status_code} while requesting {exc.request.url!r}.')
+
+    def __remember_validators(self, endpoint: str, response: httpx.Response):
+        """ Remember the cache validators of the response to make the next request conditional """
+        validators = {}
+        if (etag := response.headers.get('ETag')) is not None:
+            validators['If-None-Match'] = etag
+        if (last_modified := response.headers.get('Last-Modified')) is not None:
+            validators['If-Modified-Since'] = last_modified
+        self.__validators[endpoint] = validators
@@ -20,3 +20,13 @@ class DayMenuRequest(BaseRequest):
     @property
     def endpoint(self) -> str:
         return 'media/img/speiseplanDay.jpg'
+
+
+class ImageRequest(BaseRequest):
+
+    def __init__(self, endpoint: str):
+        self.__endpoint = endpoint
+
+    @property
+    def endpoint(self) -> str:
+        return self.__endpoint
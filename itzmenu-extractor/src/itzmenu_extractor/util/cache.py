@@ -0,0 +1,221 @@
+import hashlib
+import inspect
+import logging as log
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import itzmenu_extractor.util.image as image
+from itzmenu_extractor.config.settings import Settings
+
+MISSING = object()
+# Increase to invalidate the cached results after a change of the extraction
+CACHE_VERSION = 1
+# Settings that change the results of the extraction. The table workers shard the OCR of a table, the low-memory mode
+# decodes the images in grayscale and the Vision batch size combines the images of several requests, all of them can
+# change the recognized text
+RESULT_SETTINGS = ('ocr_engine', 'ocr_tessdata_dir', 'ocr_grid_enabled', 'ocr_refine_enabled',
+                   'ocr_refine_min_confidence', 'ocr_refine_scale', 'ocr_refine_psm', 'ocr_holiday_first_year',
+                   'ocr_holiday_last_year', 'ocr_holiday_subdiv', 'ocr_table_workers', 'ocr_low_memory',
+                   'google_cloud_vision_enabled', 'google_cloud_vision_batch_size')
+
+
+@dataclass
+class CacheFootprint:
+    memory_entries: int
+    memory_bytes: int
+    file_entries: int
+    file_bytes: int
+
+
+class ResultCache:
+    """
+    Two-tier cache for OCR results. A bounded in-memory LRU tier is backed by an optional SQLite file that
+    survives restarts. Entries of the memory tier are evicted by their number and their estimated total size,
+    entries of the file by age and by the total size of the stored values. Entries stored with another version are
+    ignored and evicted over time.
+    """
+
+    def __init__(self, path: str = '', memory_size: int = 32, max_size: int = 0, max_age: int = 0,
+                 memory_max_bytes: int = 0, version: str = ''):
+        self.__lock = threading.Lock()
+        self.__version = version
+        self.__memory: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self.__memory_bytes = 0
+        self.__memory_size = memory_size
+        self.__memory_max_bytes = memory_max_bytes
+        self.__max_size = max_size
+        self.__max_age = max_age
+        self.__connection = sqlite3.connect(path, check_same_thread=False) if path else None
+        if self.__connection is not None:
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB, '
+                                      'size INTEGER, created_at INTEGER, accessed_at INTEGER)')
+            self.__connection.commit()
+
+    def __del__(self):
+        if getattr(self, '_ResultCache__connection', None) is not None:
+            self.__connection.close()
+
+    def get(self, key: str) -> Any:
+        """
+        Get a cached value.
+        :param key: The key of the value
+        :return: The cached value or MISSING if the key is not cached
+        """
+        key = self.__versioned(key)
+        with self.__lock:
+            if key in self.__memory:
+                self.__memory.move_to_end(key)
+                return self.__memory[key][0]
+            if self.__connection is None:
+                return MISSING
+            now = int(time.time())
+            row = self.__connection.execute('SELECT value, created_at FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None or self.__is_expired(row[1], now):
+                return MISSING
+            self.__connection.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (now, key))
+            self.__connection.commit()
+            value = pickle.loads(row[0])
+            self.__put_memory(key, value)
+            return value
+
+    def put(self, key: str, value: Any):
+        """
+        Cache a value. None values are only kept in memory so that failed extractions are retried after a restart.
+        :param key: The key of the value
+        :param value: The value to cache
+        """
+        key = self.__versioned(key)
+        with self.__lock:
+            self.__put_memory(key, value)
+            if self.__connection is None or value is None:
+                return
+            now = int(time.time())
+            data = pickle.dumps(value)
+            self.__connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                                      (key, data, len(data), now, now))
+            self.__evict(now)
+            self.__connection.commit()
+
+    def clear(self):
+        """ Remove all entries from both tiers """
+        with self.__lock:
+            self.__memory.clear()
+            self.__memory_bytes = 0
+            if self.__connection is not None:
+                self.__connection.execute('DELETE FROM results')
+                self.__connection.commit()
+
+    def footprint(self) -> CacheFootprint:
+        """
+        Measure the current size of both tiers.
+        :return: The number of entries and their size in bytes per tier
+        """
+        with self.__lock:
+            file_entries = file_bytes = 0
+            if self.__connection is not None:
+                file_entries, file_bytes = self.__connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) '
+                                                                     'FROM results').fetchone()
+            return CacheFootprint(len(self.__memory), self.__memory_bytes, file_entries, file_bytes)
+
+    def __versioned(self, key: str) -> str:
+        return f'{self.__version}:{key}' if self.__version else key
+
+    def __put_memory(self, key: str, value: Any):
+        if self.__memory_size <= 0:
+            return
+        if (old := self.__memory.pop(key, None)) is not None:
+            self.__memory_bytes -= old[1]
+        size = self.__size_of(value)
+        if 0 < self.__memory_max_bytes < size:
+            # The value alone exceeds the limit and would evict all other entries
+            return
+        self.__memory[key] = value, size
+        self.__memory_bytes += size
+        while len(self.__memory) > self.__memory_size or 0 < self.__memory_max_bytes < self.__memory_bytes:
+            self.__memory_bytes -= self.__memory.popitem(last=False)[1][1]
+
+    @staticmethod
+    def __size_of(value: Any) -> int:
+        """ Estimate the memory held by a cached value """
+        if hasattr(value, 'memory_usage'):
+            # DataFrame
+            return int(value.memory_usage(index=True, deep=True).sum())
+        if hasattr(value, 'nbytes'):
+            # NumPy array
+            return value.nbytes
+        if isinstance(value, (tuple, list)):
+            return sys.getsizeof(value) + sum(ResultCache.__size_of(item) for item in value)
+        return sys.getsizeof(value)
+
+    def __evict(self, now: int):
+        if self.__max_age > 0:
+            self.__connection.execute('DELETE FROM results WHERE created_at < ?', (now - self.__max_age,))
+        if self.__max_size > 0:
+            # Delete the least recently used entries exceeding the size limit
+            self.__connection.execute('DELETE FROM results WHERE key IN (SELECT key FROM (SELECT key, SUM(size) '
+                                      'OVER (ORDER BY accessed_at DESC, rowid DESC) AS total FROM results) '
+                                      'WHERE total > ?)', (self.__max_size,))
+
+    def __is_expired(self, created_at: int, now: int) -> bool:
+        return 0 < self.__max_age < now - created_at
+
+
+__cache: ResultCache | None = None
+__cache_lock = threading.Lock()
+
+
+def get_cache() -> ResultCache:
+    """
+    Get the shared result cache configured by the settings.
+    :return: The result cache
+    """
+    global __cache
+    with __cache_lock:
+        if __cache is None:
+            s = Settings()
+            __cache = ResultCache(s.ocr_cache_file, s.ocr_cache_memory_size, s.ocr_cache_max_size,
+                                  s.ocr_cache_max_age, s.ocr_cache_memory_max_bytes, settings_digest(s))
+            if s.ocr_cache_file:
+                log.info(f'Using OCR result cache {s.ocr_cache_file}')
+        return __cache
+
+
+def settings_digest(settings: Settings) -> str:
+    """
+    Get the digest of the cache version and the settings that change the results of the extraction.
+    :param settings: The settings
+    :return: The digest
+    """
+    values = [CACHE_VERSION] + [getattr(settings, name) for name in RESULT_SETTINGS]
+    return hashlib.sha256(repr(values).encode()).hexdigest()[:16]
+
+
+def cached(namespace: str) -> Callable:
+    """
+    Decorator to cache the result of a function taking an image as first argument.
+    The results are keyed by the SHA-256 checksum of the image and the other arguments including their defaults.
+    :param namespace: Namespace of the cached results to distinguish between functions
+    :return: The cached result of the function.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def wrapper(img: bytes, *args, **kwargs):
+            key = f'{namespace}:{image.bytes_to_sha256(img)}'
+            # Bind the arguments so that positional, keyword and default arguments result in the same key
+            bound = signature.bind(img, *args, **kwargs)
+            bound.apply_defaults()
+            if arguments := list(bound.arguments.items())[1:]:
+                key += f':{hashlib.sha256(repr(arguments).encode()).hexdigest()}'
+            if (value := (cache := get_cache()).get(key)) is not MISSING:
+                return value
+            cache.put(key, value := func(img, *args, **kwargs))
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,104 @@
+import os
+import threading
+from typing import Iterable, Mapping
+
+
+class ChecksumStore:
+    """
+    Set of image checksums that are known to be stored by the service. The checksums are appended to an optional
+    file, one per line, so that they survive restarts.
+    """
+
+    def __init__(self, path: str = ''):
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__checksums: set[str] = set()
+        if path and os.path.exists(path):
+            with open(path, 'r') as file:
+                self.__checksums.update(line.strip() for line in file if line.strip())
+
+    def __contains__(self, checksum: str) -> bool:
+        return checksum in self.__checksums
+
+    def __len__(self) -> int:
+        return len(self.__checksums)
+
+    def add(self, checksum: str):
+        """
+        Add a checksum to the store.
+        :param checksum: The checksum to add
+        """
+        self.update([checksum])
+
+    def update(self, checksums: Iterable[str]):
+        """
+        Add multiple checksums to the store.
+        :param checksums: The checksums to add
+        """
+        with self.__lock:
+            if not (new := set(checksums) - self.__checksums):
+                return
+            self.__checksums.update(new)
+            if self.__path:
+                with open(self.__path, 'a') as file:
+                    file.writelines(f'{checksum}\n' for checksum in sorted(new))
+
+
+class PerceptualHashIndex:
+    """
+    Perceptual hashes of the menu images that are known to be stored by the service. A hash that is within the
+    maximum distance of a known hash belongs to a near-identical copy of a known image. The period of validity of each
+    image is kept next to its hash, since the menus of different weeks can have nearly the same hash.
+    """
+
+    def __init__(self, max_distance: int = 10):
+        self.__max_distance = max_distance
+        self.__lock = threading.Lock()
+        self.__hashes: dict[str, int] = {}
+        self.__periods: dict[str, tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.__hashes)
+
+    def add(self, phash: str, period: tuple[int, int] | None = None):
+        """
+        Add a hash to the index.
+        :param phash: The hash as hex string
+        :param period: The period of validity of the menu
+        """
+        self.update({phash: period})
+
+    def update(self, phashes: Iterable[str] | Mapping[str, tuple[int, int] | None]):
+        """
+        Add multiple hashes to the index.
+        :param phashes: The hashes as hex strings or a mapping of the hashes to the periods of validity of the menus
+        """
+        items = phashes.items() if isinstance(phashes, Mapping) else ((phash, None) for phash in phashes)
+        with self.__lock:
+            for phash, period in items:
+                self.__hashes[phash] = int(phash, 16)
+                if period is not None:
+                    self.__periods[phash] = period
+
+    def find(self, phash: str) -> str | None:
+        """
+        Find the nearest known hash.
+        :param phash: The hash as hex string
+        :return: The nearest hash within the maximum distance or None if there is none
+        """
+        value = int(phash, 16)
+        with self.__lock:
+            distances = {known: (value ^ known_value).bit_count() for known, known_value in self.__hashes.items()}
+        if not distances:
+            return None
+        nearest = min(distances, key=distances.get)
+        return nearest if distances[nearest] <= self.__max_distance else None
+
+    def period(self, phash: str) -> tuple[int, int] | None:
+        """
+        Get the period of validity of the menu with a known hash.
+        :param phash: The known hash as hex string
+        :return: The period of validity or None if it is not known
+        """
+        with self.__lock:
+            return self.__periods.get(phash)
@@ -1,11 +1,52 @@
+import glob
 import hashlib
 import base64
+import os
+from typing import Iterator
 
 
 def bytes_to_sha256(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
 
 
+def file_to_sha256(path: str, chunk_size: int = 65536) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(chunk_size):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def perceptual_hash(data: bytes, size: int = 16) -> str:
+    """
+    Compute the difference hash of the menu table. The image is decoded at a quarter of its resolution, so the hash is
+    cheap compared to the extraction. Recompressed or re-exported copies of an image have nearly the same hash.
+    :param data: The image of the menu
+    :param size: The number of rows and columns of the hash, it has size * size bits
+    :return: The hash as hex string
+    :raises ValueError: If the image cannot be decoded
+    """
+    import cv2
+    import numpy as np
+    if (cv_img := cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)) is None:
+        raise ValueError('Failed to decode image')
+    height, width = cv_img.shape
+    # Same area as the cropped table, scaled to the reduced resolution
+    table = cv_img[345 // 4:height - 414 // 4, 118 // 4:width - 118 // 4]
+    pixels = cv2.resize(table, (size + 1, size), interpolation=cv2.INTER_AREA)
+    return np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes().hex()
+
+
+def hamming_distance(a: str, b: str) -> int:
+    """
+    Count the bits that differ between two hashes.
+    :param a: The first hash as hex string
+    :param b: The second hash as hex string
+    :return: The number of different bits
+    """
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
 def bytes_to_base64(data: bytes) -> str:
     return base64.b64encode(data).decode('utf-8')
 
@@ -13,3 +54,21 @@ def bytes_to_base64(data: bytes) -> str:
 def load_image(path: str) -> bytes:
     with open(path, 'rb') as file:
         return file.read()
+
+
+def find_images(path: str) -> Iterator[str]:
+    """
+    Lazily find all JPEG images in a directory tree or matching a glob pattern.
+    :param path: A directory or a glob pattern
+    :return: The paths of the images
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file in sorted(files):
+                if file.lower().endswith(('.jpg', '.jpeg')):
+                    yield os.path.join(root, file)
+    else:
+        for file in glob.iglob(path, recursive=True):
+            if os.path.isfile(file):
+                yield file
@@ -0,0 +1,122 @@
+import queue
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from time import monotonic
+
+
+@dataclass
+class QueuedImage:
+    img: bytes
+    checksum: str
+    layout: str = 'default'
+    # Name of the source the image was received from
+    source: str | None = None
+    enqueued_at: float = field(default_factory=monotonic)
+
+
+@dataclass
+class QueueMetrics:
+    depth: int
+    in_progress: int
+    enqueued: int
+    duplicates: int
+    rejected: int
+    # Time the dequeued images waited in the queue in seconds
+    mean_wait: float
+    max_wait: float
+
+
+class ImageQueue:
+    """
+    Bounded queue of images waiting for the extraction. An image is not queued again while an image with the same
+    checksum is queued or being extracted.
+    """
+
+    def __init__(self, maxsize: int):
+        self.__maxsize = maxsize
+        self.__condition = threading.Condition()
+        self.__items: deque[QueuedImage] = deque()
+        self.__checksums: set[str] = set()
+        self.__in_progress = 0
+        self.__closed = False
+        self.__enqueued = self.__duplicates = self.__rejected = self.__dequeued = 0
+        self.__total_wait = self.__max_wait = 0.0
+
+    def put(self, item: QueuedImage, timeout: float | None = None) -> bool:
+        """
+        Add an image to the queue, waiting for a free slot if the queue is full.
+        :param item: The image
+        :param timeout: The maximum number of seconds to wait for a free slot, None waits indefinitely
+        :return: True if the image was queued, False if it is already queued or being extracted
+        :raises queue.Full: If no slot became free within the timeout or the queue is closed
+        """
+        with self.__condition:
+            if item.checksum in self.__checksums:
+                self.__duplicates += 1
+                return False
+            if not self.__condition.wait_for(lambda: self.__closed or len(self.__items) < self.__maxsize, timeout) \
+                    or self.__closed:
+                self.__rejected += 1
+                raise queue.Full
+            self.__items.append(item)
+            self.__checksums.add(item.checksum)
+            self.__enqueued += 1
+            self.__condition.notify_all()
+            return True
+
+    def get(self, timeout: float | None = None) -> QueuedImage | None:
+        """
+        Take the oldest image from the queue. It counts as being extracted until task_done is called.
+        :param timeout: The maximum number of seconds to wait for an image, None waits indefinitely
+        :return: The image or None if the queue is closed or no image was queued within the timeout
+        """
+        with self.__condition:
+            if not self.__condition.wait_for(lambda: self.__closed or self.__items, timeout) or self.__closed:
+                return None
+            item = self.__items.popleft()
+            self.__in_progress += 1
+            wait = monotonic() - item.enqueued_at
+            self.__dequeued += 1
+            self.__total_wait += wait
+            self.__max_wait = max(self.__max_wait, wait)
+            self.__condition.notify_all()
+            return item
+
+    def task_done(self, item: QueuedImage):
+        """
+        Mark the extraction of a dequeued image as finished.
+        :param item: The image returned by get
+        """
+        with self.__condition:
+            self.__in_progress -= 1
+            self.__checksums.discard(item.checksum)
+            self.__condition.notify_all()
+
+    def join(self, timeout: float | None = None) -> bool:
+        """
+        Wait until all queued images have been extracted.
+        :param timeout: The maximum number of seconds to wait, None waits indefinitely
+        :return: True if all images have been extracted
+        """
+        with self.__condition:
+            return self.__condition.wait_for(lambda: not self.__items and self.__in_progress == 0, timeout)
+
+    def close(self):
+        """ Wake up all waiting threads and reject further images, queued images are discarded """
+        with self.__condition:
+            self.__closed = True
+            for item in self.__items:
+                self.__checksums.discard(item.checksum)
+            self.__items.clear()
+            self.__condition.notify_all()
+
+    def metrics(self) -> QueueMetrics:
+        """
+        Get the metrics of the queue.
+        :return: The current depth and the counters since the queue was created
+        """
+        with self.__condition:
+            mean_wait = self.__total_wait / self.__dequeued if self.__dequeued else 0.0
+            return QueueMetrics(len(self.__items), self.__in_progress, self.__enqueued, self.__duplicates,
+                                self.__rejected, mean_wait, self.__max_wait)
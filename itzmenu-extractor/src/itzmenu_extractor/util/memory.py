@@ -0,0 +1,38 @@
+import ctypes
+import ctypes.util
+import functools
+import gc
+import logging as log
+from typing import Callable
+
+import itzmenu_extractor.util.cache as cache
+from itzmenu_extractor.config.settings import Settings
+
+
+def releases_memory(func):
+    """ Release the buffers of the function after each call if the low-memory mode is enabled """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if Settings().ocr_low_memory:
+                release_memory()
+            # The footprint queries the cache database, so it is only computed if it is logged
+            if log.root.isEnabledFor(log.DEBUG):
+                log.debug(f'Cache footprint: {cache.get_cache().footprint()}')
+    return wrapper
+
+
+def release_memory():
+    """ Collect unreachable objects and return the freed heap memory to the operating system """
+    gc.collect()
+    if (malloc_trim := __malloc_trim()) is not None:
+        malloc_trim(0)
+
+
+def __malloc_trim() -> Callable[[int], int] | None:
+    """ Get malloc_trim of glibc, other C libraries do not provide it """
+    if (name := ctypes.util.find_library('c')) is None:
+        return None
+    return getattr(ctypes.CDLL(name), 'malloc_trim', None)
@@ -1,7 +1,11 @@
+import threading
 from datetime import date, datetime
 
+import numpy as np
 from holidays.countries import Germany
 
+from itzmenu_extractor.config.settings import Settings
+
 
 class CompanyHolidays(Germany):
 
@@ -15,7 +19,86 @@ class CompanyHolidays(Germany):
         self[date(year, 12, 31)] = "New Year's Eve"
 
 
-__hdays = CompanyHolidays()
+class HolidayCalendar:
+    """
+    Precomputed company holidays stored as one bitset per year indexed by the day of the year.
+    Years outside the precomputed range are added on first use.
+    """
+
+    def __init__(self, first_year: int, last_year: int, subdiv: str = 'SH'):
+        self.__lock = threading.Lock()
+        self.__subdiv = subdiv
+        self.__first_year = first_year
+        self.__bits = self.__build(first_year, max(first_year, last_year))
+
+    @property
+    def years(self) -> range:
+        """ The years that are precomputed """
+        return range(self.__first_year, self.__first_year + len(self.__bits))
+
+    def is_holiday(self, d: date | datetime | int) -> bool:
+        """
+        Checks for a given date whether it is a holiday.
+        :param d: The date to check
+        :return: True if the date is a holiday, False otherwise
+        """
+        return bool(self.holidays_in_range(d, d)[0])
+
+    def holidays_in_range(self, start: date | datetime | int, end: date | datetime | int) -> np.ndarray:
+        """
+        Checks for each day of a date range whether it is a holiday.
+        :param start: The first day of the range
+        :param end: The last day of the range, inclusive
+        :return: A boolean array with one entry per day
+        """
+        days = np.arange(np.datetime64(self.__to_date(start), 'D'), np.datetime64(self.__to_date(end), 'D') + 1)
+        if len(days) == 0:
+            return np.zeros(0, dtype=bool)
+        years = days.astype('datetime64[Y]')
+        day_of_year = (days - years.astype('datetime64[D]')).astype(np.int64)
+        years = years.astype(np.int64) + 1970
+        first_year, bits = self.__ensure(int(years[0]), int(years[-1]))
+        rows = np.unpackbits(bits[years[0] - first_year:years[-1] - first_year + 1], axis=1, count=366)
+        return rows[years - years[0], day_of_year].astype(bool)
+
+    def __ensure(self, first_year: int, last_year: int) -> tuple[int, np.ndarray]:
+        """ Add the missing years and return a consistent snapshot of the first year and the bitsets """
+        with self.__lock:
+            if first_year < self.__first_year:
+                self.__bits = np.concatenate([self.__build(first_year, self.__first_year - 1), self.__bits])
+                self.__first_year = first_year
+            if last_year >= (end := self.__first_year + len(self.__bits)):
+                self.__bits = np.concatenate([self.__bits, self.__build(end, last_year)])
+            return self.__first_year, self.__bits
+
+    @staticmethod
+    def __to_date(d: date | datetime | int) -> date:
+        if isinstance(d, int):
+            return date.fromtimestamp(d)
+        return d.date() if isinstance(d, datetime) else d
+
+    def __build(self, first_year: int, last_year: int) -> np.ndarray:
+        days = np.zeros((last_year - first_year + 1, 366), dtype=bool)
+        for d in CompanyHolidays(subdiv=self.__subdiv, years=range(first_year, last_year + 1)):
+            days[d.year - first_year, d.timetuple().tm_yday - 1] = True
+        return np.packbits(days, axis=1)
+
+
+__calendar: HolidayCalendar | None = None
+__calendar_lock = threading.Lock()
+
+
+def get_calendar() -> HolidayCalendar:
+    """
+    Get the shared holiday calendar configured by the settings. The holidays are precomputed on the first call.
+    :return: The holiday calendar
+    """
+    global __calendar
+    with __calendar_lock:
+        if __calendar is None:
+            s = Settings()
+            __calendar = HolidayCalendar(s.ocr_holiday_first_year, s.ocr_holiday_last_year, s.ocr_holiday_subdiv)
+        return __calendar
 
 
 def is_holiday(d: date | datetime | int) -> bool:
@@ -24,9 +107,17 @@ def is_holiday(d: date | datetime | int) -> bool:
     :param d: The date to check
     :return: True if the date is a holiday, False otherwise
     """
-    if isinstance(d, int):
-        d = date.fromtimestamp(d)
-    return d in __hdays
+    return get_calendar().is_holiday(d)
+
+
+def holidays_in_range(start: date | datetime | int, end: date | datetime | int) -> np.ndarray:
+    """
+    Checks for each day between two dates whether it is a country specific, regional or company holiday.
+    :param start: The first day of the range
+    :param end: The last day of the range, inclusive
+    :return: A boolean array with one entry per day
+    """
+    return get_calendar().holidays_in_range(start, end)
 
 
 def timestamp_to_date(timestamp: int) -> str:
@@ -0,0 +1,97 @@
+import cProfile
+import functools
+import logging as log
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+
+@dataclass
+class Span:
+    name: str
+    duration: float
+    shape_in: tuple[int, ...] | None = None
+    shape_out: tuple[int, ...] | None = None
+    bytes_in: int | None = None
+    bytes_out: int | None = None
+
+
+def log_sink(span: Span):
+    """ Sink writing the spans to the debug log """
+    log.debug(f'{span.name} took {span.duration * 1000:.1f} ms (in: {span.shape_in}, {span.bytes_in} bytes, '
+              f'out: {span.shape_out}, {span.bytes_out} bytes)')
+
+
+__sink: Callable[[Span], Any] | None = None
+__profile_dir: str = ''
+
+
+def set_sink(sink: Callable[[Span], Any] | None):
+    """
+    Set the sink receiving the spans of the traced functions. Tracing is disabled if the sink is None.
+    :param sink: A callable receiving each span
+    """
+    global __sink
+    __sink = sink
+
+
+def set_profile_dir(path: str):
+    """
+    Set the directory the profiles of the profiled functions are written to. Profiling is disabled if it is empty.
+    :param path: The directory of the profiles
+    """
+    global __profile_dir
+    __profile_dir = path
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorator to emit a span with the duration and the size of the first argument and the result to the sink.
+    :param name: The name of the span
+    :return: The result of the function.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if (sink := __sink) is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            duration = time.perf_counter() - start
+            shape_in, bytes_in = __measure(args[0]) if args else (None, None)
+            shape_out, bytes_out = __measure(result)
+            sink(Span(name, duration, shape_in, shape_out, bytes_in, bytes_out))
+            return result
+        return wrapper
+    return decorator
+
+
+def profiled(name: str) -> Callable:
+    """
+    Decorator to run the function with cProfile and dump the statistics to the profile directory.
+    :param name: The prefix of the profile files
+    :return: The result of the function.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not (profile_dir := __profile_dir):
+                return func(*args, **kwargs)
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                os.makedirs(profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(profile_dir, f'{name}-{time.time_ns()}.prof'))
+        return wrapper
+    return decorator
+
+
+def __measure(value: Any) -> tuple[tuple[int, ...] | None, int | None]:
+    import numpy as np
+    if isinstance(value, np.ndarray):
+        return value.shape, value.nbytes
+    if isinstance(value, bytes):
+        return None, len(value)
+    return None, None
@@ -0,0 +1,193 @@
+"""
+Benchmark of the extraction pipeline stages.
+
+Runs every stage on the menu images in tests/resources and reports the latency and the peak memory per stage and the
+end-to-end throughput. The peak memory is reported twice: the Python heap traced by tracemalloc, which misses the
+native buffers of NumPy, OpenCV and tesseract, and the growth of the resident set size (RSS), which covers them but is
+only available on Linux. The results can be saved as JSON and compared with a previous run:
+
+    python tests/benchmark.py --repeat 5 --output after.json --compare before.json
+"""
+import argparse
+import inspect
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+# Disable the persistent OCR cache, every repetition has to run the OCR again
+os.environ['ocr_cache_file'] = ''
+
+import itzmenu_extractor.jobs as jobs
+import itzmenu_extractor.ocr.extractor as extractor
+import itzmenu_extractor.ocr.postprocess as postprocess
+import itzmenu_extractor.ocr.preprocess as preprocess
+import itzmenu_extractor.util.cache as cache
+import itzmenu_extractor.util.image as image
+
+RESOURCES = Path(__file__).parent / 'resources'
+IMAGES = ('speiseplanWeek.jpg', 'speiseplanWeekHoliday.jpg')
+STAGES = ('decode', 'crop_table', 'convert_to_grayscale', 'remove_holidays', 'period_of_validity', 'extract_tables',
+          'img_to_dataframe', 'extract_week', 'dataframe_to_week_menu', 'end_to_end')
+# Fallback if the period of validity cannot be extracted, e.g. because tesseract is not installed
+DEFAULT_PERIOD = (1708297200, 1708901999)
+
+
+def identity(img):
+    return img
+
+
+def measure(func: Callable, repeat: int) -> dict[str, float]:
+    """
+    Run the function repeatedly with a cold OCR cache and collect its latency in milliseconds. The memory is measured
+    in separate runs, so measuring does not slow down the timed runs.
+    """
+    durations = []
+    for _ in range(repeat):
+        cache.get_cache().clear()
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return {'min_ms': min(durations), 'median_ms': statistics.median(durations), 'mean_ms': statistics.mean(durations),
+            'peak_heap_mb': peak_heap_mb(func), 'peak_rss_mb': peak_rss_mb(func)}
+
+
+def peak_heap_mb(func: Callable) -> float:
+    """ Measure the peak Python heap allocated by a single run of the function, excluding previous stages """
+    cache.get_cache().clear()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    finally:
+        tracemalloc.stop()
+
+
+def peak_rss_mb(func: Callable) -> float | None:
+    """
+    Measure how far a single run of the function raises the RSS above the RSS before the run. The high-water mark of
+    the process is reset before the run, so the peaks of previous stages do not hide the peak of this one.
+    :return: The growth in MB or None if the high-water mark cannot be reset
+    """
+    cache.get_cache().clear()
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        return None
+    before = __proc_status_kb('VmRSS')
+    func()
+    return (__proc_status_kb('VmHWM') - before) / 1024
+
+
+def stage_functions(img: bytes) -> dict[str, Callable]:
+    """ Create a function per stage that runs only this stage on the output of the previous ones """
+    decoded = preprocess.decode_image(identity)(img)
+    cropped = preprocess.crop_table(identity)(decoded)
+    grayscale = preprocess.convert_to_grayscale(identity)(cropped)
+    if (period := __safe(lambda: extractor.period_of_validity(img))) is None:
+        print(f'Using default period of validity {DEFAULT_PERIOD}', file=sys.stderr)
+        period = DEFAULT_PERIOD
+    table = preprocess.encode_image(identity)(preprocess.remove_holidays(identity)(grayscale, validity_period=period))
+    stages = {
+        'decode': lambda: preprocess.decode_image(identity)(img),
+        'crop_table': lambda: preprocess.crop_table(identity)(decoded),
+        'convert_to_grayscale': lambda: preprocess.convert_to_grayscale(identity)(cropped),
+        'remove_holidays': lambda: preprocess.remove_holidays(identity)(grayscale, validity_period=period),
+        'period_of_validity': lambda: extractor.period_of_validity(img),
+        'img_to_dataframe': lambda: extractor.img_to_dataframe(img),
+        'extract_week': lambda: extractor.extract_week(img),
+        'end_to_end': lambda: __end_to_end(img),
+    }
+    if (ocr := __safe(extractor.__create_ocr_instance)) is not None:
+        # The table detection of img2table without the preprocessing, the header OCR and the cache
+        extract_tables = inspect.unwrap(extractor.__extract_tables)
+        stages['extract_tables'] = lambda: extract_tables(table, ocr)
+    if (df := __safe(lambda: extractor.img_to_dataframe(img))) is not None:
+        checksum = image.bytes_to_sha256(img)
+        stages['dataframe_to_week_menu'] = lambda: postprocess.dataframe_to_week_menu(df, period, checksum, None)
+    return stages
+
+
+def run(stages: list[str], repeat: int) -> dict:
+    results = {'stages': {}, 'images': list(IMAGES)}
+    for name in IMAGES:
+        img = (RESOURCES / name).read_bytes()
+        functions = stage_functions(img)
+        for stage in stages:
+            if stage not in functions:
+                print(f'Skipping stage {stage} for {name}', file=sys.stderr)
+                continue
+            try:
+                results['stages'].setdefault(stage, {})[name] = measure(functions[stage], repeat)
+            except Exception as exc:
+                print(f'Stage {stage} failed for {name}: {exc!r}', file=sys.stderr)
+    if end_to_end := results['stages'].get('end_to_end'):
+        mean_ms = np.mean([r['mean_ms'] for r in end_to_end.values()])
+        results['throughput_images_per_min'] = 60000 / mean_ms
+    return results
+
+
+def report(results: dict, baseline: dict | None = None):
+    print(f'{"stage":<24}{"image":<28}{"median ms":>12}{"mean ms":>12}{"heap MB":>10}{"RSS MB":>10}'
+          f'{"baseline ms":>14}{"speed-up":>10}{"baseline RSS":>14}')
+    for stage, images in results['stages'].items():
+        for name, result in images.items():
+            line = f'{stage:<24}{name:<28}{result["median_ms"]:>12.1f}{result["mean_ms"]:>12.1f}' \
+                   f'{result["peak_heap_mb"]:>10.1f}{__format_mb(result.get("peak_rss_mb")):>10}'
+            if baseline is not None and (base := baseline['stages'].get(stage, {}).get(name)) is not None:
+                line += f'{base["median_ms"]:>14.1f}{base["median_ms"] / max(result["median_ms"], 1e-6):>9.2f}x' \
+                        f'{__format_mb(base.get("peak_rss_mb")):>14}'
+            print(line)
+    if 'throughput_images_per_min' in results:
+        print(f'Throughput: {results["throughput_images_per_min"]:.2f} images/min')
+
+
+def __proc_status_kb(field: str) -> int:
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1])
+    raise ValueError(f'{field} is missing in /proc/self/status')
+
+
+def __format_mb(value: float | None) -> str:
+    return f'{value:.1f}' if value is not None else '-'
+
+
+def __end_to_end(img: bytes):
+    if (result := jobs.extract_menu(img)) is not None:
+        postprocess.dataframe_to_week_menu(result[1], result[0], image.bytes_to_sha256(img), None)
+
+
+def __safe(func: Callable):
+    try:
+        return func()
+    except Exception as exc:
+        print(f'Failed to prepare stage input: {exc!r}', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the ItzMenuExtractor pipeline')
+    parser.add_argument('--repeat', '-r', type=int, default=3, help='number of runs per stage')
+    parser.add_argument('--stages', '-s', type=lambda s: s.split(','), default=list(STAGES),
+                        help=f'comma separated stages to run, default: {",".join(STAGES)}')
+    parser.add_argument('--output', '-o', type=Path, default=None, help='save the results as JSON')
+    parser.add_argument('--compare', '-c', type=Path, default=None, help='compare with the results of a previous run')
+    args = parser.parse_args()
+    results = run(args.stages, args.repeat)
+    baseline = json.loads(args.compare.read_text()) if args.compare is not None else None
+    report(results, baseline)
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -71,3 +71,28 @@ class TestSettings:
     def test_settings_with_invalid_itzmenu_host():
         with pytest.raises(ValidationError):
             Settings(itzmenu_host='invalid_host')
+
+    @staticmethod
+    def test_settings_with_invalid_ocr_preload_workers():
+        with pytest.raises(ValidationError):
+            Settings(ocr_preload_workers=0)
+
+    @staticmethod
+    def test_settings_with_valid_ocr_sources(monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setenv('ocr_sources', '[{"name": "first"}, {"name": "second", "host": "http://localhost:8080", '
+                                          '"endpoint": "menu.jpg", "interval": 60, "layout": "detect"}]')
+        settings = Settings()
+        assert [source.name for source in settings.ocr_sources] == ['first', 'second']
+        assert settings.ocr_sources[0].host == 'https://ivi.de'
+        assert settings.ocr_sources[0].interval is None
+        assert settings.ocr_sources[1].endpoint == 'menu.jpg'
+        assert settings.ocr_sources[1].interval == 60
+
+    @staticmethod
+    def test_settings_with_invalid_ocr_sources():
+        with pytest.raises(ValidationError):
+            Settings(ocr_sources=[{'name': 'first'}, {'name': 'first'}])
+        with pytest.raises(ValidationError):
+            Settings(ocr_sources=[])
+        with pytest.raises(ValidationError):
+            Settings(ocr_sources=[{'name': 'first', 'host': 'ftp://localhost'}])
@@ -5,6 +5,12 @@ import pytest
 from pytest_httpserver import HTTPServer
 
 
+@pytest.fixture(autouse=True)
+def result_cache(monkeypatch: pytest.MonkeyPatch):
+    """ Start each test with a new result cache instead of the results cached by the previous tests """
+    monkeypatch.setattr('itzmenu_extractor.util.cache.__cache', None)
+
+
 @pytest.fixture
 def httpserver(make_httpserver):
     server: HTTPServer = make_httpserver
@@ -0,0 +1,250 @@
+import base64
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+
+import cv2
+import numpy as np
+import pytest
+import polars as pl
+from pytest_httpserver import HTTPServer
+from werkzeug import Request, Response
+
+from itzmenu_extractor.ocr.engines import (BatchedVisionOCR, ShardedTesseractOCR, ShardedTesserocrOCR, TesserocrEngines,
+                                           TesserocrOCR, VisionBatcher)
+
+
+def hocr(word: str) -> str:
+    return ("<div class='ocr_page' id='page_1' title='bbox 0 0 200 100'>"
+            "<span class='ocr_line' id='line_1_1' title='bbox 10 10 50 30'>"
+            f"<span class='ocrx_word' id='word_1_1' title='bbox 10 10 50 30; x_wconf 95'>{word}</span>"
+            "</span></div>")
+
+
+def annotation(image: dict) -> dict:
+    """ Annotation with a single word containing the width of the image """
+    img = cv2.imdecode(np.frombuffer(base64.b64decode(image['content']), np.uint8), cv2.IMREAD_GRAYSCALE)
+    if not img.any():
+        # Vision omits the annotation of pages without text
+        return {}
+    vertices = [{'x': 10, 'y': 10}, {'x': 50, 'y': 10}, {'x': 50, 'y': 30}, {'x': 10, 'y': 30}]
+    word = {'boundingBox': {'vertices': vertices}, 'confidence': 0.95,
+            'symbols': [{'text': c} for c in str(img.shape[1])]}
+    return {'fullTextAnnotation': {'pages': [{'blocks': [{'paragraphs': [{'words': [word]}]}]}]}}
+
+
+class TessBaseAPI:
+    """ Stand-in for tesserocr.PyTessBaseAPI recognizing the width of the image as the only word """
+    created = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.image = None
+        self.variables = {}
+        TessBaseAPI.created.append(self)
+
+    def SetPageSegMode(self, psm: int):
+        self.psm = psm
+
+    def SetVariable(self, name: str, value: str):
+        self.variables[name] = value
+
+    def SetImage(self, image):
+        self.image = image
+
+    def GetUTF8Text(self) -> str:
+        return str(self.image.width)
+
+    def GetHOCRText(self, page: int) -> str:
+        return hocr(str(self.image.width))
+
+    def Clear(self):
+        self.image = None
+
+
+@pytest.fixture
+def tesserocr_api() -> type[TessBaseAPI]:
+    TessBaseAPI.created = []
+    with patch.dict('sys.modules', {'tesserocr': MagicMock(PyTessBaseAPI=TessBaseAPI)}):
+        yield TessBaseAPI
+
+
+@pytest.fixture
+def vision_stub(httpserver: HTTPServer) -> list[int]:
+    """ Local stand-in for the images:annotate endpoint that records the number of images per request """
+    batches = []
+    lock = threading.Lock()
+
+    def handler(request: Request) -> Response:
+        requests = json.loads(request.data)['requests']
+        with lock:
+            batches.append(len(requests))
+        body = {'responses': [annotation(r['image']) for r in requests]}
+        return Response(json.dumps(body), content_type='application/json')
+
+    httpserver.expect_request('/v1/images:annotate', method='POST', query_string='key=api_key') \
+        .respond_with_handler(handler)
+    return batches
+
+
+@pytest.fixture
+def vision_endpoint(httpserver: HTTPServer) -> str:
+    return f'http://{httpserver.host}:{httpserver.port}'
+
+
+def page(width: int) -> np.ndarray:
+    return np.full((40, width), 255, dtype=np.uint8)
+
+
+@pytest.fixture
+def sharded_ocr() -> ShardedTesseractOCR:
+    with patch('img2table.ocr.tesseract.subprocess') as MockSubprocess:
+        MockSubprocess.run.return_value = MagicMock(returncode=0)
+        MockSubprocess.check_output.return_value = b'List of available languages (1):\ndeu\n'
+        return ShardedTesseractOCR(n_threads=2, lang='deu')
+
+
+@pytest.fixture
+def table_image() -> np.ndarray:
+    image = np.full((300, 1000), 255, dtype=np.uint8)
+    # Draw separator lines over the full height
+    image[:, 0:2] = 0
+    image[:, 400:402] = 0
+    image[:, 700:702] = 0
+    # Draw a horizontal line that must not be detected as separator
+    image[150:152, :] = 0
+    return image
+
+
+class TestShardedTesseractOCR:
+
+    @staticmethod
+    def test_shard_offsets(sharded_ocr: ShardedTesseractOCR, table_image: np.ndarray):
+        assert sharded_ocr.shard_offsets(table_image) == [0, 400, 700]
+
+    @staticmethod
+    def test_shard_offsets_min_width(sharded_ocr: ShardedTesseractOCR, table_image: np.ndarray):
+        table_image[:, 950:952] = 0
+        assert sharded_ocr.shard_offsets(table_image) == [0, 400, 700]
+
+    @staticmethod
+    def test_to_ocr_dataframe_offsets(sharded_ocr: ShardedTesseractOCR, table_image: np.ndarray):
+        document = MagicMock(images=[table_image])
+        with patch.object(sharded_ocr, 'hocr', side_effect=[hocr('Suppe'), hocr('Montag'), hocr('Dienstag')]):
+            ocr_df = sharded_ocr.of(document)
+        words = ocr_df.df.collect().filter(pl.col('class') == 'ocrx_word')
+        assert words['value'].to_list() == ['Suppe', 'Montag', 'Dienstag']
+        assert words['x1'].to_list() == [10, 410, 710]
+        assert words['x2'].to_list() == [50, 450, 750]
+        assert words['id'].n_unique() == 3
+        assert words['parent'].n_unique() == 3
+
+
+class TestTesserocrEngines:
+
+    @staticmethod
+    def test_engine_is_reused(tesserocr_api: type[TessBaseAPI]):
+        engines = TesserocrEngines(lang='deu', tessdata_dir='/tessdata')
+        assert engines.image_to_string(page(100), psm=6, whitelist='0123456789') == '100'
+        assert engines.image_to_string(page(200)) == '200'
+        assert len(tesserocr_api.created) == 1
+        assert tesserocr_api.created[0].kwargs == {'path': '/tessdata', 'lang': 'deu'}
+        assert tesserocr_api.created[0].variables == {'tessedit_char_whitelist': ''}
+        assert tesserocr_api.created[0].image is None
+
+    @staticmethod
+    def test_engine_per_thread(tesserocr_api: type[TessBaseAPI]):
+        engines = TesserocrEngines()
+        barrier = threading.Barrier(3)
+
+        def recognize(width: int) -> str:
+            barrier.wait()
+            return engines.image_to_hocr(page(width))
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            results = list(pool.map(recognize, [100, 200, 300]))
+        assert results == [hocr('100'), hocr('200'), hocr('300')]
+        assert 1 <= len(tesserocr_api.created) <= 3
+        engines.image_to_hocr(page(400))
+        assert len(tesserocr_api.created) <= 3
+
+
+class TestTesserocrOCR:
+
+    @staticmethod
+    def test_of(tesserocr_api: type[TessBaseAPI]):
+        ocr = TesserocrOCR(lang='deu', engines=TesserocrEngines())
+        ocr_df = ocr.of(MagicMock(images=[page(100)]))
+        words = ocr_df.df.collect().filter(pl.col('class') == 'ocrx_word')
+        assert words['value'].to_list() == ['100']
+
+    @staticmethod
+    def test_sharded_of(tesserocr_api: type[TessBaseAPI], table_image: np.ndarray):
+        ocr = ShardedTesserocrOCR(n_threads=2, lang='deu')
+        ocr.engines = TesserocrEngines()
+        ocr_df = ocr.of(MagicMock(images=[table_image]))
+        words = ocr_df.df.collect().filter(pl.col('class') == 'ocrx_word')
+        assert words['value'].to_list() == ['400', '300', '300']
+        assert words['x1'].to_list() == [10, 410, 710]
+
+
+class TestVisionBatcher:
+
+    @staticmethod
+    def test_full_batches(vision_stub: list[int], vision_endpoint: str):
+        batcher = VisionBatcher('api_key', vision_endpoint, batch_size=4, max_delay=10)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = list(pool.map(batcher.submit, [page(100 + i) for i in range(8)]))
+        annotations = [future.result(timeout=5) for future in futures]
+        assert vision_stub == [4, 4]
+        words = [a['fullTextAnnotation']['pages'][0]['blocks'][0]['paragraphs'][0]['words'][0] for a in annotations]
+        assert [''.join(s['text'] for s in word['symbols']) for word in words] == [str(100 + i) for i in range(8)]
+
+    @staticmethod
+    def test_partial_batch_sent_after_delay(vision_stub: list[int], vision_endpoint: str):
+        batcher = VisionBatcher('api_key', vision_endpoint, batch_size=16, max_delay=0.05)
+        futures = [batcher.submit(page(100)), batcher.submit(page(101))]
+        assert all('fullTextAnnotation' in future.result(timeout=5) for future in futures)
+        assert vision_stub == [2]
+
+    @staticmethod
+    def test_flush(vision_stub: list[int], vision_endpoint: str):
+        batcher = VisionBatcher('api_key', vision_endpoint, batch_size=16, max_delay=10)
+        future = batcher.submit(page(100))
+        batcher.flush()
+        assert future.done()
+        assert vision_stub == [1]
+
+    @staticmethod
+    def test_failed_request(httpserver: HTTPServer, vision_endpoint: str):
+        httpserver.expect_request('/v1/images:annotate', method='POST').respond_with_data(status=403)
+        batcher = VisionBatcher('api_key', vision_endpoint, batch_size=2, max_delay=10)
+        futures = [batcher.submit(page(100)), batcher.submit(page(101))]
+        for future in futures:
+            with pytest.raises(Exception):
+                future.result(timeout=5)
+
+    @staticmethod
+    def test_failed_image(httpserver: HTTPServer, vision_endpoint: str):
+        body = {'responses': [{'error': {'code': 3, 'message': 'Bad image data.'}}, {}]}
+        httpserver.expect_request('/v1/images:annotate', method='POST').respond_with_json(body)
+        batcher = VisionBatcher('api_key', vision_endpoint, batch_size=2, max_delay=10)
+        futures = [batcher.submit(page(100)), batcher.submit(page(101))]
+        with pytest.raises(RuntimeError):
+            futures[0].result(timeout=5)
+        assert futures[1].result(timeout=5) == {}
+
+
+class TestBatchedVisionOCR:
+
+    @staticmethod
+    def test_of(vision_stub: list[int], vision_endpoint: str):
+        ocr = BatchedVisionOCR(VisionBatcher('api_key', vision_endpoint, batch_size=3, max_delay=10))
+        blank = np.zeros((40, 120), dtype=np.uint8)
+        ocr_df = ocr.of(MagicMock(images=[page(100), blank, page(101)]))
+        words = ocr_df.df.collect().sort('page')
+        assert words['page'].to_list() == [0, 2]
+        assert words['value'].to_list() == ['100', '101']
+        assert words['confidence'].to_list() == [95, 95]
+        assert vision_stub == [3]
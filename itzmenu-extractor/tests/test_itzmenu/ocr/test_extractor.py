@@ -1,10 +1,22 @@
 import re
 import time
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pandas as pd
+import pytest
 
 import itzmenu_extractor.ocr.extractor as extractor
+import itzmenu_extractor.util.trace as trace
 from itzmenu_api.persistence.enums import WeekDay
 
 
+@pytest.fixture
+def blank_menu() -> bytes:
+    return cv2.imencode('.jpg', np.full((2479, 3508), 255, dtype=np.uint8))[1].tobytes()
+
+
 class TestExtractor:
 
     @staticmethod
@@ -79,3 +91,75 @@ class TestExtractor:
         assert period2 == period4
         assert period3 != period4
         assert stop - start < 1
+
+    @staticmethod
+    def test_period_of_validity_header_only(blank_menu):
+        with patch('itzmenu_extractor.ocr.extractor.pytesseract.image_to_string',
+                   return_value='Speiseplan 19.02.2024 - 23.02.2024') as MockImageToString:
+            period = extractor.period_of_validity(blank_menu)
+            assert period is not None
+            assert period[1] - period[0] == 604799
+            MockImageToString.assert_called_once()
+            # Check if only the downscaled header was passed to tesseract
+            assert MockImageToString.call_args.args[0].shape[:2] == (345 // 2, 3508 // 2)
+
+    @staticmethod
+    def test_period_of_validity_full_page_fallback(blank_menu):
+        with patch('itzmenu_extractor.ocr.extractor.pytesseract.image_to_string',
+                   side_effect=['', 'Speiseplan 19.02.2024 - 23.02.2024']) as MockImageToString:
+            period = extractor.period_of_validity(blank_menu)
+            assert period is not None
+            assert MockImageToString.call_count == 2
+
+    @staticmethod
+    def test_img_to_dataframe_table_detection_fallback(blank_menu):
+        with (patch('itzmenu_extractor.ocr.extractor.period_of_validity', return_value=(1708297200, 1708901999)),
+              patch('itzmenu_extractor.ocr.extractor.__create_ocr_instance'),
+              patch('itzmenu_extractor.ocr.extractor.Image') as MockImage):
+            MockImage.return_value.extract_tables.return_value = []
+            # The blank image does not match the layout of the menu
+            assert extractor.img_to_dataframe(blank_menu) is None
+            MockImage.return_value.extract_tables.assert_called_once()
+
+    @staticmethod
+    def test_img_to_dataframe_detect_layout(blank_menu):
+        with (patch('itzmenu_extractor.ocr.extractor.period_of_validity', return_value=(1708297200, 1708901999)),
+              patch('itzmenu_extractor.ocr.extractor.__create_ocr_instance'),
+              patch('itzmenu_extractor.ocr.extractor.grid.extract_grid_tables') as MockExtractGridTables,
+              patch('itzmenu_extractor.ocr.extractor.Image') as MockImage):
+            MockImage.return_value.extract_tables.return_value = []
+            assert extractor.img_to_dataframe(blank_menu, layout='detect') is None
+            MockExtractGridTables.assert_not_called()
+            MockImage.return_value.extract_tables.assert_called_once()
+
+    @staticmethod
+    def test_extract_week_single_pass(blank_menu):
+        spans = []
+        df = pd.DataFrame({'monday': ['Kartoffelsuppe 1.25']}, index=['Suppe'])
+        trace.set_sink(spans.append)
+        try:
+            with (patch('itzmenu_extractor.ocr.extractor.pytesseract.image_to_string',
+                        return_value='Speiseplan 19.02.2024 - 23.02.2024') as MockImageToString,
+                  patch('itzmenu_extractor.ocr.extractor.__table_to_dataframe', return_value=df) as MockTable):
+                period, result = extractor.extract_week(blank_menu)
+        finally:
+            trace.set_sink(None)
+        assert period[1] - period[0] == 604799
+        assert result.equals(df)
+        # The image is decoded once and only the header is recognized to get the period of validity
+        assert [span.name for span in spans].count('decode') == 1
+        MockImageToString.assert_called_once()
+        # The table is cropped from the thresholded page
+        image = MockTable.call_args.args[0]
+        assert image.ndim == 2
+        assert set(np.unique(image)) <= {0, 255}
+
+    @staticmethod
+    def test_extract_week_without_period(blank_menu):
+        with (patch('itzmenu_extractor.ocr.extractor.pytesseract.image_to_string', return_value='')
+              as MockImageToString,
+              patch('itzmenu_extractor.ocr.extractor.__table_to_dataframe') as MockTable):
+            assert extractor.extract_week(blank_menu) is None
+            # The full page is recognized if the header does not contain the period
+            assert MockImageToString.call_count == 2
+            MockTable.assert_not_called()
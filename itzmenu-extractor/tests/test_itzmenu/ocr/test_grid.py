@@ -0,0 +1,131 @@
+import numpy as np
+import polars as pl
+import pytest
+from img2table.ocr.base import OCRInstance
+from img2table.ocr.data import OCRDataframe
+
+import itzmenu_extractor.ocr.grid as grid
+import itzmenu_extractor.ocr.preprocess as preprocess
+
+
+def identity(image, **_):
+    return image
+
+
+def table_image(img: bytes, validity_period: tuple[int, int]) -> np.ndarray:
+    decoded = preprocess.decode_image(identity)(img)
+    cropped = preprocess.convert_to_grayscale(identity)(preprocess.crop_table(identity)(decoded))
+    return preprocess.remove_holidays(identity)(cropped, validity_period=validity_period)
+
+
+class WordOCR(OCRInstance):
+    """
+    OCR instance returning fixed words, words with the same top edge form a line. The confidence of the words is 95
+    unless it is given as sixth value.
+    """
+
+    def __init__(self, words: list[tuple]):
+        self.words = words
+
+    def content(self, document):
+        return self.words
+
+    def to_ocr_dataframe(self, content) -> OCRDataframe:
+        rows = [{'page': 0, 'class': 'ocrx_word', 'id': f'word_{i}', 'parent': f'line_{y1}', 'value': value,
+                 'confidence': confidence[0] if confidence else 95, 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
+                for i, (value, x1, y1, x2, y2, *confidence) in enumerate(content)]
+        return OCRDataframe(df=pl.LazyFrame(rows, schema=self.pl_schema))
+
+
+class RecognizeCell:
+    """ Recognition of single cells returning a fixed text and recording the recognized images """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.images = []
+
+    def __call__(self, image: np.ndarray) -> str:
+        self.images.append(image)
+        return self.text
+
+
+def menu_words(confidence: int = 95, price: str = '1,25') -> list[tuple]:
+    return [('Montag', 600, 40, 750, 80), ('Suppe', 10, 170, 120, 200),
+            ('Tagessuppe', 500, 150, 700, 180, confidence), (price, 800, 220, 850, 240), ('€', 855, 220, 870, 240)]
+
+
+class TestGrid:
+
+    @staticmethod
+    def test_detect_grid(week_menu: bytes):
+        table = grid.detect_grid(table_image(week_menu, (1708297200, 1708901999)))
+        assert table is not None
+        assert (table.nb_rows, table.nb_columns) == (7, 6)
+        # The category of the last two rows is merged
+        assert table.items[5].items[0] is table.items[6].items[0]
+        assert table.items[5].items[1] is not table.items[6].items[1]
+
+    @staticmethod
+    def test_detect_grid_holiday(week_menu_holiday: bytes):
+        # Easter Monday is a holiday
+        table = grid.detect_grid(table_image(week_menu_holiday, (1711922400, 1712527199)))
+        assert table is not None
+        assert (table.nb_rows, table.nb_columns) == (7, 5)
+
+    @staticmethod
+    def test_detect_grid_unknown_layout():
+        assert grid.detect_grid(np.full((1283, 3272), 255, dtype=np.uint8)) is None
+
+    @staticmethod
+    def test_detect_grid_tolerance(week_menu: bytes):
+        image = table_image(week_menu, (1708297200, 1708901999))
+        # Shift the table by a few pixels
+        assert grid.detect_grid(np.pad(image, ((5, 0), (5, 0)), constant_values=255)) is not None
+        assert grid.detect_grid(np.pad(image, ((20, 0), (0, 0)), constant_values=255)) is None
+
+    @staticmethod
+    def test_extract_grid_tables(week_menu: bytes):
+        ocr = WordOCR([('Montag', 600, 40, 750, 80), ('Suppe', 10, 170, 120, 200), ('Tagessuppe', 500, 150, 700, 180),
+                       ('1,25', 800, 220, 850, 240), ('€', 855, 220, 870, 240), ('Naschglück', 10, 1120, 200, 1165)])
+        tables = grid.extract_grid_tables(table_image(week_menu, (1708297200, 1708901999)), ocr)
+        assert len(tables) == 1
+        df = tables[0].df
+        # Empty rows and columns are removed
+        assert df.shape == (4, 2)
+        assert df.iloc[0].tolist() == [None, 'Montag']
+        assert df.iloc[1].tolist() == ['Suppe', 'Tagessuppe\n1,25 €']
+        assert df.iloc[2, 0] == df.iloc[3, 0] == 'Naschglück'
+
+    @staticmethod
+    def test_extract_grid_tables_unknown_layout():
+        ocr = WordOCR([])
+        assert grid.extract_grid_tables(np.full((1283, 3272), 255, dtype=np.uint8), ocr) is None
+
+    @staticmethod
+    def test_refine_cells_confident(week_menu: bytes):
+        recognize = RecognizeCell('Gemüsesuppe\n1,35 €')
+        tables = grid.extract_grid_tables(table_image(week_menu, (1708297200, 1708901999)), WordOCR(menu_words()),
+                                          refinement=grid.Refinement(recognize))
+        assert tables[0].df.iloc[1, 1] == 'Tagessuppe\n1,25 €'
+        assert recognize.images == []
+
+    @staticmethod
+    def test_refine_cells_low_confidence(week_menu: bytes):
+        recognize = RecognizeCell('Tagessuppe  mit Brot\n\n 1,35 €\n')
+        image = table_image(week_menu, (1708297200, 1708901999))
+        tables = grid.extract_grid_tables(image, WordOCR(menu_words(confidence=10)),
+                                          refinement=grid.Refinement(recognize))
+        assert tables[0].df.iloc[1, 1] == 'Tagessuppe mit Brot\n1,35 €'
+        # Only the doubtful cell is recognized again at twice the resolution
+        cell = grid.detect_grid(image).items[1].items[1]
+        assert len(recognize.images) == 1
+        assert recognize.images[0].shape == (2 * (cell.y2 - cell.y1 - 6), 2 * (cell.x2 - cell.x1 - 6))
+
+    @staticmethod
+    def test_refine_cells_without_price(week_menu: bytes):
+        recognize = RecognizeCell('Tagessuppe')
+        tables = grid.extract_grid_tables(table_image(week_menu, (1708297200, 1708901999)),
+                                          WordOCR(menu_words(price='l25')), refinement=grid.Refinement(recognize))
+        # The content is kept if the new content does not end with a price either
+        assert tables[0].df.iloc[1, 1] == 'Tagessuppe\nl25 €'
+        assert len(recognize.images) == 1
@@ -53,3 +53,13 @@ class TestPostprocessing:
         assert all(meal.price >= 0 for d in menu.menus for category in d.categories for meal in category.meals)
         assert all(isinstance(meal.curated_diet_type, list) for d in menu.menus for c in d.categories
                    for meal in c.meals)
+
+    def test_dataframe_to_week_menu_unparsable_meal(self, week_menu_df: pd.DataFrame, week_menu_checksum: str):
+        week_menu_df.loc['Suppe', WeekDay.MONDAY] = 'Tagessuppe'
+        week_menu_df.loc['Heimatküche', WeekDay.TUESDAY] = None
+        menu = postprocess.dataframe_to_week_menu(week_menu_df, (0, 1), week_menu_checksum, None)
+        monday = {category.name: category.meals for category in menu.menus[0].categories}
+        tuesday = {category.name: category.meals for category in menu.menus[1].categories}
+        assert monday['Suppe'] == []
+        assert tuesday['Heimatküche'] == []
+        assert tuesday['Suppe'] == [Meal(name='Wirsingsuppe Croutons Petersilie (VN)', price=1.25)]
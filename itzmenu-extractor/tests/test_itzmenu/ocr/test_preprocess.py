@@ -1,6 +1,7 @@
 import io
 
 import numpy as np
+import pytest
 from PIL import Image
 
 import itzmenu_extractor.ocr.preprocess as preprocess
@@ -104,4 +105,64 @@ class TestPreprocess:
         # Check if the height of the image is reduced, because rows are removed
         assert pimage_cropped.size[1] > pimage_no_holidays.size[1]
 
+    def test_in_memory_pipeline(self, week_menu: bytes):
+        @preprocess.crop_table
+        @preprocess.convert_to_grayscale
+        @preprocess.remove_holidays
+        def dummy_func_1(img: bytes) -> bytes:
+            return img
+
+        @preprocess.decode_image
+        @preprocess.crop_table
+        @preprocess.convert_to_grayscale
+        @preprocess.remove_holidays
+        def dummy_func_2(img: np.ndarray) -> np.ndarray:
+            return img
+
+        @preprocess.decode_image
+        @preprocess.crop_table
+        @preprocess.convert_to_grayscale
+        @preprocess.remove_holidays
+        @preprocess.encode_image
+        def dummy_func_3(img: bytes) -> bytes:
+            return img
+
+        validity_period = (1708297200, 1708901999)
+        pimage_bytes = Image.open(io.BytesIO(dummy_func_1(week_menu, validity_period=validity_period)))
+        image_np = dummy_func_2(week_menu, validity_period=validity_period)
+        pimage_png = Image.open(io.BytesIO(dummy_func_3(week_menu, validity_period=validity_period)))
+
+        # Check if the decorators pass the decoded array through the chain
+        assert isinstance(image_np, np.ndarray)
+        assert len(image_np.shape) == 2
+        assert pimage_bytes.size == (image_np.shape[1], image_np.shape[0])
+        # Check if the final buffer is encoded losslessly
+        assert pimage_png.format == 'PNG'
+        assert np.array_equal(np.array(pimage_png), image_np)
+
+    def test_crop_header(self, week_menu: bytes):
+        @preprocess.decode_image
+        @preprocess.crop_header
+        def dummy_func(img: np.ndarray) -> np.ndarray:
+            return img
+
+        pimage_org = Image.open(io.BytesIO(week_menu))
+        image_np = dummy_func(week_menu)
+
+        # Check if only the header is kept at half the resolution
+        assert image_np.shape[1] == pimage_org.size[0] // 2
+        assert image_np.shape[0] == 345 // 2
+
+    def test_low_memory_decode(self, monkeypatch: pytest.MonkeyPatch, week_menu: bytes):
+        @preprocess.decode_image
+        @preprocess.crop_table
+        @preprocess.convert_to_grayscale
+        def dummy_func(img: np.ndarray) -> np.ndarray:
+            return img
+
+        image_np = dummy_func(week_menu)
+        monkeypatch.setenv('ocr_low_memory', 'true')
+        image_np_low_memory = dummy_func(week_menu)
 
+        # Check if decoding the image as grayscale does not change the thresholded image
+        assert np.array_equal(image_np, image_np_low_memory)
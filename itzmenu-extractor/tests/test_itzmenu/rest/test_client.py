@@ -1,6 +1,8 @@
+import pytest
 from pytest_httpserver import HTTPServer
 
-from itzmenu_extractor.rest.client import MenuClient
+from itzmenu_extractor.rest.client import AsyncMenuClient, MenuClient, NOT_MODIFIED
+from itzmenu_extractor.rest.requests import ImageRequest
 import itzmenu_extractor.util.image as image
 
 
@@ -19,3 +21,77 @@ class TestClient:
         menu_client = MenuClient(f'http://{httpserver.host}:{httpserver.port}')
         img = menu_client.get_week_menu()
         assert img is None
+
+    def test_menu_client_get_week_menu_not_modified(self, httpserver: HTTPServer, week_menu: bytes):
+        headers = {'ETag': '"abc"', 'Last-Modified': 'Mon, 19 Feb 2024 07:00:00 GMT'}
+        (httpserver.expect_ordered_request('/media/img/speiseplanWeek.jpg', method='GET')
+         .respond_with_data(week_menu, mimetype='image/jpeg', headers=headers))
+        (httpserver.expect_ordered_request('/media/img/speiseplanWeek.jpg', method='GET',
+                                           headers={'If-None-Match': '"abc"',
+                                                    'If-Modified-Since': 'Mon, 19 Feb 2024 07:00:00 GMT'})
+         .respond_with_data(status=304))
+        menu_client = MenuClient(f'http://{httpserver.host}:{httpserver.port}')
+        assert menu_client.get_week_menu() == week_menu
+        assert menu_client.get_week_menu() is NOT_MODIFIED
+        httpserver.check_assertions()
+
+    def test_menu_client_forgets_validators(self, httpserver: HTTPServer, week_menu: bytes):
+        (httpserver.expect_request('/media/img/speiseplanWeek.jpg', method='GET')
+         .respond_with_data(week_menu, mimetype='image/jpeg', headers={'ETag': '"abc"'}))
+        menu_client = MenuClient(f'http://{httpserver.host}:{httpserver.port}')
+        menu_client.get_week_menu()
+        menu_client.forget_validators()
+        assert menu_client.get_week_menu() == week_menu
+        assert 'If-None-Match' not in httpserver.log[-1][0].headers
+
+    def test_menu_client_get_week_menu_custom_endpoint(self, httpserver: HTTPServer, week_menu: bytes):
+        httpserver.expect_request('/menus/week.jpg', method='GET').respond_with_data(week_menu, mimetype='image/jpeg')
+        menu_client = MenuClient(f'http://{httpserver.host}:{httpserver.port}', ImageRequest('menus/week.jpg'))
+        assert menu_client.get_week_menu() == week_menu
+
+
+@pytest.mark.asyncio
+class TestAsyncClient:
+
+    async def test_menu_client_get_week_menu_success(self, httpserver: HTTPServer, week_menu: bytes,
+                                                     week_menu_checksum: str):
+        (httpserver.expect_request('/media/img/speiseplanWeek.jpg', method='GET')
+         .respond_with_data(week_menu, mimetype='image/jpeg'))
+        menu_client = AsyncMenuClient(f'http://{httpserver.host}:{httpserver.port}')
+        img = await menu_client.get_week_menu()
+        await menu_client.aclose()
+        assert image.bytes_to_sha256(img) == week_menu_checksum
+
+    async def test_menu_client_get_week_menu_failure(self, httpserver: HTTPServer):
+        menu_client = AsyncMenuClient(f'http://{httpserver.host}:{httpserver.port}')
+        assert await menu_client.get_week_menu() is None
+        await menu_client.aclose()
+
+    async def test_menu_client_get_week_menu_connection_error(self):
+        menu_client = AsyncMenuClient('http://localhost:1')
+        assert await menu_client.get_week_menu() is None
+        await menu_client.aclose()
+
+    async def test_menu_client_get_week_menu_not_modified(self, httpserver: HTTPServer, week_menu: bytes):
+        headers = {'ETag': '"abc"', 'Last-Modified': 'Mon, 19 Feb 2024 07:00:00 GMT'}
+        (httpserver.expect_ordered_request('/media/img/speiseplanWeek.jpg', method='GET')
+         .respond_with_data(week_menu, mimetype='image/jpeg', headers=headers))
+        (httpserver.expect_ordered_request('/media/img/speiseplanWeek.jpg', method='GET',
+                                           headers={'If-None-Match': '"abc"',
+                                                    'If-Modified-Since': 'Mon, 19 Feb 2024 07:00:00 GMT'})
+         .respond_with_data(status=304))
+        menu_client = AsyncMenuClient(f'http://{httpserver.host}:{httpserver.port}')
+        assert await menu_client.get_week_menu() == week_menu
+        assert await menu_client.get_week_menu() is NOT_MODIFIED
+        await menu_client.aclose()
+        httpserver.check_assertions()
+
+    async def test_menu_client_forgets_validators(self, httpserver: HTTPServer, week_menu: bytes):
+        (httpserver.expect_request('/media/img/speiseplanWeek.jpg', method='GET')
+         .respond_with_data(week_menu, mimetype='image/jpeg', headers={'ETag': '"abc"'}))
+        menu_client = AsyncMenuClient(f'http://{httpserver.host}:{httpserver.port}')
+        await menu_client.get_week_menu()
+        menu_client.forget_validators()
+        assert await menu_client.get_week_menu() == week_menu
+        await menu_client.aclose()
+        assert 'If-None-Match' not in httpserver.log[-1][0].headers
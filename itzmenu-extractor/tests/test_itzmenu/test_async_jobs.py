@@ -0,0 +1,185 @@
+import asyncio
+import json
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch, AsyncMock, Mock
+
+import pandas as pd
+import pytest
+
+from itzmenu_api.persistence.enums import WeekDay
+from itzmenu_extractor.async_jobs import AsyncExecutor
+from itzmenu_extractor.config.settings import Settings
+from itzmenu_extractor.rest.client import NOT_MODIFIED
+
+
+@pytest.fixture()
+def week_menu_df(week_menu_csv_path: Path) -> pd.DataFrame:
+    df = pd.read_csv(week_menu_csv_path)
+    df.columns = df.columns.map(lambda x: WeekDay.find_by_value(x), na_action='ignore')
+    df.set_index(df.columns[0], inplace=True)
+    return df
+
+
+@pytest.fixture()
+def clients():
+    with patch('itzmenu_extractor.jobs.ProcessPoolExecutor', ThreadPoolExecutor), \
+            patch('itzmenu_extractor.async_jobs.AsyncMenuClient') as MockMenuClient, \
+            patch('itzmenu_extractor.async_jobs.AsyncItzMenuClient') as MockItzMenuClient:
+        MockMenuClient.return_value = AsyncMock(forget_validators=Mock())
+        MockItzMenuClient.return_value = AsyncMock()
+        MockItzMenuClient.return_value.get_menu_by_id_or_checksum.return_value = None
+        yield MockMenuClient.return_value, MockItzMenuClient.return_value
+
+
+@pytest.mark.asyncio
+async def test_async_executor_runs_until_stopped(clients):
+    menu_client, itz_client = clients
+    menu_client.get_week_menu.return_value = NOT_MODIFIED
+    itz_client.get_menu_by_timestamp_range.return_value = []
+    executor = AsyncExecutor(Namespace(log='info', preload=[]))
+    # The scheduler has to be shut down before the clients are closed and the event loop may stop
+    scheduler_running = []
+    itz_client.aclose.side_effect = lambda: scheduler_running.append(executor._AsyncExecutor__scheduler.running)
+    task = asyncio.create_task(executor.run())
+    await asyncio.sleep(0.1)
+    executor.stop()
+    await asyncio.wait_for(task, 1)
+    assert scheduler_running == [False]
+    menu_client.get_week_menu.assert_awaited_once()
+    menu_client.aclose.assert_awaited_once()
+    itz_client.aclose.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_async_executor_fetches_menu_and_processes_image(clients, week_menu_df: pd.DataFrame):
+    menu_client, itz_client = clients
+    menu_client.get_week_menu.return_value = b'image_bytes'
+    with patch('itzmenu_extractor.async_jobs.extract_menu',
+               return_value=((1708297200, 1708729199), week_menu_df)) as MockExtractMenu:
+        executor = AsyncExecutor(Namespace(log='info', preload=[]))
+        await executor.fetch_menu()
+        MockExtractMenu.assert_called_once_with(b'image_bytes', 'default')
+        itz_client.create_menu.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_async_executor_fetches_menu_not_modified(clients):
+    menu_client, itz_client = clients
+    menu_client.get_week_menu.return_value = NOT_MODIFIED
+    executor = AsyncExecutor(Namespace(log='info', preload=[]))
+    await executor.fetch_menu()
+    itz_client.get_menu_by_id_or_checksum.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_async_executor_skips_known_menu(clients):
+    _, itz_client = clients
+    itz_client.get_menu_by_id_or_checksum.return_value = Mock()
+    with patch('itzmenu_extractor.async_jobs.extract_menu') as MockExtractMenu:
+        executor = AsyncExecutor(Namespace(log='info', preload=[]))
+        assert not await executor.process_image(b'image_bytes')
+        assert not await executor.process_image(b'image_bytes')
+        itz_client.get_menu_by_id_or_checksum.assert_awaited_once()
+        MockExtractMenu.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_async_executor_extracts_concurrent_duplicates_once(clients, week_menu_df: pd.DataFrame):
+    _, itz_client = clients
+    with patch('itzmenu_extractor.async_jobs.extract_menu',
+               return_value=((1708297200, 1708729199), week_menu_df)) as MockExtractMenu:
+        executor = AsyncExecutor(Namespace(log='info', preload=[]))
+        results = await asyncio.gather(executor.process_image(b'image_bytes'), executor.process_image(b'image_bytes'))
+        assert sorted(results) == [False, True]
+        MockExtractMenu.assert_called_once()
+        itz_client.create_menu.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_async_executor_handles_extraction_failure(clients):
+    _, itz_client = clients
+    with patch('itzmenu_extractor.async_jobs.extract_menu', side_effect=RuntimeError('failed')), \
+            patch('itzmenu_extractor.async_jobs.log.error') as MockLogError:
+        executor = AsyncExecutor(Namespace(log='info', preload=[]))
+        await executor.process_image(b'image_bytes')
+        MockLogError.assert_called_once()
+        itz_client.create_menu.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_async_executor_fetches_menu_again_after_failure(clients):
+    menu_client, _ = clients
+    menu_client.get_week_menu.return_value = b'image_bytes'
+    with patch('itzmenu_extractor.async_jobs.extract_menu', side_effect=RuntimeError('failed')):
+        executor = AsyncExecutor(Namespace(log='info', preload=[]))
+        await executor.fetch_menu()
+        menu_client.forget_validators.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_async_executor_ingests_menus(monkeypatch: pytest.MonkeyPatch, tmp_path: Path, clients,
+                                           week_menu_df: pd.DataFrame):
+    monkeypatch.setenv('ocr_preload_workers', '2')
+    _, itz_client = clients
+    for i in range(5):
+        (tmp_path / f'{i}.jpg').write_bytes(f'{i}'.encode())
+    (tmp_path / 'copy.jpg').write_bytes(b'0')
+    with patch('itzmenu_extractor.async_jobs.extract_menu',
+               return_value=((1708297200, 1708729199), week_menu_df)) as MockExtractMenu:
+        executor = AsyncExecutor(Namespace(log='info', preload=[], ingest=str(tmp_path)))
+        await executor.ingest_menus()
+        assert MockExtractMenu.call_count == 5
+        assert itz_client.create_menu.await_count == 5
+
+
+@pytest.mark.asyncio
+async def test_async_executor_ingests_menus_after_failure(tmp_path: Path, clients, week_menu_df: pd.DataFrame):
+    _, itz_client = clients
+    for i in range(3):
+        (tmp_path / f'{i}.jpg').write_bytes(f'{i}'.encode())
+    with patch('itzmenu_extractor.async_jobs.extract_menu',
+               side_effect=[RuntimeError('failed'), ((1708297200, 1708729199), week_menu_df),
+                            ((1708297200, 1708729199), week_menu_df)]), \
+            patch('itzmenu_extractor.async_jobs.log.info') as MockLogInfo:
+        executor = AsyncExecutor(Namespace(log='info', preload=[], ingest=str(tmp_path)))
+        await executor.ingest_menus()
+        assert itz_client.create_menu.await_count == 2
+        assert MockLogInfo.call_args.args[0].endswith('skipped 0 known images, failed to ingest 1 images')
+
+
+@pytest.mark.asyncio
+async def test_async_executor_loads_only_unknown_files(tmp_path: Path, clients):
+    _, itz_client = clients
+    itz_client.get_menu_by_id_or_checksum.return_value = Mock()
+    (file := tmp_path / 'known.jpg').write_bytes(b'image_bytes')
+    with patch('itzmenu_extractor.async_jobs.image.load_image') as MockLoadImage:
+        executor = AsyncExecutor(Namespace(log='info', preload=[]))
+        assert not await executor.process_file(str(file))
+        MockLoadImage.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_async_executor_caps_concurrent_sources(monkeypatch: pytest.MonkeyPatch, clients):
+    sources = [{'name': f'canteen{i}', 'host': f'http://canteen{i}.example.org'} for i in range(4)]
+    monkeypatch.setenv('ocr_sources', json.dumps(sources))
+    monkeypatch.setenv('ocr_max_concurrency', '2')
+    menu_client, _ = clients
+    running = peak = 0
+
+    async def get_week_menu():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return NOT_MODIFIED
+
+    menu_client.get_week_menu.side_effect = get_week_menu
+    with patch('itzmenu_extractor.async_jobs.AsyncIOScheduler') as MockScheduler:
+        executor = AsyncExecutor(Namespace(log='info', preload=[]))
+        assert MockScheduler.return_value.add_job.call_count == 5
+        await asyncio.gather(*(executor.fetch_menu(source) for source in Settings().ocr_sources))
+    assert menu_client.get_week_menu.await_count == 4
+    assert peak == 2
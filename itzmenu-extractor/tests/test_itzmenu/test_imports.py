@@ -0,0 +1,40 @@
+import subprocess
+import sys
+
+import pytest
+
+# Dependencies that are only required once an image is extracted
+OCR_DEPENDENCIES = {'cv2', 'holidays', 'img2table', 'pandas', 'polars', 'pytesseract'}
+# Cumulative import time of the executors in microseconds
+IMPORT_BUDGET = 1_000_000
+
+
+def import_times(*args: str) -> dict[str, int]:
+    """ Run python with -X importtime and collect the cumulative import time of each module """
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args], capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.removeprefix('import time:').split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize('module', ['itzmenu_extractor.jobs', 'itzmenu_extractor.async_jobs'])
+def test_executor_import_excludes_ocr_dependencies(module: str):
+    times = import_times('-c', f'import {module}')
+    assert {name.split('.')[0] for name in times} & OCR_DEPENDENCIES == set()
+
+
+@pytest.mark.parametrize('module', ['itzmenu_extractor.jobs', 'itzmenu_extractor.async_jobs'])
+def test_executor_import_time_budget(module: str):
+    times = import_times('-c', f'import {module}')
+    assert times[module] < IMPORT_BUDGET
+
+
+def test_help_does_not_import_executor():
+    times = import_times('-m', 'itzmenu_extractor', '--help')
+    assert 'itzmenu_extractor.jobs' not in times
+    assert 'itzmenu_extractor.async_jobs' not in times
@@ -1,13 +1,22 @@
 import hashlib
+import json
+import pickle
 from pathlib import Path
 
+import cv2
+import numpy as np
 import pandas as pd
 import pytest
-from unittest.mock import patch
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest.mock import patch, Mock
 from argparse import Namespace
+from pytest_httpserver import HTTPServer
 
 from itzmenu_api.persistence.enums import WeekDay
-from itzmenu_extractor.jobs import Executor
+import itzmenu_extractor.jobs as jobs
+import itzmenu_extractor.util.image as image
+from itzmenu_extractor.jobs import Executor, create_extraction_pool, precompute_holidays
+from itzmenu_extractor.rest.client import NOT_MODIFIED
 
 
 @pytest.fixture()
@@ -20,14 +29,32 @@ def week_menu_df(week_menu_csv_path: Path) -> pd.DataFrame:
 
 def test_executor_starts_and_stops_scheduler():
     args = Namespace(log='info', preload=[])
-    with patch('itzmenu_extractor.jobs.BlockingScheduler') as MockScheduler:
+    with patch('itzmenu_extractor.jobs.BlockingScheduler') as MockScheduler, \
+            patch('itzmenu_extractor.jobs.precompute_holidays') as MockPrecomputeHolidays:
         executor = Executor(args)
+        MockPrecomputeHolidays.assert_not_called()
         executor.start()
+        MockPrecomputeHolidays.assert_called_once()
         MockScheduler.return_value.start.assert_called_once()
         executor.stop()
         MockScheduler.return_value.shutdown.assert_called_once()
 
 
+def test_precompute_holidays():
+    with patch('itzmenu_extractor.util.time.get_calendar') as MockGetCalendar:
+        precompute_holidays().join(timeout=5)
+        MockGetCalendar.assert_called_once()
+
+
+def test_executor_does_not_cap_scheduler_threads(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv('ocr_max_concurrency', '1')
+    args = Namespace(log='info', preload=[], ingest='menus')
+    with patch('itzmenu_extractor.jobs.BlockingScheduler') as MockScheduler:
+        Executor(args)
+        # A long-running ingest job must not occupy the only thread the fetch jobs could run on
+        MockScheduler.assert_called_once_with()
+
+
 def test_executor_preloads_menu_with_valid_filename():
     args = Namespace(log='info', preload=['valid.jpg'])
     with patch('itzmenu_extractor.jobs.image.load_image') as MockLoadImage, \
@@ -38,6 +65,64 @@ def test_executor_preloads_menu_with_valid_filename():
         MockProcessImage.assert_called_once()
 
 
+def test_executor_preloads_menus_in_parallel(monkeypatch: pytest.MonkeyPatch, tmp_path: Path,
+                                            week_menu_df: pd.DataFrame):
+    monkeypatch.setenv('ocr_preload_workers', '2')
+    files = []
+    for name in ('first', 'second', 'third'):
+        (file := tmp_path / f'{name}.jpg').write_bytes(name.encode())
+        files.append(str(file))
+    args = Namespace(log='info', preload=files)
+    with patch('itzmenu_extractor.jobs.ProcessPoolExecutor', ThreadPoolExecutor), \
+            patch('itzmenu_extractor.jobs.extract_menu', return_value=((1708297200, 1708729199), week_menu_df)) \
+            as MockExtractMenu, \
+            patch('itzmenu_extractor.jobs.ItzMenuClient') as MockItzMenuClient:
+        MockItzMenuClient.return_value.get_menu_by_id_or_checksum.side_effect = [None, True, None]
+        executor = Executor(args)
+        executor.preload_menu()
+        assert MockExtractMenu.call_count == 2
+        assert MockItzMenuClient.return_value.create_menu.call_count == 2
+
+
+def test_extract_menu_can_be_passed_to_process_pool():
+    assert jobs.extract_menu.__name__ == 'extract_menu'
+    assert pickle.loads(pickle.dumps(jobs.extract_menu)) is jobs.extract_menu
+
+
+def test_executor_extracts_in_threads_with_batched_vision_requests(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv('google_cloud_vision_enabled', 'true')
+    monkeypatch.setenv('google_cloud_vision_batch_size', '8')
+    with create_extraction_pool(8) as pool:
+        assert isinstance(pool, ThreadPoolExecutor)
+    monkeypatch.setenv('google_cloud_vision_batch_size', '1')
+    with create_extraction_pool(1) as pool:
+        assert isinstance(pool, ProcessPoolExecutor)
+
+
+def test_executor_ingests_menus(monkeypatch: pytest.MonkeyPatch, tmp_path: Path, week_menu_df: pd.DataFrame):
+    monkeypatch.setenv('ocr_preload_workers', '2')
+    (tmp_path / '2024').mkdir()
+    for i in range(5):
+        (tmp_path / '2024' / f'{i}.jpg').write_bytes(f'{i}'.encode())
+    # A copy of an image that is already queued must only be extracted once
+    (tmp_path / 'copy.jpg').write_bytes(b'0')
+    (tmp_path / 'notes.txt').write_bytes(b'notes')
+    args = Namespace(log='info', preload=[], ingest=str(tmp_path))
+    with patch('itzmenu_extractor.jobs.ProcessPoolExecutor', ThreadPoolExecutor), \
+            patch('itzmenu_extractor.jobs.extract_menu', return_value=((1708297200, 1708729199), week_menu_df)) \
+            as MockExtractMenu, \
+            patch('itzmenu_extractor.jobs.ItzMenuClient') as MockItzMenuClient, \
+            patch('itzmenu_extractor.jobs.image.load_image', wraps=image.load_image) as MockLoadImage:
+        MockItzMenuClient.return_value.get_menu_by_id_or_checksum.return_value = None
+        executor = Executor(args)
+        executor.ingest_menus()
+        assert MockExtractMenu.call_count == 5
+        assert MockItzMenuClient.return_value.create_menu.call_count == 5
+        # Each unknown file is read once, the extraction receives the loaded bytes
+        assert MockLoadImage.call_count == 5
+        assert sorted(c.args[0] for c in MockExtractMenu.call_args_list) == [b'0', b'1', b'2', b'3', b'4']
+
+
 def test_executor_preloads_menu_with_invalid_filename():
     args = Namespace(log='info', preload=['invalid'])
     with patch('itzmenu_extractor.jobs.log.warning') as MockLogWarning:
@@ -48,12 +133,91 @@ def test_executor_preloads_menu_with_invalid_filename():
 
 def test_executor_fetches_menu_and_processes_image():
     args = Namespace(log='info', preload=[])
-    with patch('itzmenu_extractor.jobs.MenuClient') as MockMenuClient, \
+    with patch('itzmenu_extractor.jobs.BlockingScheduler'), \
+            patch('itzmenu_extractor.jobs.MenuClient') as MockMenuClient, \
             patch('itzmenu_extractor.jobs.Executor.process_image') as MockProcessImage:
+        MockMenuClient.return_value.get_week_menu.return_value = b'image_bytes'
         executor = Executor(args)
+        executor.start_workers()
         executor.fetch_menu()
+        assert executor.wait_for_queue(timeout=5)
+        executor.stop()
         MockMenuClient.return_value.get_week_menu.assert_called_once()
-        MockProcessImage.assert_called_once()
+        MockProcessImage.assert_called_once_with(b'image_bytes', 'default', image.bytes_to_sha256(b'image_bytes'))
+
+
+def test_executor_fetches_menu_without_waiting_for_extraction():
+    args = Namespace(log='info', preload=[])
+    with patch('itzmenu_extractor.jobs.MenuClient') as MockMenuClient, \
+            patch('itzmenu_extractor.jobs.Executor.process_image') as MockProcessImage:
+        MockMenuClient.return_value.get_week_menu.return_value = b'image_bytes'
+        executor = Executor(args)
+        executor.fetch_menu()
+        executor.fetch_menu()
+        MockProcessImage.assert_not_called()
+        metrics = executor.queue_metrics()
+        assert (metrics.depth, metrics.enqueued, metrics.duplicates) == (1, 1, 1)
+
+
+def test_executor_drops_menu_if_queue_is_full(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv('ocr_queue_size', '1')
+    monkeypatch.setenv('ocr_queue_timeout', '0')
+    args = Namespace(log='info', preload=[])
+    with patch('itzmenu_extractor.jobs.MenuClient') as MockMenuClient, \
+            patch('itzmenu_extractor.jobs.log.warning') as MockLogWarning:
+        MockMenuClient.return_value.get_week_menu.side_effect = [b'first', b'second']
+        executor = Executor(args)
+        executor.fetch_menu()
+        executor.fetch_menu()
+        MockLogWarning.assert_called_once_with('Dropped menu of ivi, the queue of 1 images is full')
+        MockMenuClient.return_value.forget_validators.assert_called_once()
+        assert executor.queue_metrics().rejected == 1
+
+
+def test_executor_keeps_processing_queue_after_failure():
+    args = Namespace(log='info', preload=[])
+    with patch('itzmenu_extractor.jobs.BlockingScheduler'), \
+            patch('itzmenu_extractor.jobs.MenuClient') as MockMenuClient, \
+            patch('itzmenu_extractor.jobs.Executor.process_image') as MockProcessImage:
+        MockMenuClient.return_value.get_week_menu.side_effect = [b'first', b'second']
+        MockProcessImage.side_effect = [RuntimeError('failed'), None]
+        executor = Executor(args)
+        executor.fetch_menu()
+        executor.fetch_menu()
+        executor.start_workers()
+        assert executor.wait_for_queue(timeout=5)
+        executor.stop()
+        assert [c.args[0] for c in MockProcessImage.call_args_list] == [b'first', b'second']
+
+
+def test_executor_fetches_menu_again_after_failure(monkeypatch: pytest.MonkeyPatch, httpserver: HTTPServer):
+    sources = [{'name': 'ivi', 'host': f'http://{httpserver.host}:{httpserver.port}'}]
+    monkeypatch.setenv('ocr_sources', json.dumps(sources))
+    (httpserver.expect_request('/media/img/speiseplanWeek.jpg', method='GET')
+     .respond_with_data(b'image_bytes', mimetype='image/jpeg', headers={'ETag': '"abc"'}))
+    args = Namespace(log='info', preload=[])
+    with patch('itzmenu_extractor.jobs.BlockingScheduler'), \
+            patch('itzmenu_extractor.jobs.Executor.process_image') as MockProcessImage:
+        MockProcessImage.side_effect = [RuntimeError('failed'), True]
+        executor = Executor(args)
+        executor.start_workers()
+        executor.fetch_menu()
+        assert executor.wait_for_queue(timeout=5)
+        executor.fetch_menu()
+        assert executor.wait_for_queue(timeout=5)
+        executor.stop()
+        assert MockProcessImage.call_count == 2
+        assert 'If-None-Match' not in httpserver.log[-1][0].headers
+
+
+def test_executor_fetches_menu_not_modified():
+    args = Namespace(log='info', preload=[])
+    with patch('itzmenu_extractor.jobs.MenuClient') as MockMenuClient, \
+            patch('itzmenu_extractor.jobs.Executor.process_image') as MockProcessImage:
+        MockMenuClient.return_value.get_week_menu.return_value = NOT_MODIFIED
+        executor = Executor(args)
+        executor.fetch_menu()
+        MockProcessImage.assert_not_called()
 
 
 def test_executor_processes_image_and_skips_existing_menu():
@@ -68,9 +232,77 @@ def test_executor_processes_image_and_skips_existing_menu():
         MockLogInfo.assert_called_once_with(f'Menu with checksum {checksum} already exists')
 
 
+def test_executor_processes_image_and_skips_known_menu():
+    args = Namespace(log='info', preload=[])
+    with patch('itzmenu_extractor.jobs.ItzMenuClient') as MockItzMenuClient, \
+            patch('itzmenu_extractor.jobs.extract_menu') as MockExtractMenu:
+        MockItzMenuClient.return_value.get_menu_by_id_or_checksum.return_value = True
+        executor = Executor(args)
+        executor.process_image(b'image_bytes')
+        executor.process_image(b'image_bytes')
+        MockItzMenuClient.return_value.get_menu_by_id_or_checksum.assert_called_once()
+        MockExtractMenu.assert_not_called()
+
+
+def test_executor_syncs_checksums_and_skips_known_menu():
+    args = Namespace(log='info', preload=[])
+    checksum = hashlib.sha256(b'image_bytes').hexdigest()
+    with patch('itzmenu_extractor.jobs.ItzMenuClient') as MockItzMenuClient, \
+            patch('itzmenu_extractor.jobs.extract_menu') as MockExtractMenu:
+        menu = Mock(img_checksum=checksum, img_phash=None)
+        MockItzMenuClient.return_value.get_menu_by_timestamp_range.return_value = [menu]
+        executor = Executor(args)
+        executor.sync_checksums()
+        executor.process_image(b'image_bytes')
+        MockItzMenuClient.return_value.get_menu_by_timestamp_range.assert_called_once()
+        MockItzMenuClient.return_value.get_menu_by_id_or_checksum.assert_not_called()
+        MockExtractMenu.assert_not_called()
+
+
+def test_executor_skips_near_duplicate_menu(week_menu: bytes):
+    args = Namespace(log='info', preload=[])
+    # A recompressed copy of a known image has a different checksum but nearly the same perceptual hash
+    copy = cv2.imencode('.jpg', cv2.imdecode(np.frombuffer(week_menu, np.uint8), cv2.IMREAD_COLOR),
+                        [cv2.IMWRITE_JPEG_QUALITY, 40])[1].tobytes()
+    with patch('itzmenu_extractor.jobs.ItzMenuClient') as MockItzMenuClient, \
+            patch('itzmenu_extractor.jobs.extract_menu') as MockExtractMenu, \
+            patch('itzmenu_extractor.ocr.extractor.period_of_validity', return_value=(1708297200, 1708729199)):
+        menu = Mock(img_checksum=hashlib.sha256(week_menu).hexdigest(), img_phash=image.perceptual_hash(week_menu),
+                    start_timestamp=1708297200, end_timestamp=1708729199)
+        MockItzMenuClient.return_value.get_menu_by_timestamp_range.return_value = [menu]
+        MockItzMenuClient.return_value.get_menu_by_id_or_checksum.return_value = None
+        executor = Executor(args)
+        executor.sync_checksums()
+        executor.process_image(copy)
+        MockItzMenuClient.return_value.get_menu_by_id_or_checksum.assert_called_once()
+        MockExtractMenu.assert_not_called()
+
+
+def test_executor_extracts_menu_of_other_week_with_same_table(week_menu: bytes, week_menu_df: pd.DataFrame):
+    args = Namespace(log='info', preload=[])
+    # The menu of another week only differs in the header with the period of validity and maybe a few dishes
+    img = cv2.imdecode(np.frombuffer(week_menu, np.uint8), cv2.IMREAD_COLOR)
+    img[:300] = 255
+    other_week = cv2.imencode('.jpg', img)[1].tobytes()
+    assert image.hamming_distance(image.perceptual_hash(week_menu), image.perceptual_hash(other_week)) <= 10
+    with patch('itzmenu_extractor.jobs.ItzMenuClient') as MockItzMenuClient, \
+            patch('itzmenu_extractor.jobs.extract_menu', return_value=((1708902000, 1709333999), week_menu_df)) \
+            as MockExtractMenu, \
+            patch('itzmenu_extractor.ocr.extractor.period_of_validity', return_value=(1708902000, 1709333999)):
+        menu = Mock(img_checksum=hashlib.sha256(week_menu).hexdigest(), img_phash=image.perceptual_hash(week_menu),
+                    start_timestamp=1708297200, end_timestamp=1708729199)
+        MockItzMenuClient.return_value.get_menu_by_timestamp_range.return_value = [menu]
+        MockItzMenuClient.return_value.get_menu_by_id_or_checksum.return_value = None
+        executor = Executor(args)
+        executor.sync_checksums()
+        assert executor.process_image(other_week)
+        MockExtractMenu.assert_called_once()
+        MockItzMenuClient.return_value.create_menu.assert_called_once()
+
+
 def test_executor_processes_image_and_handles_extraction_failure_1():
     args = Namespace(log='info', preload=[])
-    with patch('itzmenu_extractor.jobs.extractor.period_of_validity', return_value=None), \
+    with patch('itzmenu_extractor.ocr.extractor.extract_week', return_value=None), \
             patch('itzmenu_extractor.jobs.ItzMenuClient') as MockItzMenuClient, \
             patch('itzmenu_extractor.jobs.log.warning') as MockLogWarning:
         executor = Executor(args)
@@ -81,23 +313,72 @@ def test_executor_processes_image_and_handles_extraction_failure_1():
 
 def test_executor_processes_image_and_handles_extraction_failure_2():
     args = Namespace(log='info', preload=[])
-    with patch('itzmenu_extractor.jobs.extractor.period_of_validity', return_value=(1708297200, 1708729199)), \
-            patch('itzmenu_extractor.jobs.extractor.img_to_dataframe', return_value=None), \
+    # The blank image does not contain a table
+    img = cv2.imencode('.jpg', np.full((2479, 3508), 255, dtype=np.uint8))[1].tobytes()
+    with patch('itzmenu_extractor.ocr.extractor.pytesseract.image_to_string',
+               return_value='Speiseplan 19.02.2024 - 23.02.2024'), \
+            patch('itzmenu_extractor.ocr.extractor.__create_ocr_instance'), \
+            patch('itzmenu_extractor.ocr.extractor.Image') as MockImage, \
             patch('itzmenu_extractor.jobs.ItzMenuClient') as MockItzMenuClient, \
             patch('itzmenu_extractor.jobs.log.warning') as MockLogWarning:
+        MockImage.return_value.extract_tables.return_value = []
         executor = Executor(args)
         MockItzMenuClient.return_value.get_menu_by_id_or_checksum.return_value = None
-        executor.process_image(b'image_bytes')
+        executor.process_image(img)
         MockLogWarning.assert_called_once_with('Failed to extract menu from image')
 
 
 def test_executor_processes_image_success(week_menu: bytes, week_menu_df: pd.DataFrame):
     args = Namespace(log='info', preload=[])
-    with patch('itzmenu_extractor.jobs.extractor.period_of_validity', return_value=(1708297200, 1708729199)), \
-            patch('itzmenu_extractor.jobs.extractor.img_to_dataframe', return_value=week_menu_df), \
+    with patch('itzmenu_extractor.ocr.extractor.extract_week',
+               return_value=((1708297200, 1708729199), week_menu_df)), \
             patch('itzmenu_extractor.jobs.ItzMenuClient') as MockItzMenuClient, \
             patch('itzmenu_extractor.jobs.log.info') as MockLogInfo:
         executor = Executor(args)
         MockItzMenuClient.return_value.get_menu_by_id_or_checksum.return_value = None
         executor.process_image(week_menu)
         MockItzMenuClient.return_value.create_menu.assert_called_once()
+
+
+def test_executor_uploads_raw_image(monkeypatch: pytest.MonkeyPatch, week_menu: bytes, week_menu_df: pd.DataFrame):
+    monkeypatch.setenv('ocr_save_images', 'true')
+    args = Namespace(log='info', preload=[])
+    with patch('itzmenu_extractor.ocr.extractor.extract_week',
+               return_value=((1708297200, 1708729199), week_menu_df)), \
+            patch('itzmenu_extractor.jobs.ItzMenuClient') as MockItzMenuClient:
+        executor = Executor(args)
+        MockItzMenuClient.return_value.get_menu_by_id_or_checksum.return_value = None
+        executor.process_image(week_menu)
+        menu, img = MockItzMenuClient.return_value.create_menu.call_args.args
+        assert img == week_menu
+        assert menu.img is None
+        assert menu.img_checksum == image.bytes_to_sha256(week_menu)
+
+
+def test_executor_schedules_and_fetches_each_source(monkeypatch: pytest.MonkeyPatch):
+    sources = [{'name': 'first', 'host': 'http://first.example.org', 'interval': 60},
+               {'name': 'second', 'host': 'http://second.example.org', 'endpoint': 'menu.jpg', 'layout': 'detect'}]
+    monkeypatch.setenv('ocr_sources', json.dumps(sources))
+    args = Namespace(log='info', preload=[])
+    with patch('itzmenu_extractor.jobs.BlockingScheduler') as MockScheduler, \
+            patch('itzmenu_extractor.jobs.MenuClient') as MockMenuClient, \
+            patch('itzmenu_extractor.jobs.Executor.process_image') as MockProcessImage:
+        MockMenuClient.side_effect = lambda host, request: Mock(get_week_menu=Mock(return_value=b'image_bytes'))
+        executor = Executor(args)
+        executor.start_workers()
+        fetch_jobs = [c for c in MockScheduler.return_value.add_job.call_args_list if c.args[0] == executor.fetch_menu]
+        assert [(c.kwargs['args'][0].name, c.kwargs['seconds']) for c in fetch_jobs] == [('first', 60),
+                                                                                         ('second', 3600)]
+        assert [(c.args[0], c.args[1].endpoint) for c in MockMenuClient.call_args_list] == [
+            ('http://first.example.org', 'media/img/speiseplanWeek.jpg'), ('http://second.example.org', 'menu.jpg')]
+        executor.fetch_menu(fetch_jobs[1].kwargs['args'][0])
+        assert executor.wait_for_queue(timeout=5)
+        executor.stop()
+        MockProcessImage.assert_called_once()
+        assert MockProcessImage.call_args.args[1] == 'detect'
+
+
+def test_executor_rejects_unknown_layout(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv('ocr_sources', json.dumps([{'name': 'first', 'layout': 'unknown'}]))
+    with pytest.raises(ValueError):
+        Executor(Namespace(log='info', preload=[]))
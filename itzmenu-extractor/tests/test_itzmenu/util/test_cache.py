@@ -0,0 +1,160 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import itzmenu_extractor.util.cache as cache
+from itzmenu_extractor.config.settings import Settings
+from itzmenu_extractor.util.cache import CacheFootprint, ResultCache, MISSING
+
+
+class TestResultCache:
+
+    @staticmethod
+    def test_get_missing():
+        assert ResultCache().get('key') is MISSING
+
+    @staticmethod
+    def test_put_and_get_memory():
+        result_cache = ResultCache()
+        result_cache.put('key', (1, 2))
+        assert result_cache.get('key') == (1, 2)
+
+    @staticmethod
+    def test_memory_size_is_bounded():
+        result_cache = ResultCache(memory_size=2)
+        for i in range(3):
+            result_cache.put(f'key{i}', i)
+        assert result_cache.get('key0') is MISSING
+        assert result_cache.get('key1') == 1
+        assert result_cache.get('key2') == 2
+
+    @staticmethod
+    def test_memory_bytes_are_bounded():
+        result_cache = ResultCache(memory_max_bytes=2500)
+        for i in range(3):
+            result_cache.put(f'key{i}', np.zeros(1000, dtype=np.uint8))
+        assert result_cache.get('key0') is MISSING
+        assert result_cache.get('key1') is not MISSING
+        assert result_cache.footprint().memory_entries == 2
+        assert result_cache.footprint().memory_bytes == 2000
+
+    @staticmethod
+    def test_value_exceeding_memory_bytes_is_not_kept():
+        result_cache = ResultCache(memory_max_bytes=500)
+        result_cache.put('key', np.zeros(1000, dtype=np.uint8))
+        assert result_cache.get('key') is MISSING
+        assert result_cache.footprint().memory_bytes == 0
+
+    @staticmethod
+    def test_footprint(tmp_path: Path):
+        result_cache = ResultCache(str(tmp_path / 'cache.db'))
+        df = pd.DataFrame({'monday': ['Kartoffelsuppe 1.25']}, index=['Suppe'])
+        result_cache.put('key0', (1, 2))
+        result_cache.put('key1', df)
+        result_cache.put('key1', df)
+        footprint = result_cache.footprint()
+        assert footprint.memory_entries == 2
+        assert footprint.memory_bytes > df.memory_usage(deep=True).sum()
+        assert footprint.file_entries == 2
+        assert footprint.file_bytes > 0
+        result_cache.clear()
+        assert result_cache.footprint() == CacheFootprint(0, 0, 0, 0)
+
+    @staticmethod
+    def test_persists_across_instances(tmp_path: Path):
+        df = pd.DataFrame({'monday': ['Kartoffelsuppe 1.25']}, index=['Suppe'])
+        ResultCache(str(tmp_path / 'cache.db')).put('key', df)
+        result = ResultCache(str(tmp_path / 'cache.db')).get('key')
+        assert df.equals(result)
+
+    @staticmethod
+    def test_none_is_not_persisted(tmp_path: Path):
+        ResultCache(str(tmp_path / 'cache.db')).put('key', None)
+        assert ResultCache(str(tmp_path / 'cache.db')).get('key') is MISSING
+
+    @staticmethod
+    def test_eviction_by_size(tmp_path: Path):
+        result_cache = ResultCache(str(tmp_path / 'cache.db'), memory_size=0, max_size=2500)
+        for i in range(3):
+            result_cache.put(f'key{i}', b'0' * 1000)
+        assert result_cache.get('key0') is MISSING
+        assert result_cache.get('key1') is not MISSING
+        assert result_cache.get('key2') is not MISSING
+
+    @staticmethod
+    def test_eviction_by_age(tmp_path: Path):
+        result_cache = ResultCache(str(tmp_path / 'cache.db'), memory_size=0, max_age=60)
+        with patch('itzmenu_extractor.util.cache.time.time', return_value=1000):
+            result_cache.put('key', 1)
+        with patch('itzmenu_extractor.util.cache.time.time', return_value=1030):
+            assert result_cache.get('key') == 1
+        with patch('itzmenu_extractor.util.cache.time.time', return_value=1100):
+            assert result_cache.get('key') is MISSING
+
+    @staticmethod
+    def test_clear(tmp_path: Path):
+        result_cache = ResultCache(str(tmp_path / 'cache.db'))
+        result_cache.put('key', 1)
+        result_cache.clear()
+        assert result_cache.get('key') is MISSING
+
+
+class TestCached:
+
+    @staticmethod
+    def test_cached_calls_function_once():
+        calls = []
+
+        @cache.cached('test_cached_calls_function_once')
+        def func(img: bytes, factor: int = 1) -> int:
+            calls.append(img)
+            return len(img) * factor
+
+        assert func(b'image') == 5
+        assert func(b'image') == 5
+        assert func(b'image', factor=2) == 10
+        assert calls == [b'image', b'image']
+
+    @staticmethod
+    def test_cached_binds_arguments():
+        calls = []
+
+        @cache.cached('test_cached_binds_arguments')
+        def func(img: bytes, factor: int = 1) -> int:
+            calls.append(img)
+            return len(img) * factor
+
+        assert func(b'image') == func(b'image', 1) == func(b'image', factor=1) == 5
+        assert len(calls) == 1
+
+    @staticmethod
+    def test_cached_keys_depend_on_settings(monkeypatch):
+        calls = []
+
+        @cache.cached('test_cached_keys_depend_on_settings')
+        def func(img: bytes) -> int:
+            calls.append(img)
+            return len(img)
+
+        func(b'image')
+        # A cache created with other settings does not return the results of the previous one
+        monkeypatch.setattr('itzmenu_extractor.util.cache.__cache', None)
+        monkeypatch.setenv('ocr_grid_enabled', 'false')
+        func(b'image')
+        assert len(calls) == 2
+
+    @staticmethod
+    def test_version_isolates_entries(tmp_path: Path):
+        ResultCache(str(tmp_path / 'cache.db'), version='a').put('key', 1)
+        assert ResultCache(str(tmp_path / 'cache.db'), version='b').get('key') is MISSING
+        assert ResultCache(str(tmp_path / 'cache.db'), version='a').get('key') == 1
+
+    @staticmethod
+    def test_settings_digest():
+        assert cache.settings_digest(Settings()) == cache.settings_digest(Settings())
+        assert cache.settings_digest(Settings()) != cache.settings_digest(Settings(ocr_engine='tesserocr'))
+        assert cache.settings_digest(Settings()) != cache.settings_digest(Settings(ocr_table_workers=4))
+        assert cache.settings_digest(Settings()) != cache.settings_digest(Settings(google_cloud_vision_batch_size=8))
+        assert cache.settings_digest(Settings()) != cache.settings_digest(Settings(ocr_low_memory=True))
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+from itzmenu_extractor.util.checksums import ChecksumStore, PerceptualHashIndex
+
+
+class TestChecksumStore:
+
+    @staticmethod
+    def test_add(week_menu_checksum: str):
+        store = ChecksumStore()
+        assert week_menu_checksum not in store
+        store.add(week_menu_checksum)
+        assert week_menu_checksum in store
+        assert len(store) == 1
+
+    @staticmethod
+    def test_update_ignores_duplicates(tmp_path: Path):
+        store = ChecksumStore(str(tmp_path / 'checksums.txt'))
+        store.update(['a', 'b'])
+        store.update(['b', 'c'])
+        assert len(store) == 3
+        assert (tmp_path / 'checksums.txt').read_text().splitlines() == ['a', 'b', 'c']
+
+    @staticmethod
+    def test_persists_across_instances(tmp_path: Path, week_menu_checksum: str):
+        ChecksumStore(str(tmp_path / 'checksums.txt')).add(week_menu_checksum)
+        assert week_menu_checksum in ChecksumStore(str(tmp_path / 'checksums.txt'))
+
+
+class TestPerceptualHashIndex:
+
+    @staticmethod
+    def test_find_nearest_hash():
+        index = PerceptualHashIndex(max_distance=2)
+        assert index.find('00ff') is None
+        index.update(['00ff', '0f0f'])
+        assert index.find('01ff') == '00ff'
+        assert index.find('0f0e') == '0f0f'
+        assert len(index) == 2
+
+    @staticmethod
+    def test_find_ignores_distant_hash():
+        index = PerceptualHashIndex(max_distance=2)
+        index.add('00ff')
+        assert index.find('07ff') is None
+
+    @staticmethod
+    def test_keeps_period_of_known_hash():
+        index = PerceptualHashIndex(max_distance=2)
+        index.add('00ff', (1, 2))
+        index.update({'0f0f': (3, 4)})
+        index.update(['f0f0'])
+        assert index.period(index.find('01ff')) == (1, 2)
+        assert index.period('0f0f') == (3, 4)
+        assert index.period('f0f0') is None
@@ -1,3 +1,6 @@
+import cv2
+import numpy as np
+
 import itzmenu_extractor.util.image as image
 
 
@@ -6,3 +9,34 @@ class TestImage:
     def test_bytes_to_sha256(self, week_menu: bytes):
         checksum = image.bytes_to_sha256(week_menu)
         assert checksum == 'c0f2190a1b6536ff868fe2436993e25814c763c98db8068ca4c27ce78dfb68a6'
+
+    def test_file_to_sha256(self, tmp_path, week_menu: bytes):
+        (file := tmp_path / 'menu.jpg').write_bytes(week_menu)
+        assert image.file_to_sha256(str(file), chunk_size=1000) == image.bytes_to_sha256(week_menu)
+
+    def test_perceptual_hash_of_recompressed_copy(self, week_menu: bytes):
+        copy = cv2.imencode('.jpg', cv2.imdecode(np.frombuffer(week_menu, np.uint8), cv2.IMREAD_COLOR),
+                            [cv2.IMWRITE_JPEG_QUALITY, 40])[1].tobytes()
+        assert len(image.perceptual_hash(week_menu)) == 64
+        assert image.hamming_distance(image.perceptual_hash(week_menu), image.perceptual_hash(copy)) <= 4
+
+    def test_perceptual_hash_of_other_menu(self, week_menu: bytes, week_menu_holiday: bytes):
+        distance = image.hamming_distance(image.perceptual_hash(week_menu), image.perceptual_hash(week_menu_holiday))
+        assert distance > 20
+
+    def test_hamming_distance(self):
+        assert image.hamming_distance('00ff', '01fe') == 2
+
+    def test_find_images_directory(self, tmp_path):
+        (tmp_path / 'a').mkdir()
+        (tmp_path / 'a' / 'menu.jpg').write_bytes(b'')
+        (tmp_path / 'menu.JPG').write_bytes(b'')
+        (tmp_path / 'menu.png').write_bytes(b'')
+        files = list(image.find_images(str(tmp_path)))
+        assert files == [str(tmp_path / 'menu.JPG'), str(tmp_path / 'a' / 'menu.jpg')]
+
+    def test_find_images_glob(self, tmp_path):
+        (tmp_path / 'a').mkdir()
+        (tmp_path / 'a' / 'menu.jpg').write_bytes(b'')
+        (tmp_path / 'menu.png').write_bytes(b'')
+        assert list(image.find_images(str(tmp_path / '**' / '*.jpg'))) == [str(tmp_path / 'a' / 'menu.jpg')]
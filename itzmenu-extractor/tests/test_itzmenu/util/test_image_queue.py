@@ -0,0 +1,68 @@
+import queue
+import threading
+
+import pytest
+
+from itzmenu_extractor.util.image_queue import ImageQueue, QueuedImage
+
+
+class TestImageQueue:
+
+    @staticmethod
+    def test_put_and_get_in_order():
+        image_queue = ImageQueue(maxsize=2)
+        assert image_queue.put(QueuedImage(b'first', 'a'))
+        assert image_queue.put(QueuedImage(b'second', 'b', 'detect'))
+        assert image_queue.get().img == b'first'
+        assert image_queue.get().layout == 'detect'
+        assert image_queue.get(timeout=0) is None
+
+    @staticmethod
+    def test_skips_queued_and_processed_checksums():
+        image_queue = ImageQueue(maxsize=2)
+        assert image_queue.put(QueuedImage(b'first', 'a'))
+        assert not image_queue.put(QueuedImage(b'first', 'a'))
+        item = image_queue.get()
+        assert not image_queue.put(QueuedImage(b'first', 'a'))
+        image_queue.task_done(item)
+        assert image_queue.put(QueuedImage(b'first', 'a'))
+        assert image_queue.metrics().duplicates == 2
+
+    @staticmethod
+    def test_rejects_image_if_queue_stays_full():
+        image_queue = ImageQueue(maxsize=1)
+        image_queue.put(QueuedImage(b'first', 'a'))
+        with pytest.raises(queue.Full):
+            image_queue.put(QueuedImage(b'second', 'b'), timeout=0.01)
+        metrics = image_queue.metrics()
+        assert (metrics.depth, metrics.enqueued, metrics.rejected) == (1, 1, 1)
+
+    @staticmethod
+    def test_put_waits_for_free_slot():
+        image_queue = ImageQueue(maxsize=1)
+        image_queue.put(QueuedImage(b'first', 'a'))
+        consumer = threading.Timer(0.05, image_queue.get)
+        consumer.start()
+        assert image_queue.put(QueuedImage(b'second', 'b'), timeout=5)
+        consumer.join()
+        metrics = image_queue.metrics()
+        assert (metrics.depth, metrics.in_progress) == (1, 1)
+        assert metrics.max_wait >= 0.05
+
+    @staticmethod
+    def test_join_waits_for_processed_images():
+        image_queue = ImageQueue(maxsize=1)
+        image_queue.put(QueuedImage(b'first', 'a'))
+        assert not image_queue.join(timeout=0)
+        image_queue.task_done(image_queue.get())
+        assert image_queue.join(timeout=0)
+
+    @staticmethod
+    def test_close_wakes_up_consumers():
+        image_queue = ImageQueue(maxsize=1)
+        image_queue.put(QueuedImage(b'first', 'a'))
+        image_queue.close()
+        assert image_queue.get() is None
+        assert image_queue.metrics().depth == 0
+        with pytest.raises(queue.Full):
+            image_queue.put(QueuedImage(b'second', 'b'))
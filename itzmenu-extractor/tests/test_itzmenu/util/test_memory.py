@@ -0,0 +1,51 @@
+import logging
+from unittest.mock import patch
+
+import pytest
+
+import itzmenu_extractor.util.memory as memory
+
+
+class TestMemory:
+
+    @staticmethod
+    def test_releases_memory_in_low_memory_mode(monkeypatch: pytest.MonkeyPatch):
+        @memory.releases_memory
+        def func(value: int) -> int:
+            return value * 2
+
+        with patch('itzmenu_extractor.util.memory.release_memory') as MockReleaseMemory:
+            assert func(2) == 4
+            MockReleaseMemory.assert_not_called()
+            monkeypatch.setenv('ocr_low_memory', 'true')
+            assert func(3) == 6
+            MockReleaseMemory.assert_called_once()
+
+    @staticmethod
+    def test_releases_memory_after_failure(monkeypatch: pytest.MonkeyPatch):
+        @memory.releases_memory
+        def func():
+            raise ValueError('Extraction failed')
+
+        monkeypatch.setenv('ocr_low_memory', 'true')
+        with patch('itzmenu_extractor.util.memory.release_memory') as MockReleaseMemory, pytest.raises(ValueError):
+            func()
+        MockReleaseMemory.assert_called_once()
+
+    @staticmethod
+    def test_logs_cache_footprint_only_at_debug_level(caplog: pytest.LogCaptureFixture):
+        @memory.releases_memory
+        def func():
+            pass
+
+        with patch('itzmenu_extractor.util.memory.cache.get_cache') as MockGetCache:
+            with caplog.at_level(logging.INFO):
+                func()
+            MockGetCache.assert_not_called()
+            with caplog.at_level(logging.DEBUG):
+                func()
+            MockGetCache.return_value.footprint.assert_called_once()
+
+    @staticmethod
+    def test_release_memory():
+        memory.release_memory()
@@ -3,9 +3,11 @@ import time
 import random as rand
 from datetime import date
 
+import numpy as np
 import pytest
 
-from itzmenu_extractor.util.time import is_holiday, timestamp_to_date
+from itzmenu_extractor.util.time import (CompanyHolidays, HolidayCalendar, is_holiday, holidays_in_range,
+                                         timestamp_to_date)
 
 
 @pytest.fixture
@@ -58,6 +60,45 @@ class TestCompanyHolidays:
         assert is_holiday(labour_day_timestamp)
 
 
+class TestHolidayCalendar:
+
+    @staticmethod
+    def test_matches_company_holidays():
+        calendar = HolidayCalendar(2023, 2025)
+        hdays = CompanyHolidays(subdiv='SH', years=range(2023, 2026))
+        days = [date.fromordinal(o) for o in range(date(2023, 1, 1).toordinal(), date(2025, 12, 31).toordinal() + 1)]
+        assert calendar.holidays_in_range(days[0], days[-1]).tolist() == [d in hdays for d in days]
+
+    @staticmethod
+    def test_holidays_in_range_week():
+        # Week from Easter Monday 2024 to Friday
+        start = int(time.mktime(date(2024, 4, 1).timetuple()))
+        assert holidays_in_range(start, start + 86400 * 4).tolist() == [True, False, False, False, False]
+
+    @staticmethod
+    def test_holidays_in_range_empty():
+        assert len(holidays_in_range(date(2024, 1, 2), date(2024, 1, 1))) == 0
+
+    @staticmethod
+    def test_years_added_on_demand():
+        calendar = HolidayCalendar(2024, 2024)
+        assert calendar.is_holiday(date(2030, 12, 24))
+        assert calendar.is_holiday(date(1999, 5, 1))
+        assert not calendar.is_holiday(date(1999, 5, 2))
+        assert calendar.years == range(1999, 2031)
+
+    @staticmethod
+    def test_holidays_in_range_across_years():
+        days = HolidayCalendar(2024, 2025).holidays_in_range(date(2024, 12, 30), date(2025, 1, 2))
+        assert np.array_equal(days, [False, True, True, False])
+
+    @staticmethod
+    def test_subdivision():
+        # Reformation Day is a holiday in Schleswig-Holstein but not in Bavaria
+        assert HolidayCalendar(2024, 2024, 'SH').is_holiday(date(2024, 10, 31))
+        assert not HolidayCalendar(2024, 2024, 'BY').is_holiday(date(2024, 10, 31))
+
+
 class TestTimestampToDate:
 
     def test_timestamp_to_date(self):
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import itzmenu_extractor.ocr.preprocess as preprocess
+import itzmenu_extractor.util.trace as trace
+from itzmenu_extractor.util.trace import Span
+
+
+@pytest.fixture
+def spans() -> list[Span]:
+    spans = []
+    trace.set_sink(spans.append)
+    yield spans
+    trace.set_sink(None)
+
+
+class TestTrace:
+
+    @staticmethod
+    def test_traced_disabled():
+        @trace.traced('double')
+        def double(img: bytes) -> bytes:
+            return img * 2
+
+        assert double(b'image') == b'imageimage'
+
+    @staticmethod
+    def test_traced_emits_span(spans: list[Span]):
+        @trace.traced('double')
+        def double(img: np.ndarray) -> bytes:
+            return img.tobytes() * 2
+
+        double(np.zeros((2, 3), dtype=np.uint8))
+        assert len(spans) == 1
+        assert spans[0].name == 'double'
+        assert spans[0].duration >= 0
+        assert spans[0].shape_in == (2, 3)
+        assert spans[0].bytes_in == 6
+        assert spans[0].shape_out is None
+        assert spans[0].bytes_out == 12
+
+    @staticmethod
+    def test_preprocess_emits_spans(spans: list[Span], week_menu: bytes):
+        @preprocess.decode_image
+        @preprocess.crop_table
+        @preprocess.convert_to_grayscale
+        @preprocess.remove_holidays
+        @preprocess.encode_image
+        def dummy_func(img: bytes) -> bytes:
+            return img
+
+        dummy_func(week_menu, validity_period=(1708297200, 1708901999))
+        assert [span.name for span in spans] == ['decode', 'crop_table', 'convert_to_grayscale', 'remove_holidays',
+                                                 'encode']
+        assert spans[0].bytes_in == len(week_menu)
+        assert spans[1].shape_in == spans[0].shape_out
+
+    @staticmethod
+    def test_profiled_writes_profile(tmp_path: Path):
+        @trace.profiled('double')
+        def double(value: int) -> int:
+            return value * 2
+
+        trace.set_profile_dir(str(tmp_path))
+        try:
+            assert double(2) == 4
+        finally:
+            trace.set_profile_dir('')
+        assert len(list(tmp_path.glob('double-*.prof'))) == 1
+        assert double(3) == 6
+        assert len(list(tmp_path.glob('double-*.prof'))) == 1
@@ -1,5 +1,6 @@
 import base64
-from typing import Generic, Any
+import binascii
+from typing import Generic, Any, AsyncIterator
 
 from fastapi import Request
 from fastapi_users.models import ID
@@ -31,7 +32,7 @@ class BaseWeekMenuManager(Generic[ID]):
         :return: A week menu.
         """
         menu = await self.menu_db.get_menu_by_id(id)
-        return self._get_menu(menu, include_image)
+        return await self._get_menu(menu, include_image)
 
     async def get_image_by_id(self, id: ID) -> bytes:
         """
@@ -41,8 +42,18 @@ class BaseWeekMenuManager(Generic[ID]):
         :raises WeekMenuImageNotExists: The week menu image does not exist.
         :return: A week menu image as bytes.
         """
+        return b''.join([chunk async for chunk in await self.stream_image_by_id(id)])
+
+    async def stream_image_by_id(self, id: ID) -> AsyncIterator[bytes]:
+        """
+        Stream a week menu image by id.
+
+        :param id: Id of the week menu to retrieve.
+        :raises WeekMenuImageNotExists: The week menu image does not exist.
+        :return: The chunks of the week menu image.
+        """
         menu = await self.menu_db.get_menu_by_id(id)
-        return self._get_image(menu)
+        return await self._stream_image(menu)
 
     async def get_menu_by_checksum(self, img_checksum: str, include_image: bool = False) -> WeekMenu:
         """
@@ -53,7 +64,7 @@ class BaseWeekMenuManager(Generic[ID]):
         :return: A week menu.
         """
         menu = await self.menu_db.get_menu_by_checksum(img_checksum)
-        return self._get_menu(menu, include_image)
+        return await self._get_menu(menu, include_image)
 
     async def get_image_by_checksum(self, img_checksum: str) -> bytes:
         """
@@ -62,8 +73,18 @@ class BaseWeekMenuManager(Generic[ID]):
         :param img_checksum: Image checksum of the week menu to retrieve.
         :return: A week menu image as bytes.
         """
+        return b''.join([chunk async for chunk in await self.stream_image_by_checksum(img_checksum)])
+
+    async def stream_image_by_checksum(self, img_checksum: str) -> AsyncIterator[bytes]:
+        """
+        Stream a week menu image by image checksum.
+
+        :param img_checksum: Image checksum of the week menu to retrieve.
+        :raises WeekMenuImageNotExists: The week menu image does not exist.
+        :return: The chunks of the week menu image.
+        """
         menu = await self.menu_db.get_menu_by_checksum(img_checksum)
-        return self._get_image(menu)
+        return await self._stream_image(menu)
 
     async def get_menu_by_timestamp(self, timestamp: int, include_image: bool = False) -> WeekMenu:
         """
@@ -75,7 +96,7 @@ class BaseWeekMenuManager(Generic[ID]):
         :return: A week menu.
         """
         menu = await self.menu_db.get_menu_by_timestamp(timestamp)
-        return self._get_menu(menu, include_image)
+        return await self._get_menu(menu, include_image)
 
     async def get_menu_by_timestamp_range(self, start: int, end: int, include_images: bool = False) -> list[WeekMenu]:
         """
@@ -87,9 +108,10 @@ class BaseWeekMenuManager(Generic[ID]):
         :return: A list of week menus.
         """
         menus = await self.menu_db.get_menus_by_timestamp_range(start, end)
-        return self._get_menu(menus, include_images)
+        return await self._get_menu(menus, include_images)
 
-    async def create_menu(self, menu_create: WeekMenuCreate, request: Request | None = None) -> WeekMenu:
+    async def create_menu(self, menu_create: WeekMenuCreate, request: Request | None = None,
+                          image: bytes | None = None) -> WeekMenu:
         """
         Create a week menu in database.
 
@@ -97,6 +119,8 @@ class BaseWeekMenuManager(Generic[ID]):
 
         :param menu_create: The CreateWeekMenu model to create.
         :param request: Optional FastAPI request that triggered the operation, defaults to None.
+        :param image: Optional raw image of the week menu, replaces the base64 encoded image of the model.
+        The image is stored in the image storage instead of the week menu document.
         :raises WeekMenuAlreadyExists: A user already exists with the same e-mail.
         :return: A new week menu.
         """
@@ -105,7 +129,23 @@ class BaseWeekMenuManager(Generic[ID]):
             raise exceptions.WeekMenuAlreadyExists()
 
         menu_dict = menu_create.create_update_dict()
+        if image is None and menu_dict.get('img') is not None:
+            try:
+                image = base64.b64decode(menu_dict['img'], validate=True)
+            except binascii.Error:
+                # Images that cannot be decoded are kept in the week menu document as they are
+                pass
+        if image is not None:
+            menu_dict.pop('img', None)
+        # The week menu is inserted first, so a failed insert does not leave an image without a week menu behind
         created_menu = await self.menu_db.create_menu(menu_dict)
+        if image is not None:
+            try:
+                await self.menu_db.create_image(menu_create.img_checksum, image)
+            except Exception:
+                # Otherwise the week menu would be known without its image and never be uploaded again
+                await self.menu_db.delete_menu(created_menu)
+                raise
         await self.on_after_create_menu(created_menu, request)
         return created_menu
 
@@ -135,6 +175,7 @@ class BaseWeekMenuManager(Generic[ID]):
         """
         await self.on_before_delete_menu(menu, request)
         result = await self.menu_db.delete_menu(menu)
+        await self.menu_db.delete_image(menu.img_checksum)
         await self.on_after_delete_menu(menu, request)
         return result
 
@@ -177,6 +218,10 @@ class BaseWeekMenuManager(Generic[ID]):
         pass
 
     async def _update(self, menu: WeekMenu, update_dict: dict[str, Any]) -> WeekMenu:
+        # The given week menu may be a copy with the image of the image storage or without the image of the document,
+        # the stored document is updated instead, so the update neither copies the image into it nor removes it
+        if (menu := await self.menu_db.get_menu_by_id(menu.id)) is None:
+            raise exceptions.WeekMenuNotExists()
         validated_update_dict = {}
         for field, value in update_dict.items():
             if field == 'img_checksum' and value != menu.img_checksum:
@@ -187,33 +232,76 @@ class BaseWeekMenuManager(Generic[ID]):
                     validated_update_dict['img_checksum'] = value
             else:
                 validated_update_dict[field] = value
-        return await self.menu_db.update_menu(menu, validated_update_dict)
+        old_checksum = menu.img_checksum
+        new_checksum = validated_update_dict.get('img_checksum', old_checksum)
+        image = None
+        if (img := validated_update_dict.get('img')) is not None:
+            try:
+                image = base64.b64decode(img, validate=True)
+                # The new image replaces the stored one and the images of documents that were not migrated yet
+                validated_update_dict.update(img=None, img_data=None)
+            except binascii.Error:
+                # Images that cannot be decoded are kept in the document, the stored image would be served instead
+                await self.menu_db.delete_image(old_checksum)
+        elif new_checksum != old_checksum and (chunks := await self.menu_db.get_image(old_checksum)) is not None:
+            # The stored image is named by the checksum, so it is stored again under the new one
+            image = b''.join([chunk async for chunk in chunks])
+        updated_menu = await self.menu_db.update_menu(menu, validated_update_dict)
+        if image is not None:
+            await self.menu_db.delete_image(old_checksum)
+            await self.menu_db.delete_image(new_checksum)
+            await self.menu_db.create_image(new_checksum, image)
+        return updated_menu
 
-    @staticmethod
-    def _get_menu(menus: WeekMenu | list[WeekMenu], include_images: bool) -> WeekMenu | list[WeekMenu]:
+    async def _get_menu(self, menus: WeekMenu | list[WeekMenu], include_images: bool) -> WeekMenu | list[WeekMenu]:
         """
         Get a week menu by id, image checksum or timestamp.
         :param menus: The week menu(s) to retrieve.
         :param include_images: Whether to include images in the response.
         :return: The week menu.
         """
-        def exclude_img(menu: WeekMenu) -> WeekMenu:
-            return WeekMenu(**menu.dict(exclude={'img'})) if not include_images else menu
+        async def include_img(menu: WeekMenu) -> WeekMenu:
+            if not include_images:
+                return WeekMenu(**menu.dict(exclude={'img', 'img_data'}))
+            return await self._include_image(menu)
 
         if menus is None:
             raise exceptions.WeekMenuNotExists()
         elif type(menus) is list:
-            return [exclude_img(menu_item) for menu_item in menus]
+            return [await include_img(menu_item) for menu_item in menus]
         else:
-            return exclude_img(menus)
+            return await include_img(menus)
 
-    @staticmethod
-    def _get_image(menu: WeekMenu) -> bytes:
+    async def _include_image(self, menu: WeekMenu) -> WeekMenu:
+        """
+        Get a copy of a week menu that contains its base64 encoded image, the document itself is not changed.
+        :param menu: The week menu.
+        :return: The week menu with the image or the week menu itself if its image is stored in the document or missing.
+        """
+        if menu.img is not None:
+            return menu
+        try:
+            image = b''.join([chunk async for chunk in await self._stream_image(menu)])
+        except exceptions.WeekMenuImageNotExists:
+            return menu
+        return WeekMenu(**menu.dict(exclude={'img', 'img_data'}), img=base64.b64encode(image).decode('utf-8'))
+
+    async def _stream_image(self, menu: WeekMenu) -> AsyncIterator[bytes]:
         if menu is None:
             raise exceptions.WeekMenuImageNotExists()
+        elif (chunks := await self.menu_db.get_image(menu.img_checksum)) is not None:
+            return chunks
+        # Documents that were not migrated to the image storage yet
+        elif menu.img_data is not None:
+            return self.__single_chunk(menu.img_data)
+        elif menu.img is not None:
+            return self.__single_chunk(base64.b64decode(menu.img))
         else:
-            base64_img = menu.img
-            return base64.b64decode(base64_img)
+            raise exceptions.WeekMenuImageNotExists()
+
+    @staticmethod
+    async def __single_chunk(data: bytes) -> AsyncIterator[bytes]:
+        yield data
 
 
 WeekMenuManagerDependency = DependencyCallable[BaseWeekMenuManager[ID]]
@@ -1,7 +1,9 @@
-from typing import Type, Any, Optional
+from typing import Type, Any, Optional, AsyncIterator
 from uuid import UUID
 
 from fastapi_users.models import ID
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket, AsyncIOMotorGridOut
 
 from itzmenu_service.persistence.adapter.base import BaseWeekMenuDatabase
 from itzmenu_service.persistence.models import WeekMenu
@@ -12,10 +14,12 @@ class BeanieWeekMenuDatabase(BaseWeekMenuDatabase[UUID]):
     Database adapter for Beanie.
 
     :param menu_model: Beanie week menu model.
+    :param image_bucket: GridFS bucket storing the images with their checksum as file name.
     """
 
-    def __init__(self, menu_model: Type[WeekMenu]):
+    def __init__(self, menu_model: Type[WeekMenu], image_bucket: AsyncIOMotorGridFSBucket):
         self.menu_model = menu_model
+        self.image_bucket = image_bucket
 
     async def get_menu_by_id(self, id: ID) -> WeekMenu | None:
         """Get a single week menu by id."""
@@ -54,3 +58,33 @@ class BeanieWeekMenuDatabase(BaseWeekMenuDatabase[UUID]):
     async def count(self) -> int:
         """Count the number of week menus."""
         return await self.menu_model.count()
+
+    async def create_image(self, img_checksum: str, image: bytes) -> None:
+        """Store the image of a week menu unless it is already stored."""
+        if await self.__find_image(img_checksum) is None:
+            await self.image_bucket.upload_from_stream(img_checksum, image, metadata={'contentType': 'image/jpeg'})
+
+    async def get_image(self, img_checksum: str) -> AsyncIterator[bytes] | None:
+        """Get the chunks of the image of a week menu."""
+        try:
+            grid_out = await self.image_bucket.open_download_stream_by_name(img_checksum)
+        except NoFile:
+            return None
+        return self.__read_chunks(grid_out)
+
+    async def delete_image(self, img_checksum: str) -> bool:
+        """Delete the image of a week menu."""
+        if (file_id := await self.__find_image(img_checksum)) is None:
+            return False
+        await self.image_bucket.delete(file_id)
+        return True
+
+    async def __find_image(self, img_checksum: str) -> Any | None:
+        async for grid_out in self.image_bucket.find({'filename': img_checksum}, limit=1):
+            return grid_out._id
+        return None
+
+    @staticmethod
+    async def __read_chunks(grid_out: AsyncIOMotorGridOut) -> AsyncIterator[bytes]:
+        while chunk := await grid_out.readchunk():
+            yield chunk
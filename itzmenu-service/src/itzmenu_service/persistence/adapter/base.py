@@ -1,4 +1,4 @@
-from typing import Generic, Any
+from typing import Generic, Any, AsyncIterator
 
 from fastapi_users.models import ID
 from fastapi_users.types import DependencyCallable
@@ -41,5 +41,17 @@ class BaseWeekMenuDatabase(Generic[ID]):
         """Count the number of week menus."""
         raise NotImplementedError()
 
+    async def create_image(self, img_checksum: str, image: bytes) -> None:
+        """Store the image of a week menu unless it is already stored."""
+        raise NotImplementedError()
+
+    async def get_image(self, img_checksum: str) -> AsyncIterator[bytes] | None:
+        """Get the chunks of the image of a week menu."""
+        raise NotImplementedError()
+
+    async def delete_image(self, img_checksum: str) -> bool:
+        """Delete the image of a week menu."""
+        raise NotImplementedError()
+
 
 WeekMenuDatabaseDependency = DependencyCallable[BaseWeekMenuDatabase[ID]]
@@ -23,4 +23,4 @@ async def get_user_db() -> BeanieUserDatabase[User]:
 
 
 async def get_menu_db() -> BeanieWeekMenuDatabase:
-    yield BeanieWeekMenuDatabase(WeekMenu)
+    yield BeanieWeekMenuDatabase(WeekMenu, fs())
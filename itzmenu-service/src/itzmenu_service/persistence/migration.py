@@ -0,0 +1,48 @@
+import asyncio
+import base64
+import binascii
+import logging as log
+
+from beanie import init_beanie
+
+from itzmenu_service.persistence.adapter.base import BaseWeekMenuDatabase
+from itzmenu_service.persistence.database import db, get_menu_db
+from itzmenu_service.persistence.models import WeekMenu
+
+
+async def migrate_images(menu_db: BaseWeekMenuDatabase) -> tuple[int, int]:
+    """
+    Move the images stored in the week menu documents to the image storage.
+
+    The migration can be interrupted and run again, images that are already stored are not stored twice.
+
+    :param menu_db: Database adapter instance.
+    :return: The number of migrated and skipped week menus.
+    """
+    migrated = skipped = 0
+    async for menu in WeekMenu.find({'$or': [{'img': {'$ne': None}}, {'img_data': {'$ne': None}}]}):
+        try:
+            image = menu.img_data if menu.img_data is not None else base64.b64decode(menu.img, validate=True)
+        except binascii.Error:
+            log.warning(f'Image of week menu {menu.id} is not base64 encoded and is kept in the document.')
+            skipped += 1
+            continue
+        await menu_db.create_image(menu.img_checksum, image)
+        await WeekMenu.get_motor_collection().update_one({'_id': menu.id}, {'$unset': {'img': '', 'img_data': ''}})
+        migrated += 1
+    return migrated, skipped
+
+
+async def run():
+    await init_beanie(database=db(), document_models=[WeekMenu])
+    migrated, skipped = await migrate_images(await get_menu_db().__anext__())
+    log.info(f'Migrated the images of {migrated} week menus, skipped {skipped} week menus.')
+
+
+def main():
+    log.basicConfig(level=log.INFO)
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
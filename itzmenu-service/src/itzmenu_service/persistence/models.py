@@ -22,7 +22,10 @@ class WeekMenu(Document):
     end_timestamp: Indexed(int) = Field(ge=1)
     created_at: int = Field(default_factory=lambda: int(time.time()), ge=0)
     img_checksum: Indexed(str, unique=True) = Field(pattern=r'^[a-f0-9]{64}$')
+    img_phash: str | None = Field(pattern=r'^[a-f0-9]+$', default=None)
+    # The images are stored in GridFS, these fields only hold the images of documents that were not migrated yet
     img: str | None = Field(pattern=r'^[a-zA-Z0-9+/]+={0,2}$', default=None)
+    img_data: bytes | None = Field(default=None)
     menus: list[DayMenu] = Field(default=[])
 
     class Settings:
@@ -4,3 +4,4 @@ from enum import StrEnum
 class ErrorCode(StrEnum):
     MENU_WITH_CHECKSUM_ALREADY_EXISTS = 'MENU_WITH_CHECKSUM_ALREADY_EXISTS'
     MENU_NOT_FOUND = 'MENU_NOT_FOUND'
+    MENU_IMAGE_CHECKSUM_MISMATCH = 'MENU_IMAGE_CHECKSUM_MISMATCH'
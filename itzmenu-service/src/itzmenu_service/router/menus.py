@@ -1,11 +1,15 @@
+import hashlib
 import time
 import re
-from typing import Type
+from typing import Type, Any, AsyncIterator
 
-from fastapi import Depends, Request, APIRouter, HTTPException, Response
+from fastapi import Depends, Request, APIRouter, HTTPException, Form, File, UploadFile
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
 from fastapi_users import schemas
 from fastapi_users.models import ID
 from fastapi_users.router.common import ErrorModel
+from pydantic import TypeAdapter, ValidationError
 from starlette import status
 
 from itzmenu_api.persistence.schemas import WeekMenuRead, WeekMenuUpdate, WeekMenuCreate
@@ -15,6 +19,8 @@ from itzmenu_service.manager.base import WeekMenuManagerDependency, BaseWeekMenu
 from itzmenu_service.persistence.models import WeekMenu
 from itzmenu_service.router.common import ErrorCode
 
+MENU_JSON = TypeAdapter(dict[str, Any])
+
 
 def get_menus_router(get_week_menu_manager: WeekMenuManagerDependency[ID],
                      menu_read_schema: Type[WeekMenuRead],
@@ -51,6 +57,50 @@ def get_menus_router(get_week_menu_manager: WeekMenuManagerDependency[ID],
                                 detail=ErrorCode.MENU_WITH_CHECKSUM_ALREADY_EXISTS) from e
         return schemas.model_validate(menu_read_schema, created_user)
 
+    @router.post('/img', response_model=menu_read_schema, status_code=status.HTTP_201_CREATED,
+                 name='menus:create_menu_with_image',
+                 responses={
+                     status.HTTP_400_BAD_REQUEST: {
+                         'mode': ErrorModel,
+                         'content': {
+                             'application/json': {
+                                 'examples': {
+                                     ErrorCode.MENU_WITH_CHECKSUM_ALREADY_EXISTS: {
+                                         'summary': 'A menu with the given checksum already exists.',
+                                         'value': {
+                                             'detail': ErrorCode.MENU_WITH_CHECKSUM_ALREADY_EXISTS
+                                         },
+                                     },
+                                     ErrorCode.MENU_IMAGE_CHECKSUM_MISMATCH: {
+                                         'summary': 'The checksum does not match the uploaded image.',
+                                         'value': {
+                                             'detail': ErrorCode.MENU_IMAGE_CHECKSUM_MISMATCH
+                                         },
+                                     }
+                                 }
+                             }
+                         },
+                     },
+                 })
+    async def create_menu_with_image(request: Request, menu: str = Form(), image: UploadFile = File(),
+                                     menu_manager: BaseWeekMenuManager[ID] = Depends(get_week_menu_manager),
+                                     _=Depends(PermissionChecker(['menus:create_menu']))):
+        """Create a week menu from a multipart form with the menu as JSON and the raw image as file."""
+        try:
+            menu_create = menu_create_schema(**MENU_JSON.validate_json(menu))
+        except ValidationError as e:
+            raise RequestValidationError(e.errors(include_url=False)) from e
+        content = await image.read()
+        if hashlib.sha256(content).hexdigest() != menu_create.img_checksum:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=ErrorCode.MENU_IMAGE_CHECKSUM_MISMATCH)
+        try:
+            created_menu = await menu_manager.create_menu(menu_create, request=request, image=content)
+        except exceptions.WeekMenuAlreadyExists as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=ErrorCode.MENU_WITH_CHECKSUM_ALREADY_EXISTS) from e
+        return schemas.model_validate(menu_read_schema, created_menu)
+
     @router.get('/menu/{id_or_checksum}', response_model=menu_read_schema, name='menus:get_menu_by_id')
     async def get_menu_by_id(id_or_checksum: str, include_image: bool = False,
                              menu_manager: BaseWeekMenuManager[ID] = Depends(get_week_menu_manager)):
@@ -66,7 +116,7 @@ def get_menus_router(get_week_menu_manager: WeekMenuManagerDependency[ID],
                                     timestamp: int = int(time.time()), include_image: bool = False):
         return await __get_menu_by(menu_manager, timestamp=timestamp, include_image=include_image)
 
-    @router.get('/img/{id_or_checksum}', status_code=200, response_class=Response,
+    @router.get('/img/{id_or_checksum}', status_code=200, response_class=StreamingResponse,
                 responses={
                     status.HTTP_200_OK: {
                         'content': {'image/jpeg': {}}
@@ -74,15 +124,15 @@ def get_menus_router(get_week_menu_manager: WeekMenuManagerDependency[ID],
                 }, name='menus:get_image_by_id')
     async def get_image_by_id(id_or_checksum: str,
                               menu_manager: BaseWeekMenuManager[ID] = Depends(get_week_menu_manager)):
-        image: bytes = await __get_image_by(menu_manager, id_or_checksum=id_or_checksum)
-        return Response(content=image, media_type='image/jpeg')
+        chunks = await __get_image_by(menu_manager, id_or_checksum=id_or_checksum)
+        return StreamingResponse(chunks, media_type='image/jpeg')
 
     @router.patch('/menu/{id_or_checksum}', response_model=menu_read_schema, name='menus:update_menu')
     async def update_menu(request: Request, id_or_checksum: str, user_update: WeekMenuUpdate,
                           menu_manager: BaseWeekMenuManager[ID] = Depends(get_week_menu_manager),
                           _=Depends(PermissionChecker(['menus:update_menu']))):
         try:
-            current_menu = await __get_menu_by(menu_manager, id_or_checksum=id_or_checksum, include_image=True)
+            current_menu = await __get_menu_by(menu_manager, id_or_checksum=id_or_checksum)
             menu = await menu_manager.update_menu(user_update, current_menu, request=request)
             return schemas.model_validate(menu_read_schema, menu)
         except exceptions.WeekMenuAlreadyExists as e:
@@ -92,7 +142,7 @@ def get_menus_router(get_week_menu_manager: WeekMenuManagerDependency[ID],
     @router.delete('/menu/{id_or_checksum}', status_code=status.HTTP_204_NO_CONTENT, name='menus:delete_menu')
     async def delete_menu(id_or_checksum: str, menu_manager: BaseWeekMenuManager[ID] = Depends(get_week_menu_manager),
                           _=Depends(PermissionChecker(['menus:delete_menu']))):
-        menu = await __get_menu_by(menu_manager, id_or_checksum=id_or_checksum, include_image=True)
+        menu = await __get_menu_by(menu_manager, id_or_checksum=id_or_checksum)
         await menu_manager.delete_menu(menu)
 
     async def __get_menu_by(menu_manager: BaseWeekMenuManager[ID], id_or_checksum: str | None = None,
@@ -108,12 +158,12 @@ def get_menus_router(get_week_menu_manager: WeekMenuManagerDependency[ID],
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                 detail=ErrorCode.MENU_NOT_FOUND) from e
 
-    async def __get_image_by(menu_manager: BaseWeekMenuManager[ID], id_or_checksum: str) -> bytes:
+    async def __get_image_by(menu_manager: BaseWeekMenuManager[ID], id_or_checksum: str) -> AsyncIterator[bytes]:
         try:
             if re.search(r'^[0-9a-f]{8}-([0-9a-f]{4}-){3}[0-9a-f]{12}$', id_or_checksum):
-                return await menu_manager.get_image_by_id(id_or_checksum)
+                return await menu_manager.stream_image_by_id(id_or_checksum)
             else:
-                return await menu_manager.get_image_by_checksum(id_or_checksum)
+                return await menu_manager.stream_image_by_checksum(id_or_checksum)
         except exceptions.WeekMenuImageNotExists as e:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                 detail=ErrorCode.MENU_NOT_FOUND) from e
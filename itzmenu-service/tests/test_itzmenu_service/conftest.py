@@ -16,7 +16,7 @@ from itzmenu_service.config.settings import Settings
 from itzmenu_service.manager.users import get_user_manager
 from itzmenu_service.manager.menus import get_week_menu_manager
 from itzmenu_service.persistence.adapter.adapter import BeanieWeekMenuDatabase
-from itzmenu_service.persistence.database import get_user_db, get_menu_db
+from itzmenu_service.persistence.database import db, get_user_db, get_menu_db
 from itzmenu_service.persistence.models import User, WeekMenu
 
 
@@ -35,6 +35,8 @@ async def prepare_database():
     async with app.lifespan():
         await User.find().delete()
         await WeekMenu.find().delete()
+        await db()['fs.files'].delete_many({})
+        await db()['fs.chunks'].delete_many({})
 
 
 @pytest.fixture(scope='session')
@@ -1,6 +1,7 @@
 import time
 import base64
 import hashlib
+from unittest.mock import patch
 from uuid import UUID
 
 import pytest
@@ -34,8 +35,8 @@ def image_to_checksum(image: bytes) -> str:
 class TestBaseWeekMenuManager:
 
     @pytest.mark.dependency()
-    async def test_create_success(self, week_menu_manager: WeekMenuManager, menu_image_base64: str,
-                                  menu_image_checksum: str):
+    async def test_create_success(self, week_menu_manager: WeekMenuManager, menu_image: bytes,
+                                  menu_image_base64: str, menu_image_checksum: str):
         meal = Meal(name='test', price=1.0)
         category = MealCategory(name='test', meals=[meal])
         day = DayMenu(name=WeekDay.MONDAY, categories=[category])
@@ -51,6 +52,8 @@ class TestBaseWeekMenuManager:
         assert result.menus[0].categories[0].name == 'test'
         assert len(result.menus[0].categories[0].meals) == 1
         assert result.menus[0].categories[0].meals[0].name == 'test'
+        assert result.img is None
+        assert await week_menu_manager.get_image_by_checksum(menu_image_checksum) == menu_image
 
     @pytest.mark.dependency(depends=['TestBaseWeekMenuManager::test_create_success'])
     async def test_create_duplicate(self, week_menu_manager: WeekMenuManager):
@@ -188,6 +191,43 @@ class TestBaseWeekMenuManager:
 
     async def test_delete_menu(self, week_menu_manager: WeekMenuManager, rdm_checksums: list[str]):
         menu = WeekMenuCreate(img_checksum=rdm_checksums[0], start_timestamp=53, end_timestamp=54)
-        menu = await week_menu_manager.create_menu(menu)
+        menu = await week_menu_manager.create_menu(menu, image=b'image')
         await week_menu_manager.delete_menu(menu)
         assert await WeekMenu.find_one({'id': menu.id}) is None
+        assert await week_menu_manager.menu_db.get_image(rdm_checksums[0]) is None
+
+    async def test_create_removes_menu_if_image_fails(self, week_menu_manager: WeekMenuManager,
+                                                      rdm_checksums: list[str]):
+        menu = WeekMenuCreate(img_checksum=rdm_checksums[0], start_timestamp=57, end_timestamp=58)
+        with patch.object(week_menu_manager.menu_db, 'create_image', side_effect=RuntimeError('failed')), \
+                pytest.raises(RuntimeError):
+            await week_menu_manager.create_menu(menu, image=b'image')
+        assert await WeekMenu.find_one({'img_checksum': rdm_checksums[0]}) is None
+
+    async def test_update_keeps_image_in_storage(self, week_menu_manager: WeekMenuManager, rdm_checksums: list[str]):
+        menu = WeekMenuCreate(img_checksum=rdm_checksums[0], start_timestamp=59, end_timestamp=60)
+        menu = await week_menu_manager.create_menu(menu, image=b'image')
+        menu = await week_menu_manager.get_menu_by_id(menu.id, include_image=True)
+        await week_menu_manager.update_menu(WeekMenuUpdate(end_timestamp=61), menu)
+        assert (await WeekMenu.get(menu.id)).img is None
+        assert await week_menu_manager.get_image_by_id(menu.id) == b'image'
+
+    async def test_update_image(self, week_menu_manager: WeekMenuManager, rdm_checksums: list[str]):
+        menu = WeekMenuCreate(img_checksum=rdm_checksums[0], start_timestamp=62, end_timestamp=63)
+        menu = await week_menu_manager.create_menu(menu, image=b'image')
+        await week_menu_manager.update_menu(WeekMenuUpdate(img=image_to_base64(b'new image')), menu)
+        assert (await WeekMenu.get(menu.id)).img is None
+        assert await week_menu_manager.get_image_by_id(menu.id) == b'new image'
+
+    async def test_update_checksum_moves_image(self, week_menu_manager: WeekMenuManager, rdm_checksums: list[str]):
+        menu = WeekMenuCreate(img_checksum=rdm_checksums[0], start_timestamp=64, end_timestamp=65)
+        menu = await week_menu_manager.create_menu(menu, image=b'image')
+        await week_menu_manager.update_menu(WeekMenuUpdate(img_checksum=rdm_checksums[1]), menu)
+        assert await week_menu_manager.get_image_by_checksum(rdm_checksums[1]) == b'image'
+        assert await week_menu_manager.menu_db.get_image(rdm_checksums[0]) is None
+
+    async def test_stream_image_of_legacy_menu(self, week_menu_manager: WeekMenuManager, rdm_checksums: list[str]):
+        menu = WeekMenu(img_checksum=rdm_checksums[0], start_timestamp=55, end_timestamp=56, img_data=b'image')
+        await menu.create()
+        chunks = await week_menu_manager.stream_image_by_id(menu.id)
+        assert [chunk async for chunk in chunks] == [b'image']
@@ -151,3 +151,13 @@ class TestBaseWeekMenuDatabase:
         create = menu.create_update_dict()
         await menu_db.create_menu(create)
         assert await menu_db.count() == count + 1
+
+    async def test_image_success(self, menu_db: BeanieWeekMenuDatabase, rdm_checksums: list[str]):
+        assert await menu_db.get_image(rdm_checksums[0]) is None
+        await menu_db.create_image(rdm_checksums[0], b'image')
+        await menu_db.create_image(rdm_checksums[0], b'image')
+        assert [chunk async for chunk in await menu_db.get_image(rdm_checksums[0])] == [b'image']
+        assert len(await menu_db.image_bucket.find({'filename': rdm_checksums[0]}).to_list(None)) == 1
+        assert await menu_db.delete_image(rdm_checksums[0])
+        assert not await menu_db.delete_image(rdm_checksums[0])
+        assert await menu_db.get_image(rdm_checksums[0]) is None
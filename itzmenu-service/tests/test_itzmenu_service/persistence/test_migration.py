@@ -0,0 +1,30 @@
+import base64
+
+import pytest
+
+from itzmenu_service.persistence.adapter.adapter import BeanieWeekMenuDatabase
+from itzmenu_service.persistence.migration import migrate_images
+from itzmenu_service.persistence.models import WeekMenu
+
+
+@pytest.mark.asyncio(scope='session')
+class TestMigration:
+
+    async def test_migrate_images(self, menu_db: BeanieWeekMenuDatabase, rdm_checksums: list[str]):
+        base64_menu = WeekMenu(img_checksum=rdm_checksums[0], start_timestamp=60, end_timestamp=61,
+                               img=base64.b64encode(b'base64 image').decode('utf-8'))
+        raw_menu = WeekMenu(img_checksum=rdm_checksums[1], start_timestamp=62, end_timestamp=63, img_data=b'raw image')
+        invalid_menu = WeekMenu(img_checksum=rdm_checksums[2], start_timestamp=64, end_timestamp=65, img='zjtgdj')
+        for menu in (base64_menu, raw_menu, invalid_menu):
+            await menu.create()
+        migrated, skipped = await migrate_images(menu_db)
+        assert migrated >= 2
+        assert skipped >= 1
+        for menu, image in ((base64_menu, b'base64 image'), (raw_menu, b'raw image')):
+            stored = await WeekMenu.get(menu.id)
+            assert stored.img is None
+            assert stored.img_data is None
+            assert b''.join([chunk async for chunk in await menu_db.get_image(menu.img_checksum)]) == image
+        assert (await WeekMenu.get(invalid_menu.id)).img == 'zjtgdj'
+        assert await menu_db.get_image(invalid_menu.img_checksum) is None
+        assert await migrate_images(menu_db) == (0, skipped)
@@ -1,5 +1,6 @@
 import base64
 import hashlib
+import json
 import time
 from typing import Any
 
@@ -337,3 +338,51 @@ class TestMenusRouter:
         response = await http_client.delete(f'/menus/menu/{dao.id}', headers=user_superuser_headers)
         assert response.status_code == 404
         assert await WeekMenu.get(dao.id) is None
+
+    async def test_create_menu_with_image(self, http_client: AsyncClient, user_w_permissions_headers: dict[str, str],
+                                          menu_image: bytes):
+        image = menu_image + b'\x00'
+        data = {'start_timestamp': 30, 'end_timestamp': 35, 'img_checksum': image_to_checksum(image)}
+        response = await http_client.post('/menus/img', data={'menu': json.dumps(data)},
+                                          files={'image': ('menu.jpg', image, 'image/jpeg')},
+                                          headers=user_w_permissions_headers)
+        assert response.status_code == 201
+        resp = response.json()
+        assert resp['img_checksum'] == data['img_checksum']
+        assert resp['img'] is None
+        menu = await WeekMenu.get(resp['id'])
+        assert menu.img is None
+        response = await http_client.get(f'/menus/img/{resp["id"]}')
+        assert response.status_code == 200
+        assert response.content == image
+        response = await http_client.get(f'/menus/menu/{resp["id"]}?include_image=true')
+        assert response.json()['img'] == image_to_base64(image)
+        response = await http_client.delete(f'/menus/menu/{resp["id"]}', headers=user_w_permissions_headers)
+        assert response.status_code == 204
+
+    async def test_create_menu_with_image_checksum_mismatch(self, http_client: AsyncClient,
+                                                            user_w_permissions_headers: dict[str, str],
+                                                            menu_image: bytes, rdm_checksums: list[str]):
+        data = {'start_timestamp': 30, 'end_timestamp': 35, 'img_checksum': rdm_checksums[0]}
+        response = await http_client.post('/menus/img', data={'menu': json.dumps(data)},
+                                          files={'image': ('menu.jpg', menu_image, 'image/jpeg')},
+                                          headers=user_w_permissions_headers)
+        assert response.status_code == 400
+        assert response.json()['detail'] == ErrorCode.MENU_IMAGE_CHECKSUM_MISMATCH
+        assert await WeekMenu.find_one({'img_checksum': rdm_checksums[0]}) is None
+
+    async def test_create_menu_with_image_invalid_menu(self, http_client: AsyncClient,
+                                                       user_w_permissions_headers: dict[str, str], menu_image: bytes):
+        response = await http_client.post('/menus/img', data={'menu': json.dumps(self.invalid_create_data)},
+                                          files={'image': ('menu.jpg', menu_image, 'image/jpeg')},
+                                          headers=user_w_permissions_headers)
+        assert response.status_code == 422
+
+    async def test_create_menu_with_image_no_permissions(self, http_client: AsyncClient,
+                                                         user_wo_permissions_headers: dict[str, str],
+                                                         menu_image: bytes):
+        data = {'start_timestamp': 30, 'end_timestamp': 35, 'img_checksum': image_to_checksum(menu_image)}
+        response = await http_client.post('/menus/img', data={'menu': json.dumps(data)},
+                                          files={'image': ('menu.jpg', menu_image, 'image/jpeg')},
+                                          headers=user_wo_permissions_headers)
+        assert response.status_code == 403